@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Category, Book, Member, Transaction
+from . import counters, inventory, summaries
+from .models import ArchivedTransaction, Category, Book, BookCopy, Member, Transaction, Hold
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -11,14 +12,72 @@ class BookAdmin(admin.ModelAdmin):
     list_display = ['code_no', 'title', 'author', 'category', 'total_copies', 'available_copies', 'added_on']
     search_fields = ['title', 'code_no', 'author', 'isbn']
     list_filter = ['category']
+    list_select_related = ['category']
 
 @admin.register(Member)
 class MemberAdmin(admin.ModelAdmin):
     list_display = ['user', 'membership_type', 'membership_start', 'membership_end']
     search_fields = ['user__username', 'user__first_name', 'user__last_name']
+    list_select_related = ['user']
+
+class TouchesBookAdmin(admin.ModelAdmin):
+    """Flags the book of an edited or deleted loan or hold for reconcile_inventory --incremental."""
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        inventory.touch([obj.book_id, form.initial.get('book')])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        inventory.touch([obj.book_id])
+
+    def delete_queryset(self, request, queryset):
+        book_ids = list(queryset.values_list('book_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        inventory.touch(book_ids)
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(TouchesBookAdmin):
+    """Also rebuilds the loan counters and the member summaries a loan edited or deleted here touches."""
     list_display = ['book', 'user', 'issue_date', 'due_date', 'return_date', 'status', 'fine', 'fine_paid']
     list_filter = ['status', 'fine_paid']
     search_fields = ['book__title', 'user__username']
+    list_select_related = ['book', 'user']
+    raw_id_fields = ['copy']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        summaries.refresh({obj.user_id, form.initial.get('user', obj.user_id)})
+        counters.refresh(counters.LOAN_NAMES)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        summaries.refresh([obj.user_id])
+        counters.refresh(counters.LOAN_NAMES)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = list(queryset.values_list('user_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        summaries.refresh(user_ids)
+        counters.refresh(counters.LOAN_NAMES)
+
+@admin.register(ArchivedTransaction)
+class ArchivedTransactionAdmin(admin.ModelAdmin):
+    list_display = ['book', 'user', 'issue_date', 'due_date', 'return_date', 'fine', 'fine_paid', 'archived_on']
+    search_fields = ['book__title', 'user__username']
+    list_select_related = ['book', 'user']
+    raw_id_fields = ['book', 'user']
+
+@admin.register(BookCopy)
+class BookCopyAdmin(admin.ModelAdmin):
+    list_display = ['barcode', 'book', 'added_on']
+    search_fields = ['barcode', 'book__title']
+    list_select_related = ['book']
+    raw_id_fields = ['book']
+
+@admin.register(Hold)
+class HoldAdmin(TouchesBookAdmin):
+    list_display = ['book', 'user', 'status', 'priority', 'created_at', 'expires_on']
+    list_filter = ['status']
+    search_fields = ['book__title', 'user__username']
+    list_select_related = ['book', 'user']
@@ -0,0 +1,213 @@
+import json
+from datetime import date
+from functools import partial, wraps
+
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+
+from . import autocomplete, circulation, copies
+from .models import Book, Transaction
+
+MAX_BATCH = 200
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _json(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise BadRequest("Body must be JSON.")
+    if not isinstance(data, dict):
+        raise BadRequest("Body must be a JSON object.")
+    return data
+
+
+def _payload(request, items_key):
+    data = _json(request)
+    items = data.get(items_key)
+    if not isinstance(items, list) or not items:
+        raise BadRequest(f"'{items_key}' must be a non-empty list.")
+    if len(items) > MAX_BATCH:
+        raise BadRequest(f"At most {MAX_BATCH} {items_key} per call.")
+    return data, items
+
+
+def _is_id(ref):
+    # JSON true/false would otherwise pass as the ids 1 and 0.
+    return isinstance(ref, int) and not isinstance(ref, bool)
+
+
+def _member(request, data):
+    """The patron the batch is for: staff name one, members act for themselves."""
+    if not request.user.is_staff:
+        return request.user
+    ref = data.get('member')
+    member = None
+    if _is_id(ref):
+        member = User.objects.filter(is_staff=False, pk=ref).first()
+    elif isinstance(ref, str) and ref:
+        member = User.objects.filter(is_staff=False, username=ref).first()
+    if member is None:
+        raise BadRequest("'member' must be the id or username of a non-staff user.")
+    return member
+
+
+def _api(view, methods=('POST',)):
+    @wraps(view)
+    def wrapper(request):
+        try:
+            return view(request)
+        except BadRequest as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+    return login_required(require_http_methods(list(methods))(wrapper))
+
+
+@_api
+def issue_batch(request):
+    """Issue several books to one member in a single transaction.
+
+    Body: ``{"member": <id or username>, "books": [<book id or code_no>, ...]}``
+    (members issuing to themselves omit ``member``).
+    """
+    data, refs = _payload(request, 'books')
+    member = _member(request, data)
+    if not all(_is_id(ref) or isinstance(ref, str) for ref in refs):
+        raise BadRequest("'books' must be a list of book ids or code numbers.")
+
+    ids = [ref for ref in refs if _is_id(ref)]
+    codes = [ref for ref in refs if isinstance(ref, str)]
+    books = Book.objects.filter(pk__in=ids) | Book.objects.filter(code_no__in=codes)
+    by_id, by_code = {}, {}
+    for book in books.only('id', 'code_no', 'title'):
+        by_id[book.pk] = by_code[book.code_no] = book
+
+    found = [(ref, by_id.get(ref) if _is_id(ref) else by_code.get(ref)) for ref in refs]
+    loans = iter(circulation.issue_books([book for _, book in found if book], member))
+
+    results = []
+    for ref, book in found:
+        if book is None:
+            results.append({'book': ref, 'ok': False, 'error': 'not found'})
+            continue
+        tx = next(loans)
+        if tx is None:
+            results.append({'book': ref, 'ok': False, 'error': 'not available'})
+        else:
+            results.append({'book': ref, 'ok': True, 'transaction': tx.pk, 'title': book.title,
+                            'due_date': tx.due_date.isoformat()})
+    return JsonResponse({'member': member.username, 'results': results})
+
+
+@_api
+def return_batch(request):
+    """Return several of one member's loans in a single transaction.
+
+    Body: ``{"member": <id or username>, "transactions": [<transaction id>, ...]}``
+    """
+    data, refs = _payload(request, 'transactions')
+    member = _member(request, data)
+    if not all(_is_id(ref) for ref in refs):
+        raise BadRequest("'transactions' must be a list of ids.")
+
+    loans = {tx.pk: tx for tx in Transaction.objects.filter(pk__in=refs, user=member)}
+    closed = {tx.pk for tx in circulation.return_books(list(loans.values()))}
+
+    reported = set()
+    results = []
+    for ref in refs:
+        tx = loans.get(ref)
+        if tx is None:
+            results.append({'transaction': ref, 'ok': False, 'error': 'not found'})
+        elif ref not in closed or ref in reported:
+            results.append({'transaction': ref, 'ok': False, 'error': 'already returned'})
+        else:
+            reported.add(ref)
+            results.append({'transaction': ref, 'ok': True, 'fine': str(tx.fine)})
+    return JsonResponse({'member': member.username, 'results': results})
+
+
+def _loan(tx):
+    if tx is None:
+        return None
+    return {'transaction': tx.pk, 'member': tx.user.username, 'issue_date': tx.issue_date.isoformat(),
+            'due_date': tx.due_date.isoformat(), 'overdue': tx.due_date < date.today()}
+
+
+def _scanned(copy):
+    return {
+        'barcode': copy.barcode,
+        'book': {'id': copy.book.pk, 'code_no': copy.book.code_no, 'title': copy.book.title,
+                 'available_copies': copy.book.available_copies, 'total_copies': copy.book.total_copies},
+        'loan': _loan(copy.open_loan),
+    }
+
+
+@partial(_api, methods=('GET', 'POST'))
+def scan(request):
+    """Desk barcode scan: look a copy up, or check it in or out.
+
+    ``GET ?barcode=...`` returns the copy, its book and its open loan.
+    ``POST {"barcode": ..., "member": <id or username>}`` returns the copy if
+    it is out, and otherwise issues it to ``member``.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Only staff can scan copies.'}, status=403)
+    data = request.GET if request.method == 'GET' else _json(request)
+    barcode = data.get('barcode')
+    if not isinstance(barcode, str) or not barcode.strip():
+        raise BadRequest("'barcode' is required.")
+    copy = copies.scan(barcode.strip())
+    if copy is None:
+        return JsonResponse({'barcode': barcode, 'error': 'unknown barcode'}, status=404)
+    if request.method == 'GET':
+        return JsonResponse(_scanned(copy))
+
+    if copy.open_loan is not None:
+        try:
+            tx = circulation.return_book(copy.open_loan)
+        except circulation.AlreadyReturned:
+            return JsonResponse({'barcode': copy.barcode, 'error': 'already returned'}, status=409)
+        return JsonResponse({'action': 'returned', 'barcode': copy.barcode, 'transaction': tx.pk,
+                             'member': tx.user.username, 'fine': str(tx.fine)})
+
+    member = _member(request, data)
+    try:
+        tx = circulation.issue_book(copy.book, member, copy=copy)
+    except circulation.BookUnavailable:
+        return JsonResponse({'barcode': copy.barcode, 'error': 'not available'}, status=409)
+    return JsonResponse({'action': 'issued', 'barcode': copy.barcode, 'transaction': tx.pk,
+                         'member': member.username, 'title': copy.book.title, 'due_date': tx.due_date.isoformat()})
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', autocomplete.DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest("'limit' must be a number.")
+    return max(1, min(limit, autocomplete.MAX_LIMIT))
+
+
+@partial(_api, methods=('GET',))
+def autocomplete_books(request):
+    """Typeahead: ``GET ?q=<prefix of title, code no or ISBN>&limit=``."""
+    matches = autocomplete.books(request.GET.get('q', ''), _limit(request))
+    return JsonResponse({'results': [
+        {'id': book.pk, 'label': autocomplete.book_label(book), 'available': book.available_copies > 0}
+        for book in matches
+    ]})
+
+
+@partial(_api, methods=('GET',))
+def autocomplete_members(request):
+    """Typeahead for staff: ``GET ?q=<prefix of username, name or phone>&limit=``."""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Only staff can look up members.'}, status=403)
+    matches = autocomplete.members(request.GET.get('q', ''), _limit(request))
+    return JsonResponse({'results': [
+        {'id': user.pk, 'label': autocomplete.member_label(user)} for user in matches
+    ]})
@@ -0,0 +1,45 @@
+"""Move settled loans from the hot Transaction table to ArchivedTransaction."""
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import ArchivedTransaction, Transaction
+
+ARCHIVE_AFTER_DAYS = 365
+BATCH_SIZE = 5000
+FIELDS = ['id', 'user_id', 'book_id', 'issue_date', 'due_date', 'return_date', 'fine', 'fine_paid', 'fine_paid_on']
+
+
+def default_cutoff(today=None):
+    return (today or date.today()) - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+
+def archivable(cutoff):
+    """Returned loans with nothing left to pay, returned before ``cutoff``."""
+    return Transaction.objects.filter(status='returned', return_date__lt=cutoff).filter(
+        Q(fine=0) | Q(fine_paid=True)
+    )
+
+
+def archive(cutoff, batch_size=BATCH_SIZE, progress=None):
+    """Move every archivable loan, ``batch_size`` rows per transaction.
+
+    Each chunk is copied and deleted atomically, so an interrupted run
+    leaves every loan in exactly one table. Returns the number moved.
+    """
+    moved = 0
+    last_id = 0
+    rows = archivable(cutoff).order_by('id').values(*FIELDS)
+    while True:
+        chunk = list(rows.filter(id__gt=last_id)[:batch_size])
+        if not chunk:
+            break
+        last_id = chunk[-1]['id']
+        with transaction.atomic():
+            ArchivedTransaction.objects.bulk_create(ArchivedTransaction(**row) for row in chunk)
+            Transaction.objects.filter(pk__in=[row['id'] for row in chunk]).delete()
+        moved += len(chunk)
+        if progress:
+            progress(moved)
+    return moved
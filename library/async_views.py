@@ -0,0 +1,122 @@
+"""Native async versions of the read-only pages, used when served over ASGI.
+
+They query through the async ORM so a slow page waits on the event loop
+instead of occupying a worker thread. Full-text search (a raw cursor) and
+catalog cache misses still render in a thread. The write paths stay in
+views.py.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.loader import render_to_string
+
+from . import catalog, counters, holds, summaries
+from .forms import BookSearchForm
+from .models import Book, Category, Transaction
+from .pagination import amerged_keyset_page, remaining
+from .search import search_book_ids
+from .views import (
+    BOOK_LISTING_ORDER, HISTORY_ORDER, RECENT_LOANS, STREAM_CHUNK, STREAM_MARKER, listing_query, loan_history,
+    render_listing,
+)
+
+
+async def _user(request):
+    # Resolve the user once so templates and context processors don't
+    # trigger a synchronous lookup through the lazy request.user.
+    request.user = await request.auser()
+    return request.user
+
+
+def _render(request, template, context):
+    return HttpResponse(render_to_string(template, context, request=request))
+
+
+@login_required
+async def admin_home(request):
+    user = await _user(request)
+    if not user.is_staff:
+        return redirect('user_home')
+
+    recent_tx = (
+        Transaction.objects.filter(user__is_staff=False)
+        .select_related('book', 'user')
+        .only('issue_date', 'due_date', 'status', 'book__title', 'user__username')
+        .order_by('-issue_date')[:8]
+    )
+    return _render(request, 'library/admin_home.html', {
+        'counters': await counters.asnapshot(),
+        'recent_tx': [tx async for tx in recent_tx],
+    })
+
+
+@login_required
+async def user_home(request):
+    user = await _user(request)
+    if user.is_staff:
+        return redirect('admin_home')
+
+    return _render(request, 'library/user_home.html', {
+        'summary': await summaries.aget(user),
+        'my_issued': await amerged_keyset_page(loan_history(user), HISTORY_ORDER, None, RECENT_LOANS),
+        'my_holds': await holds.aactive_holds(user),
+    })
+
+
+@login_required
+async def book_availability(request):
+    await _user(request)
+    if request.GET.get('q') or request.GET.get('stream'):
+        categories = [c async for c in Category.objects.order_by('name')]
+        form = BookSearchForm(request.GET, categories=categories)
+        filters = form.cleaned_data if form.is_valid() else {}
+        category = filters.get('category')
+        available_only = filters.get('available', False)
+
+        if filters.get('q'):
+            # FTS5 goes through a raw cursor, which has no async API.
+            ids = await sync_to_async(search_book_ids)(filters['q'], category=category, available_only=available_only)
+            position = {book_id: i for i, book_id in enumerate(ids)}
+            books = [b async for b in Book.objects.select_related('category').filter(id__in=ids)]
+            books.sort(key=lambda b: position[b.id])
+            return _render(request, 'library/book_availability.html', {'books': books, 'form': form})
+
+        if request.GET.get('stream'):
+            books = Book.objects.select_related('category')
+            if category:
+                books = books.filter(category=category)
+            if available_only:
+                books = books.filter(available_copies__gt=0)
+            return _stream_book_listing(request, form, books)
+
+    # Cache misses render through the ORM, so the lookup runs in a thread.
+    listing = await sync_to_async(catalog.cached_fragment)(
+        request, 'book_listing', listing_query(request.GET), render_listing,
+    )
+    return _render(request, 'library/book_availability.html', {'listing': listing})
+
+
+def _stream_book_listing(request, form, books):
+    shell = render_to_string('library/book_availability.html', {
+        'form': form,
+        'streaming': True,
+        'stream_marker': STREAM_MARKER,
+    }, request=request)
+    head, tail = shell.split(STREAM_MARKER, 1)
+
+    async def rows():
+        yield head
+        chunk = []
+        sent = False
+        async for book in remaining(books, BOOK_LISTING_ORDER, request.GET.get('after')).aiterator(chunk_size=STREAM_CHUNK):
+            chunk.append(book)
+            if len(chunk) == STREAM_CHUNK:
+                yield render_to_string('library/book_rows.html', {'books': chunk}, request=request)
+                chunk = []
+                sent = True
+        if chunk or not sent:
+            yield render_to_string('library/book_rows.html', {'books': chunk}, request=request)
+        yield tail
+
+    return StreamingHttpResponse(rows(), content_type='text/html; charset=utf-8')
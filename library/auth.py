@@ -0,0 +1,37 @@
+"""Authentication backend that serves the logged-in user from a cache.
+
+Django looks the session's user up on every request; with this backend
+that is a cache hit for LIBRARY_USER_CACHE_TTL seconds. The cached user
+carries its Member row, and saving or deleting either drops the entry
+(see signals.forget_cached_user).
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import caches
+
+CACHE_ALIAS = 'default'
+
+
+def _key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def forget_user(user_id):
+    caches[CACHE_ALIAS].delete(_key(user_id))
+
+
+class CachedUserBackend(ModelBackend):
+    def get_user(self, user_id):
+        cache = caches[CACHE_ALIAS]
+        user = cache.get(_key(user_id))
+        if user is None:
+            user = User.objects.select_related('member').filter(pk=user_id).first()
+            if user is None:
+                return None
+            cache.set(_key(user_id), user, settings.LIBRARY_USER_CACHE_TTL)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        return await sync_to_async(self.get_user)(user_id)
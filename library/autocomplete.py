@@ -0,0 +1,89 @@
+"""Prefix lookups behind the typeahead widgets.
+
+Every lookup is a range scan ``key >= term AND key < term + U+10FFFF`` on an
+index over that key (lower-cased where matching ignores case), read only up
+to ``limit`` rows, so its cost does not depend on the size of the table.
+SQLite's LOWER() folds only ASCII letters, so terms are folded the same way:
+"ÉCOLE" finds "École", but "école" does not.
+"""
+import re
+import string
+
+from django.contrib.auth.models import User
+from django.db.models.functions import Lower
+
+from .models import Book
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 25
+# Sorts after every character, closing the prefix range.
+PREFIX_END = '\U0010ffff'
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+# Digits, then the check digit X an ISBN-10 may end in.
+ISBN_PREFIX = re.compile(r'\d+x?')
+
+
+def _fold(term):
+    """``term`` lower-cased the way SQLite's LOWER() does it."""
+    return term.translate(_ASCII_LOWER)
+
+
+def _prefixed(queryset, key, term):
+    """Rows of ``queryset`` whose ``key`` (field name or expression) starts with ``term``."""
+    if isinstance(key, str):
+        return queryset.filter(**{f'{key}__gte': term, f'{key}__lt': term + PREFIX_END}).order_by(key)
+    return queryset.alias(_key=key).filter(_key__gte=term, _key__lt=term + PREFIX_END).order_by('_key')
+
+
+def _collect(querysets, limit):
+    """The first ``limit`` distinct rows across ``querysets``, in order."""
+    found = {}
+    for queryset in querysets:
+        for row in queryset[:limit]:
+            found.setdefault(row.pk, row)
+            if len(found) == limit:
+                return list(found.values())
+    return list(found.values())
+
+
+def books(term, limit=DEFAULT_LIMIT):
+    """Books whose title, code number or ISBN starts with ``term``."""
+    term = term.strip()
+    if not term:
+        return []
+    queryset = Book.objects.only('id', 'code_no', 'title', 'author', 'available_copies')
+    lookups = [
+        _prefixed(queryset, Lower('title'), _fold(term)),
+        _prefixed(queryset, Lower('code_no'), _fold(term)),
+    ]
+    isbn = _fold(term).replace('-', '')
+    if ISBN_PREFIX.fullmatch(isbn):
+        lookups.append(_prefixed(queryset, 'isbn_key', isbn))
+    return _collect(lookups, limit)
+
+
+def members(term, limit=DEFAULT_LIMIT):
+    """Non-staff users whose username, first or last name, or phone starts with ``term``."""
+    term = term.strip()
+    if not term:
+        return []
+    queryset = User.objects.filter(is_staff=False).select_related('member').only(
+        'id', 'username', 'first_name', 'last_name', 'member__phone',
+    )
+    lookups = [
+        _prefixed(queryset, Lower('username'), _fold(term)),
+        _prefixed(queryset, Lower('first_name'), _fold(term)),
+        _prefixed(queryset, Lower('last_name'), _fold(term)),
+    ]
+    if term.lstrip('+').isdigit():
+        lookups.append(_prefixed(queryset, 'member__phone', term))
+    return _collect(lookups, limit)
+
+
+def book_label(book):
+    return f'{book.title} ({book.code_no})'
+
+
+def member_label(user):
+    name = user.get_full_name()
+    return f'{name} ({user.username})' if name else user.username
@@ -0,0 +1,463 @@
+"""Offline load-testing helpers for the bench_seed and bench_run commands.
+
+Everything runs in-process against a SQLite file: data is generated
+deterministically with bulk_create, and simulated clients drive the real
+views through Django's test client from a pool of threads.
+"""
+import asyncio
+import json
+import platform
+import random
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.test import AsyncClient, Client, override_settings
+
+from . import catalog, circulation, copies, counters, search, summaries
+from .circulation import FINE_PER_DAY, LOAN_DAYS
+from .middleware import QueryTracker
+from .models import Book, Category, Member, Transaction
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+BATCH = 5000
+PASSWORD = 'bench-password'
+WORDS = [
+    'history', 'science', 'garden', 'ocean', 'river', 'mountain', 'city', 'silent', 'secret',
+    'modern', 'ancient', 'physics', 'poetry', 'journey', 'winter', 'summer', 'shadow', 'light',
+    'empire', 'machine', 'number', 'theory', 'island', 'forest', 'music', 'letters', 'night',
+]
+
+
+def parse_scale(value):
+    value = str(value).lower()
+    if value in SCALES:
+        return SCALES[value]
+    return int(value)
+
+
+def use_database(path, profile=None):
+    """Point the default connection (in every thread) at the SQLite file ``path``.
+
+    ``profile`` names an entry of settings.SQLITE_PROFILES to connect with
+    instead of the configured one.
+    """
+    connections['default'].close()
+    changes = {'NAME': str(path)}
+    if profile is not None:
+        changes.update({'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False})
+        changes.update(settings.SQLITE_PROFILES[profile])
+    connections['default'].settings_dict.update(changes)
+    connections.settings['default'].update(changes)
+
+
+def prepare_database(path):
+    use_database(path)
+    call_command('migrate', verbosity=0, interactive=False)
+
+
+def _batches(items, size=BATCH):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(scale, seed=42, today=None, log=None):
+    """Fill an empty database with a deterministic catalog and loan history.
+
+    ``scale`` is the number of books and of transactions; there is one
+    member per ten books and one category per thousand books (min 10).
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    say = log or (lambda msg: None)
+
+    n_categories = max(10, scale // 1000)
+    n_members = max(10, scale // 10)
+
+    categories = Category.objects.bulk_create(Category(name=f'Category {i}') for i in range(n_categories))
+    category_ids = [c.id for c in categories]
+    say(f'{n_categories} categories')
+
+    book_ids = []
+    available = []
+    for batch in _batches(range(scale)):
+        books = []
+        for i in batch:
+            n_copies = rng.randint(1, 5)
+            books.append(Book(
+                code_no=f'BN{i:07d}',
+                title=' '.join(rng.choice(WORDS).title() for _ in range(rng.randint(2, 4))) + f' {i}',
+                author=f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}',
+                category_id=rng.choice(category_ids),
+                isbn=f'978{rng.randrange(10 ** 9, 10 ** 10)}',
+                total_copies=n_copies,
+                available_copies=n_copies,
+            ))
+        book_ids.extend(b.id for b in Book.objects.bulk_create(books))
+        available.extend(b.total_copies for b in books)
+    say(f'{scale} books')
+
+    password = make_password(PASSWORD)
+    member_ids = []
+    for batch in _batches(range(n_members)):
+        users = User.objects.bulk_create(
+            User(username=f'member{i}', password=password, first_name='Member', last_name=str(i))
+            for i in batch
+        )
+        Member.objects.bulk_create(
+            Member(user=u, membership_type='1y', membership_start=today - timedelta(days=100),
+                   membership_end=today + timedelta(days=265))
+            for u in users
+        )
+        member_ids.extend(u.id for u in users)
+    say(f'{n_members} members')
+
+    for batch in _batches(range(scale)):
+        loans = []
+        for _ in batch:
+            index = rng.randrange(len(book_ids))
+            issue_date = today - timedelta(days=rng.randint(0, 730))
+            due_date = issue_date + timedelta(days=LOAN_DAYS)
+            loan = Transaction(user_id=rng.choice(member_ids), book_id=book_ids[index],
+                               issue_date=issue_date, due_date=due_date)
+            if available[index] > 0 and rng.random() < 0.2:
+                available[index] -= 1
+            else:
+                loan.status = 'returned'
+                loan.return_date = issue_date + timedelta(days=rng.randint(1, 30))
+                loan.fine = loan.calculate_fine(per_day=FINE_PER_DAY)
+                loan.fine_paid = loan.fine > 0 and rng.random() < 0.7
+                if loan.fine_paid:
+                    loan.fine_paid_on = min(today, loan.return_date + timedelta(days=rng.randint(0, 14)))
+            loans.append(loan)
+        Transaction.objects.bulk_create(loans)
+    say(f'{scale} transactions')
+
+    # bulk_create skipped the per-row bookkeeping; apply it in bulk.
+    for batch in _batches(range(len(book_ids))):
+        books = [Book(id=book_ids[i], available_copies=available[i]) for i in batch]
+        Book.objects.bulk_update(books, ['available_copies'])
+    search.rebuild_index()
+    counters.refresh(today=today)
+    summaries.refresh(member_ids, today=today)
+    copies.add_missing_copies()
+    catalog.changed()
+    say('search index, counters, member summaries and copy barcodes rebuilt')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarise(latencies, errors, elapsed):
+    values = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 3)  # noqa: E731
+    return {
+        'count': len(values),
+        'errors': errors,
+        'throughput_rps': round(len(values) / elapsed, 2) if elapsed else None,
+        'mean_ms': ms(sum(values) / len(values)) if values else None,
+        'p50_ms': ms(percentile(values, 50)),
+        'p95_ms': ms(percentile(values, 95)),
+        'p99_ms': ms(percentile(values, 99)),
+        'max_ms': ms(values[-1]) if values else None,
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, op, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(op, [])
+            self.errors.setdefault(op, 0)
+            if ok:
+                self.latencies[op].append(seconds)
+            else:
+                self.errors[op] += 1
+
+    def report(self, elapsed):
+        ops = {op: summarise(self.latencies[op], self.errors[op], elapsed) for op in sorted(self.latencies)}
+        everything = [v for values in self.latencies.values() for v in values]
+        return {'operations': ops, 'total': summarise(everything, sum(self.errors.values()), elapsed)}
+
+
+# Operation mix for simulated desk/member traffic (weights).
+MIX = {'browse': 30, 'search': 30, 'issue': 15, 'return': 15, 'pay_fine': 10}
+
+
+class SimulatedMember:
+    """One member session issuing a random (seeded) stream of requests."""
+
+    def __init__(self, user, seed, recorder):
+        self.user = user
+        self.rng = random.Random(seed)
+        self.recorder = recorder
+        self.client = Client(HTTP_HOST='localhost')
+        self.client.force_login(user)
+
+    def timed(self, op, method, path, data=None):
+        started = time.perf_counter()
+        try:
+            response = getattr(self.client, method)(path, data or {})
+            if hasattr(response, 'streaming_content'):
+                b''.join(response.streaming_content)
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        self.recorder.add(op, time.perf_counter() - started, ok)
+
+    def step(self):
+        op = self.rng.choices(list(MIX), weights=list(MIX.values()))[0]
+        if op == 'browse':
+            self.timed(op, 'get', '/books/')
+        elif op == 'search':
+            self.timed(op, 'get', '/books/', {'q': self.rng.choice(WORDS)[:self.rng.randint(3, 6)]})
+        elif op == 'issue':
+            book_id = (Book.objects.filter(available_copies__gt=0, id__gte=self.rng.randint(1, self.max_book_id))
+                       .order_by('id').values_list('id', flat=True).first())
+            if book_id:
+                self.timed(op, 'post', '/issue/', {'book': book_id})
+        elif op == 'return':
+            tx_id = (Transaction.objects.filter(user=self.user, status='issued')
+                     .values_list('id', flat=True).first())
+            if tx_id:
+                self.timed(op, 'post', f'/return/{tx_id}/')
+        elif op == 'pay_fine':
+            tx_id = (Transaction.objects.filter(user=self.user, fine__gt=0, fine_paid=False)
+                     .values_list('id', flat=True).first())
+            if tx_id:
+                self.timed(op, 'post', f'/pay-fine/{tx_id}/')
+
+    def run(self, steps):
+        self.max_book_id = Book.objects.order_by('-id').values_list('id', flat=True).first() or 1
+        try:
+            for _ in range(steps):
+                self.step()
+        finally:
+            connection.close()
+
+
+def run_load(clients=8, requests_per_client=50, seed=42):
+    """Drive the views from ``clients`` threads and return a latency report."""
+    recorder = Recorder()
+    users = list(User.objects.filter(is_staff=False, member__isnull=False).order_by('id')[:clients])
+    members = [SimulatedMember(user, seed + i, recorder) for i, user in enumerate(users)]
+    threads = [threading.Thread(target=m.run, args=(requests_per_client,)) for m in members]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    report = recorder.report(elapsed)
+    report['elapsed_s'] = round(elapsed, 3)
+    return report
+
+
+def _read_request(rng):
+    """One read-only request (operation, path, query) from the browsing mix."""
+    op = rng.choice(['browse', 'search', 'user_home'])
+    if op == 'browse':
+        return op, '/books/', {}
+    if op == 'search':
+        return op, '/books/', {'q': rng.choice(WORDS)[:rng.randint(3, 6)]}
+    return op, '/user-home/', {}
+
+
+def _read_users(clients):
+    return list(User.objects.filter(is_staff=False, member__isnull=False).order_by('id')[:clients])
+
+
+def run_wsgi_reads(clients=16, requests_per_client=50, seed=42):
+    """Read-only traffic through the sync views, one thread per client."""
+    recorder = Recorder()
+
+    def worker(user, rng):
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        try:
+            for _ in range(requests_per_client):
+                op, path, query = _read_request(rng)
+                started = time.perf_counter()
+                response = client.get(path, query)
+                recorder.add(op, time.perf_counter() - started, response.status_code < 400)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(user, random.Random(seed + i)))
+               for i, user in enumerate(_read_users(clients))]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return {**recorder.report(elapsed), 'elapsed_s': round(elapsed, 3)}
+
+
+def run_asgi_reads(clients=16, requests_per_client=50, seed=42):
+    """The same traffic through the async views, as concurrent tasks on one event loop."""
+    recorder = Recorder()
+    users = _read_users(clients)
+
+    async def worker(user, rng):
+        client = AsyncClient()
+        await client.aforce_login(user)
+        for _ in range(requests_per_client):
+            op, path, query = _read_request(rng)
+            started = time.perf_counter()
+            response = await client.get(path, query)
+            recorder.add(op, time.perf_counter() - started, response.status_code < 400)
+
+    async def main():
+        await asyncio.gather(*(worker(user, random.Random(seed + i)) for i, user in enumerate(users)))
+
+    # AsyncClient always sends Host: testserver.
+    with override_settings(ROOT_URLCONF='library_management.asgi_urls', ALLOWED_HOSTS=['testserver']):
+        started = time.perf_counter()
+        asyncio.run(main())
+        elapsed = time.perf_counter() - started
+    connection.close()
+    return {**recorder.report(elapsed), 'elapsed_s': round(elapsed, 3)}
+
+
+# Write benchmark scenarios: (database profile, write retries or None for the setting).
+WRITE_SCENARIOS = {
+    'before': ('default', 0),
+    'after': ('production', None),
+}
+
+
+def run_writes(threads=8, ops_per_thread=100, seed=42):
+    """Issue and return books through the circulation service from ``threads`` threads.
+
+    Every operation is a write transaction, so this measures lock
+    contention: "database is locked" failures are counted as errors, a
+    refused issue (no copy left) is not.
+    """
+    recorder = Recorder()
+    users = _read_users(threads)
+    max_book_id = Book.objects.order_by('-id').values_list('id', flat=True).first() or 1
+
+    def worker(user, rng):
+        try:
+            for _ in range(ops_per_thread):
+                loan = Transaction.objects.filter(user=user, status='issued').first() if rng.random() < 0.5 else None
+                op = 'return' if loan else 'issue'
+                started = time.perf_counter()
+                try:
+                    if loan:
+                        circulation.return_book(loan)
+                    else:
+                        book = (Book.objects.filter(available_copies__gt=0, id__gte=rng.randint(1, max_book_id))
+                                .order_by('id').first())
+                        if book is None:
+                            continue
+                        circulation.issue_book(book, user)
+                    ok = True
+                except circulation.CirculationError:
+                    ok = True
+                except OperationalError:
+                    ok = False
+                recorder.add(op, time.perf_counter() - started, ok)
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker, args=(user, random.Random(seed + i)))
+               for i, user in enumerate(users)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return {**recorder.report(elapsed), 'elapsed_s': round(elapsed, 3)}
+
+
+def run_write_scenario(path, scenario, threads=8, ops_per_thread=100, seed=42):
+    """Run :func:`run_writes` against ``path`` under one of WRITE_SCENARIOS."""
+    profile, retries = WRITE_SCENARIOS[scenario]
+    use_database(path, profile)
+    retries = settings.LIBRARY_WRITE_RETRIES if retries is None else retries
+    with override_settings(LIBRARY_WRITE_RETRIES=retries):
+        report = run_writes(threads, ops_per_thread, seed)
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        journal_mode = cursor.fetchone()[0]
+    connection.close()
+    report['config'] = {'profile': profile, 'journal_mode': journal_mode, 'retries': retries}
+    return report
+
+
+# Pages measured by run_auth_queries(), and the tables behind sessions and users.
+AUTH_PAGES = {'browse': '/books/', 'user_home': '/user-home/', 'history': '/history/'}
+AUTH_TABLES = ('django_session', 'auth_user', 'library_member')
+
+
+def run_auth_queries(profile, requests_per_page=50, clients=8):
+    """SQL per request for AUTH_PAGES under one of settings.AUTH_PROFILES.
+
+    Every client logs in and loads each page once to warm the caches; the
+    requests after that are counted, with the share that went to the
+    session and user tables.
+    """
+    caches['default'].clear()
+    report = {}
+    with override_settings(**settings.AUTH_PROFILES[profile]):
+        sessions = []
+        for user in _read_users(clients):
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(user)
+            for path in AUTH_PAGES.values():
+                client.get(path)
+            sessions.append(client)
+        for page, path in AUTH_PAGES.items():
+            tracker = QueryTracker(keep_sql=True)
+            started = time.perf_counter()
+            with connection.execute_wrapper(tracker):
+                for i in range(requests_per_page):
+                    sessions[i % len(sessions)].get(path)
+            elapsed = time.perf_counter() - started
+            auth = sum(1 for _, sql in tracker.statements if any(f'FROM "{table}"' in sql for table in AUTH_TABLES))
+            report[page] = {
+                'requests': requests_per_page,
+                'queries_per_request': round(tracker.count / requests_per_page, 2),
+                'auth_queries_per_request': round(auth / requests_per_page, 2),
+                'mean_ms': round(elapsed * 1000 / requests_per_page, 2),
+            }
+    connection.close()
+    return report
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'machine': platform.machine(),
+        'date': date.today().isoformat(),
+    }
+
+
+def write_report(path, report):
+    Path(path).write_text(json.dumps(report, indent=2, default=str) + '\n')
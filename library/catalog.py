@@ -0,0 +1,100 @@
+"""Versioned cache of rendered catalog fragments.
+
+Every write to a Book or Category bumps a catalog version (after commit),
+and fragments are cached under keys that include it, so a page rendered
+before a change can never be served after it and nothing has to be
+deleted: stale entries just age out of the size-bounded cache.
+"""
+import hashlib
+import threading
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.middleware.csrf import get_token
+from django.utils.safestring import mark_safe
+
+CACHE_ALIAS = 'catalog'
+VERSION_KEY = 'catalog:version'
+# Rendered in place of the per-user CSRF token and swapped back on the way out.
+CSRF_PLACEHOLDER = 'catalog-csrf-placeholder'
+
+
+class Stats:
+    """Per-process hit/miss/bump counts."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.bumps = 0
+
+    def reset(self):
+        with self.lock:
+            self.hits = self.misses = self.bumps = 0
+
+    def add(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'version_bumps': self.bumps,
+            }
+
+
+STATS = Stats()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def version():
+    current = _cache().get(VERSION_KEY)
+    if current is None:
+        # Start from the clock, not 0, so a version lost to eviction or a
+        # restart can never line up with fragments cached under an old one.
+        _cache().add(VERSION_KEY, time.time_ns(), timeout=None)
+        current = _cache().get(VERSION_KEY)
+    return current
+
+
+def bump():
+    STATS.add('bumps')
+    # A fresh clock reading rather than incr(): on a shared file cache incr
+    # is a get and a set, and two processes bumping at once would both land
+    # on the same version.
+    current = _cache().get(VERSION_KEY) or 0
+    _cache().set(VERSION_KEY, max(time.time_ns(), current + 1), timeout=None)
+
+
+def changed():
+    """Bump the version once the current transaction commits (now, outside one)."""
+    transaction.on_commit(bump)
+
+
+def fragment_key(name, params):
+    query = '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+    digest = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+    return f'catalog:{name}:{version()}:{digest}'
+
+
+def cached_fragment(request, name, params, render):
+    """The fragment ``name`` for ``params``, from cache or ``render(params, csrf_token)``.
+
+    ``render`` gets the CSRF placeholder and must depend on nothing but
+    ``params``; the requester's own token is put in afterwards.
+    """
+    key = fragment_key(name, params)
+    html = _cache().get(key)
+    if html is None:
+        STATS.add('misses')
+        html = render(params, CSRF_PLACEHOLDER)
+        _cache().set(key, html)
+    else:
+        STATS.add('hits')
+    return mark_safe(html.replace(CSRF_PLACEHOLDER, get_token(request)))
@@ -0,0 +1,261 @@
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from . import catalog, counters, holds, summaries
+from .db import retry_on_lock
+from .models import Book, Transaction
+
+LOAN_DAYS = 14
+FINE_PER_DAY = Decimal('5.00')
+
+
+class CirculationError(Exception):
+    pass
+
+
+class BookUnavailable(CirculationError):
+    pass
+
+
+class AlreadyReturned(CirculationError):
+    pass
+
+
+class NoFineDue(CirculationError):
+    pass
+
+
+@retry_on_lock
+def issue_book(book, user, today=None, copy=None):
+    """Lend one copy of ``book`` to ``user``.
+
+    The copy is taken with a single conditional UPDATE, so two desks racing
+    for the last copy cannot both succeed, and the loan row is written in the
+    same short transaction. A member collecting a ready hold gets the copy
+    that was set aside for them. ``copy`` is the scanned BookCopy, if any.
+    """
+    issue_date = today or date.today()
+    try:
+        with transaction.atomic():
+            taken = holds.claim(book, user) or Book.objects.filter(pk=book.pk, available_copies__gt=0).update(
+                available_copies=F('available_copies') - 1, updated_at=timezone.now()
+            )
+            if not taken:
+                raise BookUnavailable(book)
+            catalog.changed()
+            tx = Transaction.objects.create(
+                user=user,
+                book=book,
+                copy=copy,
+                issue_date=issue_date,
+                due_date=issue_date + timedelta(days=LOAN_DAYS),
+            )
+            counters.bump(**{counters.COPIES_ON_LOAN: 1})
+            summaries.loans_opened(user.pk, 1, issue_date)
+    except IntegrityError:
+        if copy is None:
+            raise
+        # one_open_loan_per_copy: the scanned copy is already out.
+        raise BookUnavailable(book)
+    return tx
+
+
+@retry_on_lock
+def return_book(tx, today=None):
+    """Close the loan ``tx`` and pass its copy to the hold queue or the shelf.
+
+    Closing is conditional on the loan still being open, which makes a
+    double-submitted return a no-op instead of a second copy.
+    """
+    tx.return_date = today or date.today()
+    tx.fine = tx.calculate_fine(per_day=FINE_PER_DAY)
+    tx.status = 'returned'
+    with transaction.atomic():
+        closed = Transaction.objects.filter(pk=tx.pk, status='issued').update(
+            status=tx.status, return_date=tx.return_date, fine=tx.fine
+        )
+        if not closed:
+            raise AlreadyReturned(tx)
+        holds.release_copies(tx.book_id, 1, tx.return_date)
+        counters.loan_closed(tx)
+        summaries.loans_closed([tx])
+    return tx
+
+
+@retry_on_lock
+def issue_books(books, user, today=None):
+    """Lend every book in ``books`` (copies may repeat) to ``user`` at once.
+
+    Returns a list aligned with ``books`` holding the new Transaction, or
+    None where no copy was left. Inventory, loans and counters all change
+    in one transaction, with one UPDATE per distinct quantity and a single
+    INSERT for the loans. Ready holds the member is collecting are served
+    from the copies set aside for them.
+    """
+    issue_date = today or date.today()
+    due_date = issue_date + timedelta(days=LOAN_DAYS)
+    wanted = Counter(book.pk for book in books)
+    with transaction.atomic():
+        claimed = holds.claim_many(user, wanted)
+        wanted.subtract(claimed)
+        granted = Counter(_grant_copies(+wanted))
+        granted.update(claimed)
+        loans = []
+        remaining = dict(granted)
+        for book in books:
+            if remaining.get(book.pk):
+                remaining[book.pk] -= 1
+                loans.append(Transaction(user=user, book=book, issue_date=issue_date, due_date=due_date))
+            else:
+                loans.append(None)
+        created = Transaction.objects.bulk_create([tx for tx in loans if tx is not None])
+        if created:
+            counters.bump(**{counters.COPIES_ON_LOAN: len(created)})
+            summaries.loans_opened(user.pk, len(created), issue_date)
+    return loans
+
+
+def _grant_copies(wanted):
+    """Take copies for ``{book_id: count}``; return ``{book_id: copies taken}``.
+
+    Books wanting the same number of copies are updated together, so the
+    usual desk case (one copy each) is a single conditional UPDATE. If a
+    group comes up short because some book ran out, it is settled one book
+    at a time, taking whatever copies are left.
+    """
+    groups = defaultdict(list)
+    for book_id, count in wanted.items():
+        groups[count].append(book_id)
+
+    granted = {}
+    for count, book_ids in groups.items():
+        with transaction.atomic():
+            updated = Book.objects.filter(pk__in=book_ids, available_copies__gte=count).update(
+                available_copies=F('available_copies') - count, updated_at=timezone.now()
+            )
+            if updated == len(book_ids):
+                granted.update(dict.fromkeys(book_ids, count))
+                catalog.changed()
+                continue
+            transaction.set_rollback(True)
+        for book_id in book_ids:
+            for take in range(count, 0, -1):
+                if Book.objects.filter(pk=book_id, available_copies__gte=take).update(
+                    available_copies=F('available_copies') - take, updated_at=timezone.now()
+                ):
+                    granted[book_id] = take
+                    catalog.changed()
+                    break
+    return granted
+
+
+def return_books(loans, today=None):
+    """Close every open loan in ``loans`` at once.
+
+    Returns the loans that were closed; ones already returned are skipped.
+    Loans are closed with one UPDATE per distinct fine amount and copies
+    are put back with one UPDATE per distinct per-book count; books with a
+    hold queue hand their copies to it instead.
+    """
+    return_date = today or date.today()
+    open_loans = [tx for tx in loans if tx.status == 'issued']
+    for tx in open_loans:
+        tx.return_date = return_date
+        tx.fine = tx.calculate_fine(per_day=FINE_PER_DAY)
+        tx.status = 'returned'
+    return _close_loans(open_loans, return_date)
+
+
+@retry_on_lock
+def _close_loans(open_loans, return_date):
+    by_fine = defaultdict(list)
+    for tx in open_loans:
+        by_fine[tx.fine].append(tx)
+
+    with transaction.atomic():
+        closed = []
+        for fine, group in by_fine.items():
+            ids = [tx.pk for tx in group]
+            with transaction.atomic():
+                updated = Transaction.objects.filter(pk__in=ids, status='issued').update(
+                    status='returned', return_date=return_date, fine=fine
+                )
+                if updated == len(ids):
+                    closed.extend(group)
+                    continue
+                # Part of the group was returned elsewhere meanwhile.
+                transaction.set_rollback(True)
+            for tx in group:
+                if Transaction.objects.filter(pk=tx.pk, status='issued').update(
+                    status='returned', return_date=return_date, fine=fine
+                ):
+                    closed.append(tx)
+
+        per_book = Counter(tx.book_id for tx in closed)
+        queued = holds.books_with_queues(per_book) if per_book else set()
+        by_count = defaultdict(list)
+        for book_id, count in per_book.items():
+            if book_id in queued:
+                holds.release_copies(book_id, count, return_date)
+            else:
+                by_count[count].append(book_id)
+        for count, book_ids in by_count.items():
+            Book.objects.filter(pk__in=book_ids).update(
+                available_copies=Least(F('available_copies') + count, F('total_copies')),
+                updated_at=timezone.now(),
+            )
+        if by_count:
+            catalog.changed()
+        if closed:
+            counters.loans_closed(closed)
+            summaries.loans_closed(closed)
+    return closed
+
+
+@retry_on_lock
+def pay_fine(tx, today=None):
+    paid_on = today or date.today()
+    with transaction.atomic():
+        paid = Transaction.objects.filter(pk=tx.pk, fine__gt=0, fine_paid=False).update(
+            fine_paid=True, fine_paid_on=paid_on
+        )
+        if not paid:
+            raise NoFineDue(tx)
+        counters.bump(**{counters.OUTSTANDING_FINES: -tx.fine})
+        summaries.fine_paid(tx, paid_on)
+    tx.fine_paid = True
+    tx.fine_paid_on = paid_on
+    return tx
+
+
+@retry_on_lock
+def accrue_fines(today=None):
+    """Bring the running fine on every open overdue loan up to ``today``.
+
+    Loans sharing a due date owe the same amount, so this is one UPDATE per
+    distinct overdue due date rather than one per loan. Loans already accrued
+    to ``today`` are skipped, which makes reruns cheap and idempotent.
+    Returns ``(loans_updated, statements_run)``.
+    """
+    today = today or date.today()
+    stale = Transaction.objects.filter(status='issued', due_date__lt=today).filter(
+        Q(fine_accrued_on__isnull=True) | Q(fine_accrued_on__lt=today)
+    )
+    due_dates = list(stale.order_by('due_date').values_list('due_date', flat=True).distinct())
+
+    updated = 0
+    with transaction.atomic():
+        for due_date in due_dates:
+            updated += stale.filter(due_date=due_date).update(
+                accrued_fine=FINE_PER_DAY * (today - due_date).days,
+                fine_accrued_on=today,
+            )
+        counters.refresh([counters.OVERDUE_LOANS, counters.ACCRUED_FINES], today=today)
+        summaries.recount_overdue(today)
+    return updated, len(due_dates)
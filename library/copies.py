@@ -0,0 +1,60 @@
+"""Physical copies of books and the barcode-scan lookup used at the desk."""
+from itertools import islice
+
+from django.db.models import Count, F, FilteredRelation, Q
+
+from .models import Book, BookCopy
+
+BATCH_SIZE = 2000
+
+
+def barcode_for(code_no, number):
+    return f'{code_no}-{number:03d}'
+
+
+def missing_copies(books):
+    """Unsaved copy rows that bring each book up to its ``total_copies``.
+
+    ``books`` yields ``(id, code_no, total_copies, existing_copies)``.
+    """
+    for book_id, code_no, total, existing in books:
+        for number in range(existing + 1, total + 1):
+            yield BookCopy(book_id=book_id, barcode=barcode_for(code_no, number))
+
+
+def bulk_insert(rows, batch_size=BATCH_SIZE):
+    """``bulk_create`` ``rows`` a batch at a time, without materialising them all."""
+    created = 0
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        BookCopy.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def add_missing_copies(book_ids=None):
+    """Create copy rows for books with fewer of them than ``total_copies``."""
+    books = Book.objects.annotate(existing=Count('copies')).filter(total_copies__gt=F('existing'))
+    if book_ids is not None:
+        books = books.filter(pk__in=list(book_ids))
+    rows = books.order_by('id').values_list('id', 'code_no', 'total_copies', 'existing')
+    return bulk_insert(missing_copies(rows.iterator(chunk_size=BATCH_SIZE)))
+
+
+def scan(barcode):
+    """Resolve a barcode to its copy, book and open loan (with borrower), or None.
+
+    One query: a unique-index seek on the barcode, then primary-key joins to
+    the book and, through the one-open-loan-per-copy index, the open loan.
+    ``copy.open_loan`` is None when the copy is on the shelf.
+    """
+    copy = (
+        BookCopy.objects.filter(barcode=barcode)
+        .annotate(open_loan=FilteredRelation('loans', condition=Q(loans__status='issued')))
+        .select_related('book', 'open_loan', 'open_loan__user')
+        .first()
+    )
+    if copy is not None and not hasattr(copy, 'open_loan'):
+        # select_related leaves a missing filtered relation unset.
+        copy.open_loan = None
+    return copy
@@ -0,0 +1,129 @@
+from datetime import date
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Book, Counter, Transaction
+
+TOTAL_BOOKS = 'total_books'
+TOTAL_COPIES = 'total_copies'
+COPIES_ON_LOAN = 'copies_on_loan'
+OVERDUE_LOANS = 'overdue_loans'
+OUTSTANDING_FINES = 'outstanding_fines'
+ACCRUED_FINES = 'accrued_fines'
+
+NAMES = [TOTAL_BOOKS, TOTAL_COPIES, COPIES_ON_LOAN, OVERDUE_LOANS, OUTSTANDING_FINES, ACCRUED_FINES]
+MONEY = {OUTSTANDING_FINES, ACCRUED_FINES}
+# The counters a change to Transaction rows can move.
+LOAN_NAMES = [COPIES_ON_LOAN, OVERDUE_LOANS, OUTSTANDING_FINES, ACCRUED_FINES]
+
+
+def compute(names=NAMES, today=None):
+    """Recompute counters from the source tables (full aggregates)."""
+    today = today or date.today()
+    values = {}
+    if TOTAL_BOOKS in names or TOTAL_COPIES in names:
+        books = Book.objects.aggregate(n=Count('id'), copies=Sum('total_copies'))
+        values[TOTAL_BOOKS] = books['n']
+        values[TOTAL_COPIES] = books['copies'] or 0
+    if COPIES_ON_LOAN in names:
+        # All open loans. Staff can't borrow (IssueForm and the desk API only
+        # offer members) and cleanup_admin_transactions purges any legacy staff
+        # loans, so this is the member-only count the dashboard showed before.
+        values[COPIES_ON_LOAN] = Transaction.objects.filter(status='issued').count()
+    if OVERDUE_LOANS in names:
+        values[OVERDUE_LOANS] = Transaction.objects.filter(status='issued', due_date__lt=today).count()
+    if OUTSTANDING_FINES in names:
+        values[OUTSTANDING_FINES] = Transaction.objects.filter(
+            status='returned', fine__gt=0, fine_paid=False,
+        ).aggregate(total=Sum('fine'))['total'] or Decimal('0.00')
+    if ACCRUED_FINES in names:
+        values[ACCRUED_FINES] = Transaction.objects.filter(
+            status='issued', accrued_fine__gt=0,
+        ).aggregate(total=Sum('accrued_fine'))['total'] or Decimal('0.00')
+    return {name: values[name] for name in names}
+
+
+def refresh(names=NAMES, today=None):
+    today = today or date.today()
+    values = compute(names, today)
+    with transaction.atomic():
+        for name, value in values.items():
+            Counter.objects.update_or_create(name=name, defaults={'value': value, 'refreshed_on': today})
+    return values
+
+
+def bump(**deltas):
+    """Add ``deltas`` to counters; call after the write, inside its transaction.
+
+    A counter row that does not exist yet is created from source, which
+    already includes the write being counted.
+    """
+    missing = []
+    for name, delta in deltas.items():
+        if delta and not Counter.objects.filter(name=name).update(value=F('value') + delta):
+            missing.append(name)
+    if missing:
+        refresh(missing)
+
+
+def loan_closed(tx):
+    """Counter updates for returning ``tx`` (already marked returned)."""
+    bump(**{COPIES_ON_LOAN: -1, OUTSTANDING_FINES: tx.fine, ACCRUED_FINES: -tx.accrued_fine})
+    # Only loans that were overdue at the last refresh were counted as such.
+    Counter.objects.filter(name=OVERDUE_LOANS, refreshed_on__gt=tx.due_date, value__gt=0).update(
+        value=F('value') - 1
+    )
+
+
+def loans_closed(txs):
+    """Counter updates for returning all of ``txs`` at once."""
+    overdue_as_of = Counter.objects.filter(name=OVERDUE_LOANS).values_list('refreshed_on', flat=True).first()
+    bump(**{
+        COPIES_ON_LOAN: -len(txs),
+        OUTSTANDING_FINES: sum(tx.fine for tx in txs),
+        ACCRUED_FINES: -sum(tx.accrued_fine for tx in txs),
+        OVERDUE_LOANS: -sum(1 for tx in txs if overdue_as_of and tx.due_date < overdue_as_of),
+    })
+
+
+def loans_deleted(loans):
+    """Counter deltas for deleting the Transaction queryset ``loans``; read them before the delete."""
+    overdue_as_of = Counter.objects.filter(name=OVERDUE_LOANS).values_list('refreshed_on', flat=True).first()
+    totals = loans.aggregate(
+        on_loan=Count('id', filter=Q(status='issued')),
+        overdue=Count('id', filter=Q(status='issued', due_date__lt=overdue_as_of or date.min)),
+        accrued=Sum('accrued_fine', filter=Q(status='issued')),
+        outstanding=Sum('fine', filter=Q(status='returned', fine__gt=0, fine_paid=False)),
+    )
+    return {
+        COPIES_ON_LOAN: -totals['on_loan'],
+        OVERDUE_LOANS: -totals['overdue'],
+        ACCRUED_FINES: -(totals['accrued'] or 0),
+        OUTSTANDING_FINES: -(totals['outstanding'] or 0),
+    }
+
+
+def snapshot():
+    """All counters as a dict (counts as ints), plus the overdue refresh date."""
+    rows = {c.name: c for c in Counter.objects.filter(name__in=NAMES)}
+    if len(rows) < len(NAMES):
+        refresh([name for name in NAMES if name not in rows])
+        rows = {c.name: c for c in Counter.objects.filter(name__in=NAMES)}
+    return _snapshot(rows)
+
+
+async def asnapshot():
+    """Async version of snapshot(); rebuilding missing counters still runs in a thread."""
+    rows = {c.name: c async for c in Counter.objects.filter(name__in=NAMES)}
+    if len(rows) < len(NAMES):
+        return await sync_to_async(snapshot)()
+    return _snapshot(rows)
+
+
+def _snapshot(rows):
+    data = {name: rows[name].value if name in MONEY else int(rows[name].value) for name in NAMES}
+    data['overdue_as_of'] = rows[OVERDUE_LOANS].refreshed_on
+    return data
@@ -0,0 +1,34 @@
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+LOCK_ERRORS = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def is_lock_error(exc):
+    return isinstance(exc, OperationalError) and any(msg in str(exc).lower() for msg in LOCK_ERRORS)
+
+
+def retry_on_lock(func):
+    """Rerun a write transaction that lost the SQLite write lock, with backoff.
+
+    Retries LIBRARY_WRITE_RETRIES times, doubling LIBRARY_WRITE_RETRY_DELAY
+    each attempt (with jitter so colliding writers spread out). Only the
+    outermost call retries: inside an enclosing atomic block the whole
+    transaction is already lost, so the error is passed up to it.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        retries = getattr(settings, 'LIBRARY_WRITE_RETRIES', 0)
+        delay = getattr(settings, 'LIBRARY_WRITE_RETRY_DELAY', 0.05)
+        for attempt in range(retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if attempt == retries or connection.in_atomic_block or not is_lock_error(exc):
+                    raise
+            time.sleep(delay * 2 ** attempt * random.uniform(0.5, 1.5))
+    return wrapper
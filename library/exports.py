@@ -0,0 +1,85 @@
+import csv
+import heapq
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Value
+
+from .models import ArchivedTransaction, Book, Transaction
+
+CHUNK_SIZE = 2000
+
+TRANSACTION_FIELDS = [
+    'id', 'user__username', 'book__code_no', 'book__title', 'issue_date', 'due_date',
+    'return_date', 'fine', 'fine_paid', 'status',
+]
+BOOK_FIELDS = [
+    'id', 'code_no', 'title', 'author', 'category__name', 'isbn', 'total_copies',
+    'available_copies', 'added_on',
+]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def transactions(issued_from=None, issued_to=None, returned_from=None, returned_to=None):
+    """Live and archived loans; archived ones are all returned."""
+    tables = [Transaction.objects.all(), ArchivedTransaction.objects.annotate(status=Value('returned'))]
+    sources = []
+    for rows in tables:
+        if issued_from:
+            rows = rows.filter(issue_date__gte=issued_from)
+        if issued_to:
+            rows = rows.filter(issue_date__lte=issued_to)
+        if returned_from:
+            rows = rows.filter(return_date__gte=returned_from)
+        if returned_to:
+            rows = rows.filter(return_date__lte=returned_to)
+        sources.append(rows.order_by('id').values_list(*TRANSACTION_FIELDS))
+    return sources, TRANSACTION_FIELDS
+
+
+def books(**filters):
+    return [Book.objects.order_by('id').values_list(*BOOK_FIELDS)], BOOK_FIELDS
+
+
+DATASETS = {
+    'transactions': transactions,
+    'books': books,
+}
+
+
+class _Echo:
+    # csv.writer wants a file; hand each formatted line straight back instead.
+    def write(self, value):
+        return value
+
+
+def _header(field):
+    return field.replace('__', '_')
+
+
+def _merged(sources, chunk_size):
+    # Every source is ordered by id, which is unique across them and comes first in each row.
+    return heapq.merge(*(rows.iterator(chunk_size=chunk_size) for rows in sources))
+
+
+def lines(sources, fields, fmt, chunk_size=CHUNK_SIZE):
+    """Yield the export one line at a time from server-side cursors."""
+    rows = _merged(sources, chunk_size)
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow([_header(f) for f in fields])
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        names = [_header(f) for f in fields]
+        encoder = DjangoJSONEncoder(separators=(',', ':'))
+        for row in rows:
+            yield encoder.encode(dict(zip(names, row))) + '\n'
+
+
+def export(dataset, fmt='csv', chunk_size=CHUNK_SIZE, **filters):
+    sources, fields = DATASETS[dataset](**filters)
+    return lines(sources, fields, fmt, chunk_size)
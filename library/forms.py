@@ -1,13 +1,63 @@
 from django import forms
 from .models import Book, Category, Member
 from django.contrib.auth.models import User
+from django.urls import reverse
 
 class BookSearchForm(forms.Form):
-    q = forms.CharField(label="Search books (title)", required=False)
+    q = forms.CharField(label="Search books (title, author, ISBN, code, category)", required=False)
+    category = forms.ModelChoiceField(queryset=Category.objects.order_by('name'), required=False, empty_label="All categories")
+    available = forms.BooleanField(label="Available only", required=False)
+
+    def __init__(self, *args, categories=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Async views pass categories they fetched themselves, so neither
+        # rendering nor validating the filter has to hit the database.
+        if categories is not None:
+            self._categories = {c.pk: c for c in categories}
+            self.fields['category'] = forms.TypedChoiceField(
+                choices=[('', 'All categories')] + [(c.pk, c.name) for c in categories],
+                coerce=int, empty_value=None, required=False,
+            )
+
+    def clean_category(self):
+        category = self.cleaned_data.get('category')
+        if isinstance(category, int):
+            return self._categories[category]
+        return category
+
+class AutocompleteInput(forms.Widget):
+    """Typeahead over a JSON endpoint instead of a <select> of every row.
+
+    Only the chosen primary key is posted, and the field validates just that
+    one ID; rendering looks up the label of the current value, nothing more.
+    """
+    template_name = 'library/widgets/autocomplete.html'
+
+    def __init__(self, url_name, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['url'] = reverse(self.url_name)
+        context['widget']['label'] = self.label_for(value)
+        return context
+
+    def label_for(self, value):
+        choices = getattr(self, 'choices', None)
+        if value in (None, '') or choices is None:
+            return ''
+        try:
+            obj = choices.queryset.filter(pk=value).first()
+        except (TypeError, ValueError):
+            return ''
+        return choices.field.label_from_instance(obj) if obj else ''
+
 
 class IssueForm(forms.Form):
-    book = forms.ModelChoiceField(queryset=Book.objects.all())
-    user = forms.ModelChoiceField(queryset=User.objects.all(), required=False)
+    book = forms.ModelChoiceField(queryset=Book.objects.all(), widget=AutocompleteInput('autocomplete_books'))
+    user = forms.ModelChoiceField(queryset=User.objects.all(), required=False,
+                                  widget=AutocompleteInput('autocomplete_members'))
     
     def __init__(self, *args, **kwargs):
         current_user = kwargs.pop('current_user', None)
@@ -15,8 +65,24 @@ class IssueForm(forms.Form):
         
         if current_user and current_user.is_staff:
             self.fields['user'].required = True
-            self.fields['user'].queryset = User.objects.filter(is_staff=False).order_by('username')
-            self.fields['user'].empty_label = "Select a user to issue book to"
+            self.fields['user'].queryset = User.objects.filter(is_staff=False)
+
+class ExportForm(forms.Form):
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('jsonl', 'JSON lines')], required=False)
+    issued_from = forms.DateField(required=False)
+    issued_to = forms.DateField(required=False)
+    returned_from = forms.DateField(required=False)
+    returned_to = forms.DateField(required=False)
+
+class AnalyticsForm(forms.Form):
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get('start') and cleaned.get('end') and cleaned['start'] > cleaned['end']:
+            raise forms.ValidationError('The start date must not be after the end date.')
+        return cleaned
 
 class ReturnForm(forms.Form):
     transaction_id = forms.IntegerField(widget=forms.HiddenInput)
@@ -0,0 +1,160 @@
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from . import catalog
+from .db import retry_on_lock
+from .models import Book, Hold
+
+PICKUP_DAYS = 3
+QUEUE_ORDER = ('-priority', 'created_at', 'id')
+
+
+class HoldError(Exception):
+    pass
+
+
+class AlreadyHeld(HoldError):
+    pass
+
+
+class CopyOnShelf(HoldError):
+    pass
+
+
+@retry_on_lock
+def place_hold(book, user, priority=0):
+    """Queue ``user`` for ``book``; only when no copy is on the shelf."""
+    if Book.objects.filter(pk=book.pk, available_copies__gt=0).exists():
+        raise CopyOnShelf(book)
+    try:
+        with transaction.atomic():
+            return Hold.objects.create(book=book, user=user, priority=priority)
+    except IntegrityError:
+        raise AlreadyHeld(book)
+
+
+def _next_waiting(book_id):
+    # Served from hold_queue_idx: a seek to the head of this book's queue.
+    return Hold.objects.filter(book_id=book_id, status='waiting').order_by(*QUEUE_ORDER).first()
+
+
+def release_copies(book_id, count=1, today=None):
+    """Hand ``count`` freed copies of a book to the head of its queue.
+
+    Each copy goes to the next waiting hold, which becomes ready for pickup;
+    copies nobody is waiting for go back on the shelf. Call inside the
+    transaction that freed the copies. Returns the holds made ready.
+    """
+    today = today or date.today()
+    readied = []
+    while len(readied) < count:
+        hold = _next_waiting(book_id)
+        if hold is None:
+            break
+        # Conditional, so a hold cancelled meanwhile is skipped, not revived.
+        if Hold.objects.filter(pk=hold.pk, status='waiting').update(
+            status='ready', ready_on=today, expires_on=today + timedelta(days=PICKUP_DAYS)
+        ):
+            readied.append(hold)
+    leftover = count - len(readied)
+    if leftover:
+        Book.objects.filter(pk=book_id).update(
+            available_copies=Least(F('available_copies') + leftover, F('total_copies')),
+            updated_at=timezone.now(),
+        )
+        catalog.changed()
+    return readied
+
+
+def books_with_queues(book_ids):
+    return set(
+        Hold.objects.filter(book_id__in=book_ids, status='waiting').values_list('book_id', flat=True).distinct()
+    )
+
+
+def claim(book, user):
+    """Turn ``user``'s ready hold on ``book`` into a loan; True if there was one.
+
+    The held copy was never put back on the shelf, so the caller must not
+    take another one.
+    """
+    return bool(Hold.objects.filter(book=book, user=user, status='ready').update(status='fulfilled'))
+
+
+def claim_many(user, book_ids):
+    """Fulfil ``user``'s ready holds among ``book_ids``; return the book ids served."""
+    ready = Hold.objects.filter(user=user, book_id__in=list(book_ids), status='ready')
+    served = list(ready.values_list('book_id', flat=True))
+    if served:
+        ready.filter(book_id__in=served).update(status='fulfilled')
+    return served
+
+
+@retry_on_lock
+def cancel(hold, today=None):
+    with transaction.atomic():
+        was_ready = Hold.objects.filter(pk=hold.pk, status='ready').exists()
+        cancelled = Hold.objects.filter(pk=hold.pk, status__in=['waiting', 'ready']).update(status='cancelled')
+        if not cancelled:
+            return False
+        if was_ready:
+            release_copies(hold.book_id, 1, today)
+    return True
+
+
+@retry_on_lock
+def expire_holds(today=None):
+    """Expire every uncollected ready hold in bulk and pass its copy on.
+
+    Returns ``(holds_expired, holds_readied)``.
+    """
+    today = today or date.today()
+    overdue = Hold.objects.filter(status='ready', expires_on__lt=today)
+    with transaction.atomic():
+        per_book = list(overdue.values('book_id').annotate(n=Count('id')).values_list('book_id', 'n'))
+        expired = overdue.update(status='expired')
+        readied = 0
+        for book_id, n in per_book:
+            readied += len(release_copies(book_id, n, today))
+    return expired, readied
+
+
+def _active(user):
+    return (
+        Hold.objects.filter(user=user, status__in=['waiting', 'ready'])
+        .select_related('book').only('status', 'priority', 'created_at', 'expires_on', 'book__title')
+        .order_by('created_at')
+    )
+
+
+def active_holds(user):
+    """``user``'s waiting and ready holds, each with ``position`` set when waiting."""
+    active = list(_active(user))
+    for hold in active:
+        hold.position = queue_position(hold) if hold.status == 'waiting' else None
+    return active
+
+
+async def aactive_holds(user):
+    """Async version of active_holds()."""
+    active = [hold async for hold in _active(user)]
+    for hold in active:
+        hold.position = await _ahead(hold).acount() + 1 if hold.status == 'waiting' else None
+    return active
+
+
+def _ahead(hold):
+    return Hold.objects.filter(book_id=hold.book_id, status='waiting').filter(
+        Q(priority__gt=hold.priority)
+        | Q(priority=hold.priority, created_at__lt=hold.created_at)
+        | Q(priority=hold.priority, created_at=hold.created_at, id__lt=hold.id)
+    )
+
+
+def queue_position(hold):
+    """1-based place of a waiting hold in its book's queue."""
+    return _ahead(hold).count() + 1
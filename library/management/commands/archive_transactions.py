@@ -0,0 +1,33 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from library import archive
+
+
+class Command(BaseCommand):
+    help = 'Move settled loans returned before a cutoff into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=date.fromisoformat,
+                            help=f'Archive loans returned before this day (default: {archive.ARCHIVE_AFTER_DAYS} days ago)')
+        parser.add_argument('--batch-size', type=int, default=archive.BATCH_SIZE,
+                            help=f'Loans moved per transaction (default {archive.BATCH_SIZE})')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = options['before'] or archive.default_cutoff()
+        if options['dry_run']:
+            count = archive.archivable(cutoff).count()
+            self.stdout.write(f'{count} settled loans returned before {cutoff} would be archived.')
+            return
+
+        started = time.perf_counter()
+        moved = archive.archive(
+            cutoff, max(1, options['batch_size']),
+            progress=lambda n: self.stdout.write(f'Archived {n} loans...'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} settled loans returned before {cutoff} in {time.perf_counter() - started:.2f}s.'
+        ))
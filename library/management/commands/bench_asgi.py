@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import bench
+
+
+class Command(BaseCommand):
+    help = 'Compare read-page throughput of the async (ASGI) and sync (WSGI) views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--db', default='bench.sqlite3', help='Database created by bench_seed')
+        parser.add_argument('--clients', type=int, default=16, help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per client')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', '-o', help='Write the JSON report here')
+
+    def handle(self, *args, **options):
+        path = Path(options['db'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist; create it with bench_seed first.')
+        bench.use_database(path)
+
+        args = (options['clients'], options['requests'], options['seed'])
+        report = {
+            'wsgi': bench.run_wsgi_reads(*args),
+            'asgi': bench.run_asgi_reads(*args),
+            'config': {k: options[k] for k in ('clients', 'requests', 'seed')},
+            'environment': bench.environment(),
+        }
+
+        self.stdout.write(f"{'mode':<6} {'requests':>8} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for mode in ('wsgi', 'asgi'):
+            s = report[mode]['total']
+            self.stdout.write(
+                f"{mode:<6} {s['count']:>8} {s['errors']:>6} {s['throughput_rps'] or 0:>8} "
+                f"{s['p50_ms'] or 0:>8} {s['p95_ms'] or 0:>8} {s['p99_ms'] or 0:>8}"
+            )
+        if options['output']:
+            bench.write_report(options['output'], report)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}."))
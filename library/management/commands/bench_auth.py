@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from library import bench
+
+
+class Command(BaseCommand):
+    help = 'Compare SQL queries per request across the session/auth profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--db', default='bench.sqlite3', help='Database created by bench_seed')
+        parser.add_argument('--clients', type=int, default=8, help='Logged-in members taking turns')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per page and profile')
+        parser.add_argument('--profiles', default=','.join(settings.AUTH_PROFILES),
+                            help='Comma-separated profiles to compare (default: all)')
+        parser.add_argument('--output', '-o', help='Write the JSON report here')
+
+    def handle(self, *args, **options):
+        path = Path(options['db'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist; create it with bench_seed first.')
+        profiles = options['profiles'].split(',')
+        unknown = set(profiles) - set(settings.AUTH_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+        bench.use_database(path)
+
+        report = {'profiles': {}, 'environment': bench.environment(),
+                  'config': {k: options[k] for k in ('clients', 'requests')}}
+        self.stdout.write(f"{'profile':<8} {'page':<10} {'queries':>8} {'auth':>6} {'mean ms':>8}")
+        for profile in profiles:
+            result = bench.run_auth_queries(profile, options['requests'], options['clients'])
+            report['profiles'][profile] = result
+            for page, s in result.items():
+                self.stdout.write(
+                    f"{profile:<8} {page:<10} {s['queries_per_request']:>8} "
+                    f"{s['auth_queries_per_request']:>6} {s['mean_ms']:>8}"
+                )
+
+        if options['output']:
+            bench.write_report(options['output'], report)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}."))
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import bench
+
+
+class Command(BaseCommand):
+    help = 'Run simulated concurrent clients against a benchmark database and report latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--db', default='bench.sqlite3', help='Database created by bench_seed')
+        parser.add_argument('--clients', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=100, help='Requests per client')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', '-o', help='Write the JSON report here')
+
+    def handle(self, *args, **options):
+        path = Path(options['db'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist; create it with bench_seed first.')
+        bench.use_database(path)
+
+        report = bench.run_load(options['clients'], options['requests'], seed=options['seed'])
+        report['config'] = {k: options[k] for k in ('clients', 'requests', 'seed')}
+        report['config']['db'] = str(path)
+        report['environment'] = bench.environment()
+
+        self.write_table(report)
+        if options['output']:
+            bench.write_report(options['output'], report)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}."))
+
+    def write_table(self, report):
+        self.stdout.write(f"{'operation':<10} {'count':>7} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        rows = list(report['operations'].items()) + [('total', report['total'])]
+        for op, s in rows:
+            self.stdout.write(
+                f"{op:<10} {s['count']:>7} {s['errors']:>6} {s['throughput_rps'] or 0:>8} "
+                f"{s['p50_ms'] or 0:>8} {s['p95_ms'] or 0:>8} {s['p99_ms'] or 0:>8}"
+            )
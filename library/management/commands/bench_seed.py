@@ -0,0 +1,37 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import bench
+from library.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Create a SQLite benchmark database filled with deterministic synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--db', default='bench.sqlite3', help='SQLite file to create (default: bench.sqlite3)')
+        parser.add_argument('--scale', default='10k', help='10k, 100k, 1m or a number of books/transactions')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--force', action='store_true', help='Overwrite an existing database file')
+
+    def handle(self, *args, **options):
+        path = Path(options['db'])
+        if path.exists():
+            if not options['force']:
+                raise CommandError(f'{path} exists; pass --force to replace it.')
+            path.unlink()
+        try:
+            scale = bench.parse_scale(options['scale'])
+        except ValueError:
+            raise CommandError(f"Unknown scale {options['scale']!r}")
+
+        bench.prepare_database(path)
+        if Book.objects.exists():
+            raise CommandError(f'{path} already has data.')
+
+        started = time.perf_counter()
+        bench.generate(scale, seed=options['seed'], log=lambda msg: self.stdout.write(f'  {msg}'))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Seeded {path} at scale {scale} in {elapsed:.1f}s.'))
@@ -0,0 +1,51 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import bench
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent issue/return throughput and lock errors across database profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--db', default='bench.sqlite3', help='Database created by bench_seed (left untouched)')
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--ops', type=int, default=100, help='Write operations per thread')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--scenarios', default=','.join(bench.WRITE_SCENARIOS),
+                            help='Comma-separated scenarios to run (default: before,after)')
+        parser.add_argument('--output', '-o', help='Write the JSON report here')
+
+    def handle(self, *args, **options):
+        path = Path(options['db'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist; create it with bench_seed first.')
+        scenarios = options['scenarios'].split(',')
+        unknown = set(scenarios) - set(bench.WRITE_SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        report = {'scenarios': {}, 'environment': bench.environment(),
+                  'config': {k: options[k] for k in ('threads', 'ops', 'seed')}}
+        with tempfile.TemporaryDirectory() as scratch:
+            for scenario in scenarios:
+                # Each scenario starts from its own copy of the same data.
+                copy = Path(scratch) / f'{scenario}.sqlite3'
+                shutil.copyfile(path, copy)
+                bench.prepare_database(copy)
+                result = bench.run_write_scenario(copy, scenario, options['threads'], options['ops'], options['seed'])
+                report['scenarios'][scenario] = result
+                total = result['total']
+                attempts = total['count'] + total['errors']
+                self.stdout.write(
+                    f"{scenario:<7} {result['config']['profile']:<11} {result['config']['journal_mode']:<7} "
+                    f"{total['throughput_rps'] or 0:>8} ops/s  {total['errors']:>5} errors "
+                    f"({100 * total['errors'] / attempts if attempts else 0:.1f}%)  p95 {total['p95_ms'] or 0} ms"
+                )
+
+        if options['output']:
+            bench.write_report(options['output'], report)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}."))
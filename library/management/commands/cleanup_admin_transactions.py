@@ -1,37 +1,80 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from library.models import Transaction
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Least
+from django.utils import timezone
+from library import catalog, counters, holds, inventory
+from library.models import Book, MemberSummary, Transaction
 
 class Command(BaseCommand):
     help = 'Clean up any existing transactions for admin users'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be deleted and restored without changing anything')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Transactions deleted per atomic chunk (default 5000)')
+
     def handle(self, *args, **options):
-        # Find all transactions for staff users
-        admin_transactions = Transaction.objects.filter(user__is_staff=True)
+        staff_ids = list(User.objects.filter(is_staff=True).values_list('id', flat=True))
+        admin_transactions = Transaction.objects.filter(user_id__in=staff_ids)
         count = admin_transactions.count()
-        
-        if count > 0:
-            self.stdout.write(
-                self.style.WARNING(f'Found {count} transactions for admin users. These will be deleted.')
-            )
-            
-            # Return books to available stock before deleting transactions
-            for tx in admin_transactions:
-                if tx.status == 'issued':
-                    book = tx.book
-                    book.available_copies += 1
-                    if book.available_copies > book.total_copies:
-                        book.available_copies = book.total_copies
-                    book.save()
-                    self.stdout.write(f'Returned book: {book.title}')
-            
-            # Delete the transactions
-            admin_transactions.delete()
-            
-            self.stdout.write(
-                self.style.SUCCESS(f'Successfully cleaned up {count} admin transactions.')
-            )
-        else:
+
+        if count == 0:
             self.stdout.write(
                 self.style.SUCCESS('No admin transactions found. Database is clean.')
-            )
\ No newline at end of file
+            )
+            return
+
+        open_per_book = dict(
+            admin_transactions.filter(status='issued').order_by()
+            .values('book_id').annotate(n=Count('id')).values_list('book_id', 'n')
+        )
+        self.stdout.write(self.style.WARNING(
+            f'Found {count} transactions for admin users ({sum(open_per_book.values())} open '
+            f'across {len(open_per_book)} books). These will be deleted.'
+        ))
+        if options['dry_run']:
+            self.stdout.write('Dry run: nothing was changed.')
+            return
+
+        deleted = 0
+        last_id = 0
+        batch_size = max(1, options['batch_size'])
+        while True:
+            ids = list(admin_transactions.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            # Each chunk puts its open loans' copies back and deletes them
+            # together, so an interrupted run leaves stock consistent and a
+            # rerun carries on where it stopped.
+            with transaction.atomic():
+                self.restore_copies(Transaction.objects.filter(pk__in=ids, status='issued'))
+                deleted += Transaction.objects.filter(pk__in=ids).delete()[0]
+            self.stdout.write(f'Deleted {deleted}/{count} admin transactions...')
+
+        counters.refresh()
+        # Rebuilt on demand if any of them is ever needed again.
+        MemberSummary.objects.filter(user_id__in=staff_ids).delete()
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully cleaned up {deleted} admin transactions.')
+        )
+
+    def restore_copies(self, open_loans):
+        queued = holds.books_with_queues(open_loans.values('book_id'))
+        for book_id, n in open_loans.filter(book_id__in=queued).values_list('book_id').annotate(n=Count('id')):
+            holds.release_copies(book_id, n)
+        # Copies handed to a queue don't update the book; flag it for reconciling.
+        inventory.touch(queued)
+        # Everything else in one UPDATE, capped at total_copies.
+        per_book = (
+            open_loans.filter(book_id=OuterRef('pk')).order_by()
+            .values('book_id').annotate(n=Count('id')).values('n')
+        )
+        Book.objects.filter(pk__in=open_loans.values('book_id')).exclude(pk__in=queued).update(
+            available_copies=Least(F('available_copies') + Subquery(per_book), F('total_copies')),
+            updated_at=timezone.now(),
+        )
+        catalog.changed()
@@ -0,0 +1,20 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from library import holds
+
+
+class Command(BaseCommand):
+    help = 'Expire uncollected ready holds and pass their copies to the next in line'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat,
+                            help='Expire as of this day instead of today (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        today = options['date'] or date.today()
+        expired, readied = holds.expire_holds(today)
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired {expired} holds as of {today}; {readied} copies passed to waiting members.'
+        ))
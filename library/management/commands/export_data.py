@@ -0,0 +1,46 @@
+import sys
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from library import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream transactions or the book catalog to CSV or JSON lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(exports.DATASETS))
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--output', '-o', help='Output file (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE)
+        parser.add_argument('--issued-from', type=date.fromisoformat, help='YYYY-MM-DD (transactions only)')
+        parser.add_argument('--issued-to', type=date.fromisoformat, help='YYYY-MM-DD (transactions only)')
+        parser.add_argument('--returned-from', type=date.fromisoformat, help='YYYY-MM-DD (transactions only)')
+        parser.add_argument('--returned-to', type=date.fromisoformat, help='YYYY-MM-DD (transactions only)')
+
+    def handle(self, *args, **options):
+        filters = {}
+        if options['dataset'] == 'transactions':
+            for key in ('issued_from', 'issued_to', 'returned_from', 'returned_to'):
+                if options[key]:
+                    filters[key] = options[key]
+
+        out = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        started = time.perf_counter()
+        rows = -1 if options['format'] == 'csv' else 0  # don't count the CSV header
+        try:
+            for line in exports.export(options['dataset'], options['format'],
+                                       chunk_size=options['chunk_size'], **filters):
+                out.write(line)
+                rows += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        if options['output']:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"Exported {rows} {options['dataset']} to {options['output']} in {elapsed:.1f}s."
+            ))
@@ -0,0 +1,167 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from library import catalog, copies, counters, search
+from library.models import Book, Category
+
+
+class MalformedRecord:
+    """Stands in for a JSON line that does not parse, so it can be reported and skipped."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def numbered_rows(stream, fmt):
+    """Yield ``(line_number, record)`` for each input record without loading the file."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if line:
+                try:
+                    yield number, json.loads(line)
+                except json.JSONDecodeError as exc:
+                    yield number, MalformedRecord(exc)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Import or update books in bulk from a CSV or JSON-lines file (upsert by code_no)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (default: guessed from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+
+        imported = 0
+        self.errors = 0
+        started = time.perf_counter()
+        try:
+            for batch in batched(numbered_rows(stream, fmt), batch_size):
+                books = self.build_books(batch)
+                if books:
+                    self.upsert(books)
+                imported += len(books)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{imported} rows imported ({imported / elapsed:.0f} rows/s)')
+        except (ValueError, csv.Error) as exc:
+            raise CommandError(f'Could not parse input after {imported} rows: {exc}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        # bulk_create bypasses the signals that maintain the book counters.
+        counters.refresh([counters.TOTAL_BOOKS, counters.TOTAL_COPIES])
+
+        elapsed = time.perf_counter() - started
+        rate = imported / elapsed if elapsed else imported
+        if self.errors:
+            self.stdout.write(self.style.WARNING(f'Skipped {self.errors} rows with errors.'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} rows in {elapsed:.1f}s ({rate:.0f} rows/s).'
+        ))
+
+    def category_id(self, name):
+        name = (name or '').strip()
+        if not name:
+            return None
+        if name not in self.categories:
+            category, _ = Category.objects.get_or_create(name=name)
+            self.categories[name] = category.id
+        return self.categories[name]
+
+    def reject(self, line, code_no, message):
+        self.errors += 1
+        self.stdout.write(self.style.ERROR(f'line {line} ({code_no or "no code_no"}): {message}'))
+
+    def build_books(self, rows):
+        """Unsaved books for the valid ``(line, record)`` pairs in ``rows``; the rest are reported."""
+        # Later rows for the same code_no win, as they would with one-by-one saves.
+        books = {}
+        for line, row in rows:
+            if isinstance(row, MalformedRecord):
+                self.reject(line, None, f'invalid JSON: {row.error}')
+                continue
+            if not isinstance(row, dict):
+                self.reject(line, None, 'record is not an object')
+                continue
+            code_no = str(row.get('code_no') or '').strip()
+            title = str(row.get('title') or '').strip()
+            if not code_no or not title:
+                self.reject(line, code_no, 'code_no and title are required')
+                continue
+            total = row.get('total_copies')
+            try:
+                total = int(str(total).strip()) if total not in (None, '') else 1
+            except ValueError:
+                self.reject(line, code_no, 'total_copies must be a whole number')
+                continue
+            if total < 0:
+                self.reject(line, code_no, 'total_copies must not be negative')
+                continue
+            books[code_no] = Book(
+                code_no=code_no,
+                title=title,
+                author=str(row.get('author') or '').strip(),
+                category_id=self.category_id(row.get('category')),
+                isbn=str(row.get('isbn') or '').strip(),
+                total_copies=total,
+                available_copies=total,
+            )
+        return list(books.values())
+
+    def upsert(self, books):
+        codes = [b.code_no for b in books]
+        with transaction.atomic():
+            # Existing books keep their loans: shift availability by the change
+            # in total copies rather than resetting it.
+            existing = {
+                code: (total, available)
+                for code, total, available in Book.objects.filter(code_no__in=codes)
+                .values_list('code_no', 'total_copies', 'available_copies')
+            }
+            for book in books:
+                if book.code_no in existing:
+                    total, available = existing[book.code_no]
+                    book.available_copies = max(0, available + book.total_copies - total)
+
+            Book.objects.bulk_create(
+                books,
+                update_conflicts=True,
+                unique_fields=['code_no'],
+                update_fields=['title', 'author', 'category', 'isbn', 'total_copies', 'available_copies', 'updated_at'],
+            )
+            # bulk_create skips signals, so refresh the search index and label copies here.
+            ids = list(Book.objects.filter(code_no__in=codes).values_list('id', flat=True))
+            search.index_books(ids)
+            copies.add_missing_copies(ids)
+            catalog.changed()
@@ -0,0 +1,200 @@
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from library.management.commands.import_catalog import MalformedRecord, batched, numbered_rows
+from library.models import Member
+
+FIELD_LIMITS = {
+    'first_name': User._meta.get_field('first_name').max_length,
+    'last_name': User._meta.get_field('last_name').max_length,
+    'phone': Member._meta.get_field('phone').max_length,
+    'adhaar': Member._meta.get_field('adhaar').max_length,
+}
+
+
+def _setup_worker():
+    # Spawned (rather than forked) workers start without Django configured.
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = ('Create members in bulk from a CSV or JSON-lines file with columns username, password, '
+            'first_name, last_name, email, phone, adhaar, membership_type and membership_start')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (default: guessed from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Processes hashing passwords (default: one per core; 0 hashes in-process)')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the rows and report errors')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+        workers = max(0, options['workers'] or 0)
+
+        self.today = date.today()
+        self.seen = set()
+        self.errors = 0
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        executor = ProcessPoolExecutor(workers, initializer=_setup_worker) if workers and not options['dry_run'] else None
+
+        created = 0
+        started = time.perf_counter()
+        try:
+            pending = None
+            for batch in batched(numbered_rows(stream, fmt), batch_size):
+                rows = self.validate(batch)
+                if options['dry_run']:
+                    created += len(rows)
+                    continue
+                # Hashing of this batch runs in the pool while the previous one is written.
+                passwords = [row.pop('password') for _, row in rows]
+                if executor:
+                    hashes = executor.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4)))
+                else:
+                    hashes = map(make_password, passwords)
+                if pending:
+                    created += self.insert(*pending)
+                    self.report_progress(created, started)
+                pending = (rows, hashes)
+            if pending:
+                created += self.insert(*pending)
+        except (ValueError, csv.Error) as exc:
+            raise CommandError(f'Could not parse input after {created} members: {exc}')
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        rate = created / elapsed if elapsed else created
+        if self.errors:
+            self.stdout.write(self.style.WARNING(f'Skipped {self.errors} rows with errors.'))
+        verb = 'Validated' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {created} members in {elapsed:.1f}s ({rate:.0f} rows/s).'))
+
+    def report_progress(self, created, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{created} members created ({created / elapsed:.0f} rows/s)')
+
+    def reject(self, line, username, message):
+        self.errors += 1
+        self.stdout.write(self.style.ERROR(f'line {line} ({username or "no username"}): {message}'))
+
+    def validate(self, batch):
+        """The clean ``(line, fields)`` pairs of ``batch``; the rest are reported."""
+        usernames = {str(row.get('username') or '').strip() for _, row in batch if isinstance(row, dict)}
+        taken = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        valid = []
+        for line, row in batch:
+            if isinstance(row, MalformedRecord):
+                self.reject(line, None, f'invalid JSON: {row.error}')
+                continue
+            if not isinstance(row, dict):
+                self.reject(line, None, 'record is not an object')
+                continue
+            username = str(row.get('username') or '').strip()
+            try:
+                fields = self.clean_row(row, username, taken)
+            except ValidationError as exc:
+                self.reject(line, username, ' '.join(exc.messages))
+                continue
+            self.seen.add(username)
+            valid.append((line, fields))
+        return valid
+
+    def clean_row(self, row, username, taken):
+        if not username:
+            raise ValidationError('username is required')
+        if len(username) > User._meta.get_field('username').max_length:
+            raise ValidationError('username is too long')
+        User.username_validator(username)
+        if username in taken or username in self.seen:
+            raise ValidationError('username is already taken')
+        password = str(row.get('password') or '')
+        if not password:
+            raise ValidationError('password is required')
+
+        fields = {'username': username, 'password': password}
+        for name, limit in FIELD_LIMITS.items():
+            fields[name] = str(row.get(name) or '').strip()
+            if len(fields[name]) > limit:
+                raise ValidationError(f'{name} is longer than {limit} characters')
+        fields['email'] = str(row.get('email') or '').strip()
+        if fields['email']:
+            validate_email(fields['email'])
+
+        fields['membership_type'] = str(row.get('membership_type') or '1y').strip()
+        if fields['membership_type'] not in dict(Member.MEMBERSHIP_CHOICES):
+            choices = ', '.join(code for code, _ in Member.MEMBERSHIP_CHOICES)
+            raise ValidationError(f'membership_type must be one of {choices}')
+        start = str(row.get('membership_start') or '').strip()
+        try:
+            fields['membership_start'] = date.fromisoformat(start) if start else self.today
+        except ValueError:
+            raise ValidationError('membership_start must be a YYYY-MM-DD date')
+        return fields
+
+    def build(self, fields, password):
+        user = User(
+            username=fields['username'], password=password, first_name=fields['first_name'],
+            last_name=fields['last_name'], email=fields['email'],
+        )
+        member = Member(
+            user=user,
+            phone=fields['phone'],
+            adhaar=fields['adhaar'],
+            membership_type=fields['membership_type'],
+            membership_start=fields['membership_start'],
+            membership_end=Member.membership_end_for(fields['membership_type'], fields['membership_start']),
+        )
+        return user, member
+
+    def insert(self, rows, hashes):
+        """Create the users and members of one batch; return how many were created."""
+        pairs = [(line, *self.build(fields, password)) for (line, fields), password in zip(rows, hashes)]
+        try:
+            with transaction.atomic():
+                self.save([user for _, user, _ in pairs], [member for _, _, member in pairs])
+            return len(pairs)
+        except IntegrityError:
+            pass
+        # Someone else took a username meanwhile: find the rows that clash.
+        created = 0
+        for line, user, member in pairs:
+            # Forget the ids handed out by the rolled-back attempt; reassigning
+            # the user clears member.user_id until the user is saved again.
+            user.pk = None
+            member.pk = None
+            member.user = user
+            try:
+                with transaction.atomic():
+                    self.save([user], [member])
+                created += 1
+            except IntegrityError as exc:
+                self.reject(line, user.username, str(exc))
+        return created
+
+    def save(self, users, members):
+        # bulk_create sets the users' ids, which the members then pick up.
+        User.objects.bulk_create(users)
+        Member.objects.bulk_create(members)
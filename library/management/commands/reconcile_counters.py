@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from library import counters
+from library.models import Counter
+
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard counters from the books and transactions tables'
+
+    def handle(self, *args, **options):
+        before = dict(Counter.objects.filter(name__in=counters.NAMES).values_list('name', 'value'))
+        after = counters.refresh()
+
+        for name in counters.NAMES:
+            old = before.get(name)
+            if old is None or old != after[name]:
+                self.stdout.write(self.style.WARNING(f'{name}: {old} -> {after[name]}'))
+            else:
+                self.stdout.write(f'{name}: {after[name]}')
+        self.stdout.write(self.style.SUCCESS('Counters reconciled.'))
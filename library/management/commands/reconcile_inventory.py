@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library import inventory
+
+
+class Command(BaseCommand):
+    help = 'Check available copies against open loans and ready holds, and optionally fix drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Correct the books that have drifted')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only check books touched since the last clean run')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        drift, since = inventory.reconcile(incremental=options['incremental'], apply=options['fix'])
+        elapsed = time.perf_counter() - started
+
+        scope = f'books touched since {since:%Y-%m-%d %H:%M:%S}' if since else 'all books'
+        for book_id, code_no, available, expected in drift:
+            self.stdout.write(self.style.WARNING(f'{code_no} (id {book_id}): available {available}, expected {expected}'))
+        if not drift:
+            self.stdout.write(self.style.SUCCESS(f'No drift in {scope} ({elapsed:.2f}s).'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(drift)} books in {scope} ({elapsed:.2f}s).'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'{len(drift)} books have drifted in {scope} ({elapsed:.2f}s); rerun with --fix to correct them.'
+            ))
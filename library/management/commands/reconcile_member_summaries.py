@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from library import summaries
+from library.models import MemberSummary
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-member account summaries from the transaction tables'
+
+    def handle(self, *args, **options):
+        before = {s.user_id: s for s in MemberSummary.objects.all()}
+        after = summaries.refresh()
+
+        changed = 0
+        for summary in after:
+            old = before.get(summary.user_id)
+            if old is None:
+                continue
+            diffs = [f'{field}: {getattr(old, field)} -> {getattr(summary, field)}'
+                     for field in summaries.FIELDS if field != 'overdue_as_of'
+                     and getattr(old, field) != getattr(summary, field)]
+            if diffs:
+                changed += 1
+                self.stdout.write(self.style.WARNING(f'user {summary.user_id}: ' + ', '.join(diffs)))
+        self.stdout.write(self.style.SUCCESS(
+            f'Member summaries reconciled: {len(after)} rebuilt, {changed} had drifted.'
+        ))
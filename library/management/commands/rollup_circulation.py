@@ -0,0 +1,30 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from library import rollups
+
+
+class Command(BaseCommand):
+    help = 'Roll up daily circulation for the days after the last rollup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until', type=date.fromisoformat,
+                            help='Last day to roll up (default: yesterday)')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Discard the rollups and rebuild them from the first loan')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        done = rollups.rollup(
+            until=options['until'], rebuild=options['rebuild'],
+            progress=lambda start, end, n: self.stdout.write(f'{start} to {end}: {n} book-days'),
+        )
+        if done is None:
+            last = rollups.rolled_up_to()
+            self.stdout.write(self.style.SUCCESS(f'Nothing to roll up (rolled up to {last or "-"}).'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {done[0]} to {done[1]} in {time.perf_counter() - started:.2f}s.'
+        ))
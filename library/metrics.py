@@ -0,0 +1,72 @@
+"""In-process request metrics, rendered in the Prometheus text format.
+
+Each worker process keeps its own histograms; observations only take a
+lock and bump a few integers, so recording stays cheap on every request.
+"""
+import threading
+from bisect import bisect_left
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+METRICS = [
+    ('library_request_duration_seconds', 'Wall time spent handling the request.', DURATION_BUCKETS),
+    ('library_request_sql_seconds', 'Time spent in SQL while handling the request.', DURATION_BUCKETS),
+    ('library_request_queries', 'SQL queries executed while handling the request.', QUERY_BUCKETS),
+]
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, n in zip(self.buckets + ('+Inf',), self.counts):
+            total += n
+            yield bound, total
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, view, duration, sql_time, queries):
+        with self.lock:
+            histograms = self.views.get(view)
+            if histograms is None:
+                histograms = self.views[view] = [Histogram(buckets) for _, _, buckets in METRICS]
+            for histogram, value in zip(histograms, (duration, sql_time, queries)):
+                histogram.observe(value)
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for index, (name, help_text, _) in enumerate(METRICS):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for view in sorted(self.views):
+                    histogram = self.views[view][index]
+                    for bound, total in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {total}')
+                    lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
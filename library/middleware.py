@@ -0,0 +1,151 @@
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger('library.slow_requests')
+
+# The tracker of the request being handled. A context variable rather than
+# a wrapper on one connection: sync_to_async copies the context into the
+# thread (and so the connection) that runs an async view's queries.
+_current_tracker = ContextVar('library_query_tracker', default=None)
+
+
+class QueryTracker:
+    """``connection.execute_wrapper`` hook that counts and times SQL."""
+
+    def __init__(self, keep_sql=False):
+        self.count = 0
+        self.time = 0.0
+        self.keep_sql = keep_sql
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.time += elapsed
+            if self.keep_sql:
+                self.statements.append((elapsed, sql))
+
+
+def _track(execute, sql, params, many, context):
+    tracker = _current_tracker.get()
+    if tracker is None:
+        return execute(sql, params, many, context)
+    return tracker(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_tracking(sender, connection, **kwargs):
+    # First in line, so execute_wrapper() blocks still pop their own wrapper.
+    if _track not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _track)
+
+
+class RequestMetricsMiddleware:
+    """Record wall time, SQL count and SQL time per URL name.
+
+    With ``LIBRARY_SLOW_REQUEST_MS`` set, requests slower than that are
+    logged to ``library.slow_requests`` together with their slowest SQL.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'LIBRARY_SLOW_REQUEST_MS', None)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tracker = QueryTracker(keep_sql=self.slow_ms is not None)
+        started = time.perf_counter()
+        token = _current_tracker.set(tracker)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_tracker.reset(token)
+        return self.finish(request, response, tracker, started)
+
+    async def __acall__(self, request):
+        tracker = QueryTracker(keep_sql=self.slow_ms is not None)
+        started = time.perf_counter()
+        token = _current_tracker.set(tracker)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_tracker.reset(token)
+        return self.finish(request, response, tracker, started)
+
+    def finish(self, request, response, tracker, started):
+        """Record the request now, or once a streamed body has been sent."""
+        if not response.streaming:
+            self.record(request, tracker, time.perf_counter() - started)
+            return response
+        # Streamed pages run most of their SQL while the body is iterated.
+        def done():
+            self.record(request, tracker, time.perf_counter() - started)
+        if response.is_async:
+            response.streaming_content = _atracked(response.streaming_content, tracker, done)
+        else:
+            response.streaming_content = _tracked(response.streaming_content, tracker, done)
+        return response
+
+    def record(self, request, tracker, duration):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        REGISTRY.observe(view, duration, tracker.time, tracker.count)
+
+        if self.slow_ms is not None and duration * 1000 >= self.slow_ms:
+            slowest = sorted(tracker.statements, reverse=True)[:5]
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries, %.0f ms in SQL\n%s',
+                request.method, request.path, view, duration * 1000, tracker.count, tracker.time * 1000,
+                '\n'.join(f'  {elapsed * 1000:.1f} ms  {sql}' for elapsed, sql in slowest),
+            )
+
+
+def _tracked(content, tracker, done):
+    """Iterate ``content`` with ``tracker`` installed, then call ``done``."""
+    chunks = iter(content)
+    try:
+        while True:
+            token = _current_tracker.set(tracker)
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                _current_tracker.reset(token)
+            yield chunk
+    finally:
+        done()
+
+
+async def _atracked(content, tracker, done):
+    """Async version of _tracked()."""
+    chunks = aiter(content)
+    try:
+        while True:
+            token = _current_tracker.set(tracker)
+            try:
+                chunk = await anext(chunks)
+            except StopAsyncIteration:
+                return
+            finally:
+                _current_tracker.reset(token)
+            yield chunk
+    finally:
+        done()
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Frozen copy of the index definition at the time of this migration; later
+# changes to library.search must come with a migration of their own.
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS library_book_fts USING fts5("
+    "title, author, isbn, code_no, category, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+POPULATE_SQL = (
+    "INSERT INTO library_book_fts (rowid, title, author, isbn, code_no, category) "
+    "SELECT b.id, b.title, b.author, b.isbn, b.code_no, COALESCE(c.name, '') "
+    "FROM library_book b LEFT JOIN library_category c ON c.id = b.category_id"
+)
+DROP_SQL = "DROP TABLE IF EXISTS library_book_fts"
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(DROP_SQL)
+        schema_editor.execute(CREATE_SQL)
+        schema_editor.execute(POPULATE_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0002_category_member_transaction_remove_issuedbook_book_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:14
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0004_book_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('refreshed_on', models.DateField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:16
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0005_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='accrued_fine',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=8),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='fine_accrued_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
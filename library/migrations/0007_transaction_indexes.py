@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_transaction_fine_accrual'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-issue_date'], name='tx_user_issue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-issue_date'], name='tx_issue_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status', 'issued')), fields=['due_date'], name='tx_open_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status', 'issued')), fields=['book'], name='tx_open_book_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('fine__gt', 0), ('fine_paid', False), ('status', 'returned')), fields=['user', 'fine'], name='tx_unpaid_fine_idx'),
+        ),
+    ]
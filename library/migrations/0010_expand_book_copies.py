@@ -0,0 +1,34 @@
+from itertools import islice
+
+from django.db import migrations
+from django.db.models import Count
+
+BATCH_SIZE = 2000
+
+
+def expand_copies(apps, schema_editor):
+    Book = apps.get_model('library', 'Book')
+    BookCopy = apps.get_model('library', 'BookCopy')
+    books = (
+        Book.objects.annotate(existing=Count('copies')).order_by('id')
+        .values_list('id', 'code_no', 'total_copies', 'existing')
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    rows = (
+        BookCopy(book_id=book_id, barcode=f'{code_no}-{number:03d}')
+        for book_id, code_no, total, existing in books
+        for number in range(existing + 1, total + 1)
+    )
+    while batch := list(islice(rows, BATCH_SIZE)):
+        BookCopy.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0009_bookcopy'),
+    ]
+
+    operations = [
+        migrations.RunPython(expand_copies, migrations.RunPython.noop),
+    ]
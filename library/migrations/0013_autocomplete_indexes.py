@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:46
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0012_archivedtransaction'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(django.db.models.functions.text.Lower('title'), name='book_title_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(django.db.models.functions.text.Lower('code_no'), name='book_code_no_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['isbn'], name='book_isbn_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['phone'], name='member_phone_idx'),
+        ),
+        # auth.User belongs to contrib.auth, so its name indexes are plain SQL.
+        migrations.RunSQL(
+            [
+                'CREATE INDEX auth_user_first_name_lower_idx ON auth_user (LOWER(first_name))',
+                'CREATE INDEX auth_user_last_name_lower_idx ON auth_user (LOWER(last_name))',
+            ],
+            [
+                'DROP INDEX auth_user_first_name_lower_idx',
+                'DROP INDEX auth_user_last_name_lower_idx',
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:55
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('library', '0013_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('open_loans', models.PositiveIntegerField(default=0)),
+                ('overdue_loans', models.PositiveIntegerField(default=0)),
+                ('overdue_as_of', models.DateField(blank=True, null=True)),
+                ('outstanding_fines', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('last_activity', models.DateField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:01
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0014_member_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBookStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('issues', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('fines_assessed', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('fines_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyCategoryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('issues', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('fines_assessed', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('fines_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('on_loan', models.PositiveIntegerField(default=0)),
+                ('copies', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='fine_paid_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='fine_paid_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['issue_date'], name='archived_tx_issue_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['return_date'], name='archived_tx_return_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(condition=models.Q(('fine_paid_on__isnull', False)), fields=['fine_paid_on'], name='archived_tx_fine_paid_on_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['return_date'], name='tx_return_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('fine_paid_on__isnull', False)), fields=['fine_paid_on'], name='tx_fine_paid_on_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailybookstats',
+            name='book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='library.book'),
+        ),
+        migrations.AddField(
+            model_name='dailycategorystats',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='library.category'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailybookstats',
+            constraint=models.UniqueConstraint(fields=('day', 'book'), name='daily_book_stats_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorystats',
+            constraint=models.UniqueConstraint(fields=('day', 'category'), name='daily_category_stats_unique'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def backfill_fine_paid_on(apps, schema_editor):
+    # Payment dates weren't recorded before; the return date is the
+    # closest known day for fines already paid.
+    for name in ('Transaction', 'ArchivedTransaction'):
+        model = apps.get_model('library', name)
+        model.objects.filter(fine_paid=True, fine_paid_on__isnull=True).update(fine_paid_on=F('return_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0015_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_fine_paid_on, migrations.RunPython.noop),
+    ]
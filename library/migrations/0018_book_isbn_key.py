@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:05
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0017_auth_user_username_lower_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_isbn_idx',
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='isbn_key',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Replace(django.db.models.functions.text.Lower('isbn'), models.Value('-'), models.Value('')), output_field=models.CharField(max_length=40)),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['isbn_key'], name='book_isbn_key_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower, Replace
 from django.contrib.auth.models import User
 from datetime import date, timedelta
 from decimal import Decimal
@@ -19,9 +20,30 @@ class Book(models.Model):
     author = models.CharField(max_length=255, blank=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     isbn = models.CharField(max_length=40, blank=True)
+    # The ISBN as typeahead matches it: lower-cased, hyphens dropped.
+    isbn_key = models.GeneratedField(
+        expression=Replace(Lower('isbn'), models.Value('-'), models.Value('')),
+        output_field=models.CharField(max_length=40),
+        db_persist=True,
+    )
     total_copies = models.PositiveIntegerField(default=1)
     available_copies = models.PositiveIntegerField(default=1)
     added_on = models.DateField(auto_now_add=True)
+    # Bulk F() updates of the copy counts set this explicitly, since they skip auto_now.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Incremental inventory reconciliation: books touched since the last run.
+            models.Index(fields=['updated_at'], name='book_updated_at_idx'),
+            # Keyset pagination of the catalog listing, with and without a category filter.
+            models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+            models.Index(fields=['category', 'title', 'id'], name='book_category_title_id_idx'),
+            # Typeahead prefix lookups (library.autocomplete).
+            models.Index(Lower('title'), name='book_title_lower_idx'),
+            models.Index(Lower('code_no'), name='book_code_no_lower_idx'),
+            models.Index(fields=['isbn_key'], name='book_isbn_key_idx'),
+        ]
 
     def is_available(self):
         return self.available_copies > 0
@@ -30,6 +52,16 @@ class Book(models.Model):
         return f"{self.title} ({self.code_no})"
 
 
+class BookCopy(models.Model):
+    """One physical copy of a book, identified by the barcode on its label."""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='copies')
+    barcode = models.CharField(max_length=64, unique=True)
+    added_on = models.DateField(auto_now_add=True)
+
+    def __str__(self):
+        return self.barcode
+
+
 class Member(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     phone = models.CharField(max_length=20, blank=True)
@@ -40,13 +72,23 @@ class Member(models.Model):
         ('1y', '1 year'),
         ('2y', '2 years'),
     ]
+    MEMBERSHIP_DAYS = {'6m': 180, '1y': 365, '2y': 730}
     membership_type = models.CharField(max_length=2, choices=MEMBERSHIP_CHOICES, default='1y')
     membership_start = models.DateField(null=True, blank=True)
     membership_end = models.DateField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['phone'], name='member_phone_idx'),
+        ]
+
     def __str__(self):
         return self.user.get_full_name() or self.user.username
 
+    @classmethod
+    def membership_end_for(cls, membership_type, start):
+        return start + timedelta(days=cls.MEMBERSHIP_DAYS[membership_type])
+
 
 class Transaction(models.Model):
     STATUS_CHOICES = [('issued', 'Issued'), ('returned', 'Returned')]
@@ -58,7 +100,36 @@ class Transaction(models.Model):
     return_date = models.DateField(null=True, blank=True)
     fine = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('0.00'))
     fine_paid = models.BooleanField(default=False)
+    fine_paid_on = models.DateField(null=True, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='issued')
+    # Running fine on an open overdue loan, and the day it was last accrued to.
+    accrued_fine = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('0.00'))
+    fine_accrued_on = models.DateField(null=True, blank=True)
+    # The scanned copy; loans issued without a barcode leave it empty.
+    copy = models.ForeignKey(BookCopy, on_delete=models.SET_NULL, null=True, blank=True, related_name='loans')
+
+    class Meta:
+        constraints = [
+            # A copy is out on at most one loan; also the index for a scan's open-loan lookup.
+            models.UniqueConstraint(fields=['copy'], condition=models.Q(status='issued'),
+                                    name='one_open_loan_per_copy'),
+        ]
+        indexes = [
+            # user_home: a member's loans, newest first.
+            models.Index(fields=['user', '-issue_date'], name='tx_user_issue_idx'),
+            # admin_home: most recent loans overall.
+            models.Index(fields=['-issue_date'], name='tx_issue_date_idx'),
+            # Open loans only: overdue lookups, fine accrual and per-book loan counts.
+            models.Index(fields=['due_date'], condition=models.Q(status='issued'), name='tx_open_due_idx'),
+            models.Index(fields=['book'], condition=models.Q(status='issued'), name='tx_open_book_idx'),
+            # Unpaid fines on returned loans.
+            models.Index(fields=['user', 'fine'], condition=models.Q(status='returned', fine_paid=False, fine__gt=0),
+                         name='tx_unpaid_fine_idx'),
+            # Daily rollups: a day's returns and fine payments.
+            models.Index(fields=['return_date'], name='tx_return_date_idx'),
+            models.Index(fields=['fine_paid_on'], condition=models.Q(fine_paid_on__isnull=False),
+                         name='tx_fine_paid_on_idx'),
+        ]
 
     def calculate_fine(self, per_day=Decimal('5.00')):
         if not self.return_date:
@@ -70,3 +141,149 @@ class Transaction(models.Model):
 
     def __str__(self):
         return f"{self.book.title} -> {self.user.username} ({self.status})"
+
+
+class ArchivedTransaction(models.Model):
+    """A closed, settled loan moved out of Transaction by archive_transactions."""
+    # Keeps the original Transaction id; those are never reused.
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    issue_date = models.DateField()
+    due_date = models.DateField()
+    return_date = models.DateField()
+    fine = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('0.00'))
+    fine_paid = models.BooleanField(default=False)
+    fine_paid_on = models.DateField(null=True, blank=True)
+    archived_on = models.DateField(auto_now_add=True)
+
+    # Archived loans read like returned Transactions in templates.
+    status = 'returned'
+    archived = True
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-issue_date', '-id'], name='archived_tx_user_issue_idx'),
+            # Daily rollups rebuilt over archived days.
+            models.Index(fields=['issue_date'], name='archived_tx_issue_date_idx'),
+            models.Index(fields=['return_date'], name='archived_tx_return_date_idx'),
+            models.Index(fields=['fine_paid_on'], condition=models.Q(fine_paid_on__isnull=False),
+                         name='archived_tx_fine_paid_on_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book.title} -> {self.user.username} (archived)"
+
+
+class Counter(models.Model):
+    """Running dashboard totals, maintained alongside the writes that change them."""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    # Date the value was last recomputed from source rows.
+    refreshed_on = models.DateField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class MemberSummary(models.Model):
+    """A member's account totals, kept up to date by circulation."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    open_loans = models.PositiveIntegerField(default=0)
+    overdue_loans = models.PositiveIntegerField(default=0)
+    # Date overdue_loans was last recounted; loans falling due since then aren't in it yet.
+    overdue_as_of = models.DateField(null=True, blank=True)
+    outstanding_fines = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    last_activity = models.DateField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.open_loans} open, {self.outstanding_fines} owed"
+
+
+class Watermark(models.Model):
+    """How far an incremental job has got, so the next run starts from there."""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class DailyBookStats(models.Model):
+    """One book's circulation on one day, written by the rollup_circulation command."""
+    day = models.DateField()
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    issues = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    # Fines charged on that day's returns, and fines paid that day.
+    fines_assessed = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    fines_paid = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'book'], name='daily_book_stats_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.book_id}: {self.issues} issued, {self.returns} returned"
+
+
+class DailyCategoryStats(models.Model):
+    """One category's circulation on one day; category is empty for uncategorised books.
+
+    There is a row for every category on every rolled-up day, so on_loan
+    can carry forward from the day before.
+    """
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    issues = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    fines_assessed = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    fines_paid = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    # Loans open at the end of the day, and the category's copies when it was rolled up.
+    on_loan = models.PositiveIntegerField(default=0)
+    copies = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='daily_category_stats_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.category_id}: {self.issues} issued, {self.on_loan} on loan"
+
+
+class Hold(models.Model):
+    """A member's place in the queue for a book with no copy on the shelf."""
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('ready', 'Ready for pickup'),
+        ('fulfilled', 'Fulfilled'),
+        ('expired', 'Expired'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='waiting')
+    # Higher priority is served first; equal priorities are first come, first served.
+    priority = models.SmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    ready_on = models.DateField(null=True, blank=True)
+    expires_on = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Head of each book's queue, in serving order.
+            models.Index(fields=['book', '-priority', 'created_at', 'id'], condition=models.Q(status='waiting'),
+                         name='hold_queue_idx'),
+            # Uncollected holds due to expire.
+            models.Index(fields=['expires_on'], condition=models.Q(status='ready'), name='hold_ready_expiry_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'book'], condition=models.Q(status__in=['waiting', 'ready']),
+                                    name='one_active_hold_per_book'),
+        ]
+
+    def __str__(self):
+        return f"{self.book.title} <- {self.user.username} ({self.status})"
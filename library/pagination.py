@@ -0,0 +1,127 @@
+import base64
+import binascii
+import json
+from operator import attrgetter
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Return the list of key values in ``token``, or None if it is unusable."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def _typed(model, ordering, values):
+    """``values`` converted to the types of the ``ordering`` fields, or None if any won't convert."""
+    typed = []
+    for field, value in zip(ordering, values):
+        try:
+            value = model._meta.get_field(field.lstrip('-')).to_python(value)
+        except (ValidationError, TypeError, ValueError):
+            return None
+        if value is None:
+            return None
+        typed.append(value)
+    return typed
+
+
+def _after(ordering, values):
+    """Q object selecting rows strictly after ``values`` in ``ordering``.
+
+    For ('title', 'id') this is ``title > t OR (title = t AND id > i)``, which
+    an index on the same columns answers with a single range seek.
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        op = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{op}': values[i]})
+        for prev, value in zip(ordering[:i], values[:i]):
+            step &= Q(**{prev.lstrip('-'): value})
+        condition |= step
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_page(queryset, ordering, cursor, per_page):
+    """Fetch one page of ``queryset`` ordered by ``ordering``, after ``cursor``.
+
+    ``ordering`` must end in a unique column (normally 'id') so the cursor is
+    unambiguous. No OFFSET is used, so every page costs the same to fetch.
+    """
+    items = list(remaining(queryset, ordering, cursor)[:per_page + 1])
+    return _page(items, ordering, per_page)
+
+
+def merged_keyset_page(querysets, ordering, cursor, per_page):
+    """keyset_page() over the union of ``querysets``, which share ``ordering``.
+
+    Each queryset is read up to one page past the cursor and the results are
+    merged, so the cost per page stays fixed however large each table is.
+    The last ``ordering`` column must be unique across all of them.
+    """
+    items = [item for queryset in querysets for item in remaining(queryset, ordering, cursor)[:per_page + 1]]
+    return _merged_page(items, ordering, per_page)
+
+
+async def amerged_keyset_page(querysets, ordering, cursor, per_page):
+    """Async version of merged_keyset_page()."""
+    items = [item for queryset in querysets async for item in remaining(queryset, ordering, cursor)[:per_page + 1]]
+    return _merged_page(items, ordering, per_page)
+
+
+def _merged_page(items, ordering, per_page):
+    for field in reversed(ordering):
+        items.sort(key=attrgetter(field.lstrip('-')), reverse=field.startswith('-'))
+    return _page(items[:per_page + 1], ordering, per_page)
+
+
+def _page(items, ordering, per_page):
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, f.lstrip('-')) for f in ordering])
+    return KeysetPage(items, next_cursor)
+
+
+def remaining(queryset, ordering, cursor):
+    """``queryset`` in ``ordering`` starting after ``cursor`` (unbounded)."""
+    queryset = queryset.order_by(*ordering)
+    values = decode_cursor(cursor, len(ordering))
+    if values is not None:
+        values = _typed(queryset.model, ordering, values)
+    if values is not None:
+        queryset = queryset.filter(_after(ordering, values))
+    return queryset
@@ -0,0 +1,194 @@
+"""Daily circulation rollups behind the analytics dashboard.
+
+Each finished day is summarised once into DailyBookStats (day x book) and
+DailyCategoryStats (day x category), read from the live and archived loan
+tables through their date indexes. A watermark records the last day rolled
+up, so each run only touches the days after it; the dashboard then reads
+the rollups alone, whose size grows with days and active titles rather
+than with loans.
+
+Books are counted under their category at the time of the rollup, and a
+category's copies are its copies on that run.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import ArchivedTransaction, Book, Category, DailyBookStats, DailyCategoryStats, Transaction, Watermark
+
+WATERMARK = 'circulation_rollup'
+# Days rolled up per transaction.
+CHUNK_DAYS = 31
+STATS = ('issues', 'returns', 'fines_assessed', 'fines_paid')
+# Longer ranges are charted by month.
+MAX_DAILY_POINTS = 92
+
+
+def _loan_tables():
+    return (Transaction.objects.all(), ArchivedTransaction.objects.all())
+
+
+def rolled_up_to():
+    """The last day that has been rolled up, or None."""
+    value = Watermark.objects.filter(name=WATERMARK).values_list('value', flat=True).first()
+    return timezone.localdate(value) if value else None
+
+
+def _set_watermark(day):
+    value = timezone.make_aware(datetime.combine(day, time.min))
+    Watermark.objects.update_or_create(name=WATERMARK, defaults={'value': value})
+
+
+def first_day():
+    """The earliest day with any loan, or None."""
+    days = [loans.aggregate(first=Min('issue_date'))['first'] for loans in _loan_tables()]
+    return min(filter(None, days), default=None)
+
+
+def _grouped(day_field, start, end, **aggregates):
+    """``{(day, book_id): {aggregate: value}}`` over both loan tables."""
+    rows = defaultdict(dict)
+    for loans in _loan_tables():
+        grouped = (
+            loans.filter(**{f'{day_field}__gte': start, f'{day_field}__lte': end}).order_by()
+            .values(day_field, 'book_id').annotate(**aggregates)
+        )
+        for row in grouped:
+            key = (row.pop(day_field), row.pop('book_id'))
+            for name, value in row.items():
+                rows[key][name] = rows[key].get(name, 0) + value
+    return rows
+
+
+def book_stats(start, end):
+    """Unsaved DailyBookStats for every book with activity from ``start`` to ``end``."""
+    stats = defaultdict(dict)
+    for grouped in (
+        _grouped('issue_date', start, end, issues=Count('id')),
+        _grouped('return_date', start, end, returns=Count('id'), fines_assessed=Sum('fine')),
+        _grouped('fine_paid_on', start, end, fines_paid=Sum('fine')),
+    ):
+        for key, values in grouped.items():
+            stats[key].update(values)
+    return [
+        DailyBookStats(day=day, book_id=book_id, **values)
+        for (day, book_id), values in sorted(stats.items())
+    ]
+
+
+def category_stats(book_rows, start, end, on_loan, copies):
+    """Unsaved DailyCategoryStats for every category and day from ``start`` to ``end``.
+
+    ``on_loan`` is ``{category_id: loans open}`` at the end of the day
+    before ``start``; it is updated in place to the end of ``end``.
+    """
+    category_of = dict(
+        Book.objects.filter(pk__in={row.book_id for row in book_rows}).values_list('id', 'category_id')
+    )
+    totals = defaultdict(lambda: dict.fromkeys(STATS, 0))
+    for row in book_rows:
+        values = totals[row.day, category_of.get(row.book_id)]
+        for name in STATS:
+            values[name] += getattr(row, name)
+
+    rows = []
+    day = start
+    while day <= end:
+        for category_id in copies:
+            values = totals.get((day, category_id), dict.fromkeys(STATS, 0))
+            on_loan[category_id] = max(0, on_loan.get(category_id, 0) + values['issues'] - values['returns'])
+            rows.append(DailyCategoryStats(
+                day=day, category_id=category_id, on_loan=on_loan[category_id], copies=copies[category_id], **values,
+            ))
+        day += timedelta(days=1)
+    return rows
+
+
+def _copies_per_category():
+    copies = {category_id: 0 for category_id in Category.objects.values_list('id', flat=True)}
+    copies[None] = 0
+    for category_id, total in Book.objects.order_by().values_list('category_id').annotate(total=Sum('total_copies')):
+        copies[category_id] = total or 0
+    return copies
+
+
+def rollup(until=None, rebuild=False, progress=None):
+    """Roll up every finished day after the watermark through ``until`` (yesterday).
+
+    Days are rewritten whole, CHUNK_DAYS per transaction, and the watermark
+    moves with each chunk, so an interrupted run resumes where it stopped.
+    Returns ``(first_day, last_day)`` rolled up, or None if there was nothing to do.
+    """
+    until = until or date.today() - timedelta(days=1)
+    last = None if rebuild else rolled_up_to()
+    if last is None:
+        start = first_day()
+        if start is None:
+            return None
+    else:
+        start = last + timedelta(days=1)
+    if start > until:
+        return None
+
+    copies = _copies_per_category()
+    on_loan = dict(
+        DailyCategoryStats.objects.filter(day=start - timedelta(days=1)).values_list('category_id', 'on_loan')
+    )
+    if rebuild:
+        DailyBookStats.objects.all().delete()
+        DailyCategoryStats.objects.all().delete()
+
+    chunk_start = start
+    while chunk_start <= until:
+        chunk_end = min(until, chunk_start + timedelta(days=CHUNK_DAYS - 1))
+        with transaction.atomic():
+            book_rows = book_stats(chunk_start, chunk_end)
+            DailyBookStats.objects.filter(day__gte=chunk_start, day__lte=chunk_end).delete()
+            DailyBookStats.objects.bulk_create(book_rows)
+            DailyCategoryStats.objects.filter(day__gte=chunk_start, day__lte=chunk_end).delete()
+            DailyCategoryStats.objects.bulk_create(category_stats(book_rows, chunk_start, chunk_end, on_loan, copies))
+            _set_watermark(chunk_end)
+        if progress:
+            progress(chunk_start, chunk_end, len(book_rows))
+        chunk_start = chunk_end + timedelta(days=1)
+    return start, until
+
+
+def report(start, end, top=10):
+    """Dashboard figures for ``start`` to ``end``, read from the rollups alone."""
+    n_days = (end - start).days + 1
+    days = DailyCategoryStats.objects.filter(day__gte=start, day__lte=end)
+    totals = days.aggregate(**{name: Sum(name) for name in STATS})
+    period = TruncMonth('day') if n_days > MAX_DAILY_POINTS else F('day')
+    series = list(
+        days.annotate(period=period).order_by('period').values('period')
+        .annotate(issues=Sum('issues'), returns=Sum('returns'), fines_paid=Sum('fines_paid'))
+    )
+    top_titles = list(
+        DailyBookStats.objects.filter(day__gte=start, day__lte=end).order_by().values('book_id')
+        .annotate(issues=Sum('issues')).order_by('-issues', 'book_id')
+        .values('book__code_no', 'book__title', 'issues')[:top]
+    )
+    categories = []
+    for row in (
+        days.order_by().values('category_id', 'category__name')
+        .annotate(issues=Sum('issues'), loan_days=Sum('on_loan'), copy_days=Sum('copies'))
+        .order_by('category__name')
+    ):
+        if not row['issues'] and not row['copy_days']:
+            continue
+        row['utilisation'] = row['loan_days'] / row['copy_days'] if row['copy_days'] else None
+        row['average_on_loan'] = row['loan_days'] / n_days
+        categories.append(row)
+    return {
+        'totals': {name: totals[name] or (Decimal('0.00') if name.startswith('fines') else 0) for name in STATS},
+        'series': series,
+        'monthly': n_days > MAX_DAILY_POINTS,
+        'top_titles': top_titles,
+        'categories': categories,
+    }
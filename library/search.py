@@ -0,0 +1,138 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Book
+
+# Standalone FTS5 table keyed by Book.id (its rowid). The category
+# name is denormalised into it so a single MATCH covers every searchable field.
+FTS_TABLE = 'library_book_fts'
+SEARCH_LIMIT = 50
+
+# bm25 weights, in column order: title, author, isbn, code_no, category
+RANK_WEIGHTS = (10.0, 5.0, 2.0, 2.0, 1.0)
+
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, author, isbn, code_no, category, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+DROP_SQL = f"DROP TABLE IF EXISTS {FTS_TABLE}"
+
+_INSERT_SQL = (
+    f"INSERT INTO {FTS_TABLE} (rowid, title, author, isbn, code_no, category) "
+    "SELECT b.id, b.title, b.author, b.isbn, b.code_no, COALESCE(c.name, '') "
+    "FROM library_book b LEFT JOIN library_category c ON c.id = b.category_id"
+)
+
+# Keep well below SQLite's host parameter limit.
+_CHUNK = 500
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_enabled(conn=None):
+    return (conn or connection).vendor == 'sqlite'
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), _CHUNK):
+        yield ids[i:i + _CHUNK]
+
+
+def rebuild_index(conn=None):
+    """Drop and repopulate the whole index with one INSERT ... SELECT."""
+    conn = conn or connection
+    if not fts_enabled(conn):
+        return 0
+    with conn.cursor() as cursor:
+        cursor.execute(DROP_SQL)
+        cursor.execute(CREATE_SQL)
+        cursor.execute(_INSERT_SQL)
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def index_books(book_ids):
+    """(Re)index the given books from their current rows."""
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(book_ids):
+            marks = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({marks})", chunk)
+            cursor.execute(f"{_INSERT_SQL} WHERE b.id IN ({marks})", chunk)
+
+
+def index_category(category_id):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN "
+            "(SELECT id FROM library_book WHERE category_id = %s)",
+            [category_id],
+        )
+        cursor.execute(f"{_INSERT_SQL} WHERE b.category_id = %s", [category_id])
+
+
+def remove_books(book_ids):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(book_ids):
+            marks = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({marks})", chunk)
+
+
+def build_match(q):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    tokens = _TOKEN_RE.findall(q)
+    return ' '.join(f'"{t}"*' for t in tokens)
+
+
+def search_book_ids(q, limit=SEARCH_LIMIT, category=None, available_only=False):
+    """Return Book ids matching ``q``, best match first."""
+    match = build_match(q)
+    if not match:
+        return []
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    sql = (
+        f"SELECT f.rowid FROM {FTS_TABLE} f JOIN library_book b ON b.id = f.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s"
+    )
+    params = [match]
+    if category is not None:
+        sql += " AND b.category_id = %s"
+        params.append(category.pk)
+    if available_only:
+        sql += " AND b.available_copies > 0"
+    sql += f" ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s"
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_books(q, queryset=None, limit=SEARCH_LIMIT, category=None, available_only=False):
+    """Ranked list of books matching ``q``.
+
+    Falls back to ``icontains`` filtering on databases without FTS5.
+    """
+    if queryset is None:
+        queryset = Book.objects.select_related('category')
+    if not fts_enabled():
+        if category is not None:
+            queryset = queryset.filter(category=category)
+        if available_only:
+            queryset = queryset.filter(available_copies__gt=0)
+        return list(queryset.filter(
+            Q(title__icontains=q) | Q(author__icontains=q) | Q(isbn__icontains=q)
+            | Q(code_no__icontains=q) | Q(category__name__icontains=q)
+        ).order_by('title', 'id')[:limit])
+    ids = search_book_ids(q, limit=limit, category=category, available_only=available_only)
+    position = {book_id: i for i, book_id in enumerate(ids)}
+    books = queryset.filter(id__in=ids)
+    return sorted(books, key=lambda b: position[b.id])
@@ -0,0 +1,120 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import auth, catalog, copies, counters, search, summaries
+from .models import ArchivedTransaction, Book, Category, Member, Transaction
+
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_books([instance.pk])
+
+
+@receiver(pre_save, sender=Book)
+def remember_total_copies(sender, instance, raw=False, update_fields=None, **kwargs):
+    # The stored value, so count_saved_book can bump the counter by the change.
+    if raw or instance._state.adding or (update_fields is not None and 'total_copies' not in update_fields):
+        return
+    instance._saved_total_copies = (
+        Book.objects.filter(pk=instance.pk).values_list('total_copies', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Book)
+def count_saved_book(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.bump(**{counters.TOTAL_BOOKS: 1, counters.TOTAL_COPIES: instance.total_copies})
+    elif update_fields is None or 'total_copies' in update_fields:
+        previous = instance.__dict__.pop('_saved_total_copies', None)
+        if previous is None:
+            # Saved over a row remember_total_copies didn't read: the old value isn't known.
+            counters.refresh([counters.TOTAL_COPIES])
+        else:
+            counters.bump(**{counters.TOTAL_COPIES: instance.total_copies - previous})
+
+
+@receiver(post_save, sender=Book)
+def label_new_copies(sender, instance, raw=False, **kwargs):
+    # Copies beyond total_copies are withdrawn by hand, so only ever add.
+    if not raw:
+        copies.add_missing_copies([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance, **kwargs):
+    search.remove_books([instance.pk])
+
+
+@receiver(pre_delete, sender=Book)
+def remember_book_borrowers(sender, instance, **kwargs):
+    # The book's loans go with it (on_delete=CASCADE) without signals of their own.
+    instance._borrower_ids = set(
+        Transaction.objects.filter(book=instance).values_list('user_id', flat=True).distinct()
+    ) | set(ArchivedTransaction.objects.filter(book=instance).values_list('user_id', flat=True).distinct())
+    instance._loan_deltas = counters.loans_deleted(Transaction.objects.filter(book=instance))
+
+
+@receiver(post_delete, sender=Book)
+def refresh_borrower_summaries(sender, instance, **kwargs):
+    summaries.refresh(getattr(instance, '_borrower_ids', []))
+
+
+@receiver(post_delete, sender=Book)
+def count_deleted_book(sender, instance, **kwargs):
+    counters.bump(**{counters.TOTAL_BOOKS: -1, counters.TOTAL_COPIES: -instance.total_copies},
+                  **getattr(instance, '_loan_deltas', {}))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_books(sender, instance, created=False, raw=False, **kwargs):
+    # A new category has no books yet; a rename changes every book under it.
+    if not raw and not created:
+        search.index_category(instance.pk)
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_books(sender, instance, **kwargs):
+    # on_delete=SET_NULL nulls the FK with a bare UPDATE, so capture the
+    # affected books before they lose their category.
+    instance._book_ids = list(Book.objects.filter(category=instance).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def reindex_uncategorised_books(sender, instance, **kwargs):
+    search.index_books(getattr(instance, '_book_ids', []))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, raw=False, **kwargs):
+    if not raw:
+        catalog.changed()
+
+
+@receiver(pre_delete, sender=User)
+def remember_user_loans(sender, instance, **kwargs):
+    # Like a book's, a user's loans are cascade-deleted without signals.
+    instance._loan_deltas = counters.loans_deleted(Transaction.objects.filter(user=instance))
+
+
+@receiver(post_delete, sender=User)
+def count_deleted_user_loans(sender, instance, **kwargs):
+    counters.bump(**getattr(instance, '_loan_deltas', {}))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    auth.forget_user(instance.pk)
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_delete, sender=Member)
+def forget_cached_member(sender, instance, **kwargs):
+    auth.forget_user(instance.user_id)
@@ -0,0 +1,138 @@
+"""Per-member account summaries for user_home.
+
+Circulation adjusts a member's MemberSummary row in the same transaction
+as the loan it writes, so the landing page reads one row instead of
+aggregating the member's whole history. refresh() rebuilds rows from the
+loan tables; a row that doesn't exist yet is built that way on first use.
+Loans edited or deleted in the admin, or removed with their book, refresh
+the affected rows too (see admin.TransactionAdmin and signals); only writes
+made behind the app's back need reconcile_member_summaries.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db.models import Case, Count, DateField, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import ArchivedTransaction, MemberSummary, Transaction
+
+BATCH_SIZE = 500
+FIELDS = ['open_loans', 'overdue_loans', 'overdue_as_of', 'outstanding_fines', 'last_activity']
+
+
+def _per_user(queryset, **aggregates):
+    return {row.pop('user_id'): row for row in queryset.order_by().values('user_id').annotate(**aggregates)}
+
+
+def compute(user_ids, today=None):
+    """Unsaved MemberSummary rows for ``user_ids``, aggregated from source."""
+    today = today or date.today()
+    live = _per_user(
+        Transaction.objects.filter(user_id__in=user_ids),
+        open_loans=Count('id', filter=Q(status='issued')),
+        overdue_loans=Count('id', filter=Q(status='issued', due_date__lt=today)),
+        outstanding_fines=Sum('fine', filter=Q(status='returned', fine__gt=0, fine_paid=False)),
+        last_issue=Max('issue_date'),
+        last_return=Max('return_date'),
+    )
+    archived = _per_user(ArchivedTransaction.objects.filter(user_id__in=user_ids), last_return=Max('return_date'))
+
+    summaries = []
+    for user_id in user_ids:
+        row = live.get(user_id, {})
+        dates = [row.get('last_issue'), row.get('last_return'), archived.get(user_id, {}).get('last_return')]
+        summaries.append(MemberSummary(
+            user_id=user_id,
+            open_loans=row.get('open_loans', 0),
+            overdue_loans=row.get('overdue_loans', 0),
+            overdue_as_of=today,
+            outstanding_fines=row.get('outstanding_fines') or Decimal('0.00'),
+            last_activity=max(filter(None, dates), default=None),
+        ))
+    return summaries
+
+
+def refresh(user_ids=None, today=None):
+    """Rebuild the summaries of ``user_ids`` (every member by default); return them."""
+    if user_ids is None:
+        user_ids = User.objects.filter(is_staff=False).order_by('id').values_list('id', flat=True)
+    user_ids = list(user_ids)
+    summaries = []
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = compute(user_ids[start:start + BATCH_SIZE], today)
+        MemberSummary.objects.bulk_create(batch, update_conflicts=True, unique_fields=['user'], update_fields=FIELDS)
+        summaries.extend(batch)
+    return summaries
+
+
+def get(user):
+    summary = MemberSummary.objects.filter(user=user).first()
+    return summary or refresh([user.pk])[0]
+
+
+async def aget(user):
+    summary = await MemberSummary.objects.filter(user=user).afirst()
+    return summary or (await sync_to_async(refresh)([user.pk]))[0]
+
+
+def _less(field, amount, floor=Value(0)):
+    return Greatest(F(field) - amount, floor)
+
+
+def _adjust(user_id, on=None, **changes):
+    """Apply ``changes`` (expressions by field) to a summary; call inside the write's transaction.
+
+    A missing row is built from source, which already includes the write.
+    """
+    if on is not None:
+        changes['last_activity'] = Greatest(Coalesce('last_activity', Value(on), output_field=DateField()), Value(on))
+    if not MemberSummary.objects.filter(user_id=user_id).update(**changes):
+        refresh([user_id])
+
+
+def loans_opened(user_id, count, on):
+    _adjust(user_id, on, open_loans=F('open_loans') + count)
+
+
+def loans_closed(txs):
+    """Summary updates for returning ``txs`` (already marked returned), one UPDATE per member."""
+    by_user = defaultdict(list)
+    for tx in txs:
+        by_user[tx.user_id].append(tx)
+    for user_id, closed in by_user.items():
+        due = defaultdict(int)
+        for tx in closed:
+            due[tx.due_date] += 1
+        # Only loans that were overdue at the last recount were counted as such.
+        was_overdue = sum(
+            Case(When(overdue_as_of__gt=due_date, then=Value(n)), default=Value(0), output_field=IntegerField())
+            for due_date, n in due.items()
+        )
+        _adjust(
+            user_id,
+            max(tx.return_date for tx in closed),
+            open_loans=_less('open_loans', len(closed)),
+            overdue_loans=_less('overdue_loans', was_overdue),
+            outstanding_fines=F('outstanding_fines') + sum(tx.fine for tx in closed),
+        )
+
+
+def fine_paid(tx, on=None):
+    owed = _less('outstanding_fines', tx.fine, Value(Decimal('0.00')))
+    _adjust(tx.user_id, on or date.today(), outstanding_fines=owed)
+
+
+def recount_overdue(today=None):
+    """Recount every summary's overdue loans as of ``today`` in one UPDATE."""
+    today = today or date.today()
+    overdue = (
+        Transaction.objects.filter(user_id=OuterRef('user_id'), status='issued', due_date__lt=today)
+        .order_by().values('user_id').annotate(n=Count('id')).values('n')
+    )
+    return MemberSummary.objects.update(
+        overdue_loans=Coalesce(Subquery(overdue, output_field=IntegerField()), Value(0)),
+        overdue_as_of=today,
+    )
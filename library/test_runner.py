@@ -0,0 +1,28 @@
+"""Test runner that keeps the suite off the developer's catalog cache.
+
+The 'catalog' cache is a directory shared with any dev server running on
+the same checkout, so the suite gets a throwaway one of its own: tests
+clear it and fill it with pages rendered from the test database.
+"""
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.catalog_cache_dir = tempfile.mkdtemp(prefix='library-catalog-')
+        self.catalog_cache = override_settings(CACHES={
+            **settings.CACHES,
+            'catalog': {**settings.CACHES['catalog'], 'LOCATION': self.catalog_cache_dir},
+        })
+        self.catalog_cache.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.catalog_cache.disable()
+        shutil.rmtree(self.catalog_cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1532 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import re
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import Count, F, Q
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import (
+    archive, autocomplete, bench, catalog, circulation, copies, counters, exports, holds, inventory, rollups, search,
+    summaries, views,
+)
+from .db import retry_on_lock
+from .pagination import encode_cursor, keyset_page
+from .management.commands import import_members
+from .metrics import REGISTRY
+from .models import (
+    ArchivedTransaction, Book, BookCopy, Category, Counter, DailyBookStats, DailyCategoryStats, Hold, Member,
+    MemberSummary, Transaction, Watermark,
+)
+
+
+class CirculationTests(TestCase):
+    def setUp(self):
+        self.member = User.objects.create_user('member', password='pw')
+        self.book = Book.objects.create(code_no='B1', title='Dune', total_copies=1, available_copies=1)
+
+    def test_issue_takes_a_copy(self):
+        tx = circulation.issue_book(self.book, self.member)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+        self.assertEqual(tx.due_date, tx.issue_date + timedelta(days=circulation.LOAN_DAYS))
+
+    def test_issue_refuses_when_no_copy_left(self):
+        circulation.issue_book(self.book, self.member)
+        with self.assertRaises(circulation.BookUnavailable):
+            circulation.issue_book(self.book, self.member)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_return_is_applied_once(self):
+        tx = circulation.issue_book(self.book, self.member)
+        circulation.return_book(tx)
+        with self.assertRaises(circulation.AlreadyReturned):
+            circulation.return_book(Transaction.objects.get(pk=tx.pk))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+
+    def test_late_return_charges_fine(self):
+        tx = circulation.issue_book(self.book, self.member, today=date.today() - timedelta(days=20))
+        circulation.return_book(tx)
+        tx.refresh_from_db()
+        self.assertEqual(tx.fine, Decimal('30.00'))
+        circulation.pay_fine(tx)
+        with self.assertRaises(circulation.NoFineDue):
+            circulation.pay_fine(tx)
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.fiction = Category.objects.create(name='Fiction')
+        self.by_title = Book.objects.create(code_no='S1', title='Dune', author='Frank Herbert', category=self.fiction)
+        self.by_author = Book.objects.create(code_no='S2', title='Children of Dune', author='Herbert')
+        self.by_category = Book.objects.create(code_no='S3', title='Foundation', author='Isaac Asimov')
+
+    def test_title_matches_rank_above_author_matches(self):
+        atlas = Book.objects.create(code_no='S5', title='Atlas of Arrakis', author='Dune Society')
+        ranked = search.search_book_ids('dune')
+        self.assertEqual(ranked[-1], atlas.pk)
+        self.assertEqual(set(ranked[:2]), {self.by_title.pk, self.by_author.pk})
+
+    def test_words_match_as_prefixes_and_ignore_diacritics(self):
+        Book.objects.create(code_no='S4', title='Les Misérables', author='Victor Hugo')
+        self.assertEqual(len(search.search_book_ids('miser')), 1)
+        self.assertEqual(search.search_book_ids('dun herb'), search.search_book_ids('dune herbert'))
+
+    def test_saving_and_deleting_books_keeps_the_index_in_sync(self):
+        self.by_category.title = 'Second Foundation'
+        self.by_category.save()
+        self.assertEqual(search.search_book_ids('second'), [self.by_category.pk])
+        self.by_category.delete()
+        self.assertEqual(search.search_book_ids('foundation'), [])
+
+    def test_category_changes_reindex_their_books(self):
+        self.fiction.name = 'Science Fiction'
+        self.fiction.save()
+        self.assertEqual(search.search_book_ids('science'), [self.by_title.pk])
+        self.fiction.delete()
+        self.assertEqual(search.search_book_ids('science'), [])
+        self.assertEqual(search.search_book_ids('dune', limit=1), [self.by_title.pk])
+
+    def test_rebuild_matches_incremental_index(self):
+        before = search.search_book_ids('herbert')
+        self.assertEqual(search.rebuild_index(), 3)
+        self.assertEqual(search.search_book_ids('herbert'), before)
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        # Repeated titles make the id tie-breaker matter.
+        Book.objects.bulk_create(Book(code_no=f'P{i}', title=f'Title {i % 3}') for i in range(7))
+        self.ordered = list(Book.objects.order_by('title', 'id').values_list('id', flat=True))
+        self.member = User.objects.create_user('member', password='pw')
+
+    def test_pages_cover_every_row_once(self):
+        seen, cursor = [], None
+        while True:
+            page = keyset_page(Book.objects.all(), views.BOOK_LISTING_ORDER, cursor, 3)
+            seen.extend(book.pk for book in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.ordered)
+
+    def test_unusable_cursors_start_from_the_top(self):
+        for cursor in ['not-base64!', encode_cursor(['Title 1']), encode_cursor(['Title 1', 'x']),
+                       encode_cursor(['Title 1', None]), encode_cursor({'id': 1})]:
+            page = keyset_page(Book.objects.all(), views.BOOK_LISTING_ORDER, cursor, 3)
+            self.assertEqual([book.pk for book in page], self.ordered[:3])
+
+    def test_listing_view_ignores_a_wrong_typed_cursor(self):
+        self.client.force_login(self.member)
+        response = self.client.get('/books/', {'after': encode_cursor(['Title 1', 'x'])})
+        self.assertEqual(response.status_code, 200)
+
+    def test_stream_sends_every_row_after_the_cursor(self):
+        self.client.force_login(self.member)
+        first = Book.objects.get(pk=self.ordered[0])
+        response = self.client.get('/books/', {'stream': '1', 'after': encode_cursor([first.title, first.pk])})
+        body = b''.join(response.streaming_content).decode()
+        codes = re.findall(r'>(P\d+)<', body)
+        rest = Book.objects.filter(pk__in=self.ordered[1:]).order_by('title', 'id')
+        self.assertEqual(codes, list(rest.values_list('code_no', flat=True)))
+
+
+class HoldQueueTests(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user('reader', password='pw')
+        self.first = User.objects.create_user('first', password='pw')
+        self.second = User.objects.create_user('second', password='pw')
+        self.book = Book.objects.create(code_no='B1', title='Dune', total_copies=1, available_copies=1)
+        self.loan = circulation.issue_book(self.book, self.reader)
+
+    def test_hold_only_when_nothing_on_shelf(self):
+        other = Book.objects.create(code_no='B2', title='Emma', total_copies=1, available_copies=1)
+        with self.assertRaises(holds.CopyOnShelf):
+            holds.place_hold(other, self.first)
+        holds.place_hold(self.book, self.first)
+        with self.assertRaises(holds.AlreadyHeld):
+            holds.place_hold(self.book, self.first)
+
+    def test_return_goes_to_head_of_queue(self):
+        first = holds.place_hold(self.book, self.first)
+        second = holds.place_hold(self.book, self.second)
+        self.assertEqual(holds.queue_position(second), 2)
+        circulation.return_book(self.loan)
+        first.refresh_from_db()
+        self.book.refresh_from_db()
+        self.assertEqual(first.status, 'ready')
+        self.assertEqual(self.book.available_copies, 0)
+        self.assertEqual(holds.queue_position(second), 1)
+
+    def test_priority_jumps_the_queue(self):
+        holds.place_hold(self.book, self.first)
+        urgent = holds.place_hold(self.book, self.second, priority=1)
+        circulation.return_books([self.loan])
+        urgent.refresh_from_db()
+        self.assertEqual(urgent.status, 'ready')
+
+    def test_collecting_a_ready_hold_uses_the_reserved_copy(self):
+        hold = holds.place_hold(self.book, self.first)
+        circulation.return_book(self.loan)
+        with self.assertRaises(circulation.BookUnavailable):
+            circulation.issue_book(self.book, self.second)
+        circulation.issue_book(self.book, self.first)
+        hold.refresh_from_db()
+        self.book.refresh_from_db()
+        self.assertEqual(hold.status, 'fulfilled')
+        self.assertEqual(self.book.available_copies, 0)
+
+    def test_expired_hold_passes_copy_on_then_to_shelf(self):
+        today = date.today()
+        first = holds.place_hold(self.book, self.first)
+        second = holds.place_hold(self.book, self.second)
+        circulation.return_book(self.loan, today=today)
+        later = today + timedelta(days=holds.PICKUP_DAYS + 1)
+        self.assertEqual(holds.expire_holds(later), (1, 1))
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'ready')
+        self.assertEqual(holds.expire_holds(later + timedelta(days=holds.PICKUP_DAYS + 1)), (1, 0))
+        first.refresh_from_db()
+        self.book.refresh_from_db()
+        self.assertEqual(first.status, 'expired')
+        self.assertEqual(self.book.available_copies, 1)
+
+    def test_allocation_is_an_index_seek(self):
+        with connection.cursor() as cursor:
+            sql, params = Hold.objects.filter(book_id=self.book.pk, status='waiting').order_by(
+                *holds.QUEUE_ORDER).values('id')[:1].query.sql_with_params()
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('hold_queue_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class BarcodeScanTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.member = User.objects.create_user('member', password='pw')
+        self.book = Book.objects.create(code_no='B1', title='Dune', total_copies=2, available_copies=2)
+        counters.refresh()
+        self.client.force_login(self.staff)
+
+    def scan(self, **payload):
+        return self.client.post('/api/circulation/scan/', json.dumps(payload), content_type='application/json')
+
+    def test_new_book_gets_labelled_copies(self):
+        self.assertEqual(sorted(self.book.copies.values_list('barcode', flat=True)), ['B1-001', 'B1-002'])
+        self.book.total_copies = 3
+        self.book.save()
+        self.assertEqual(self.book.copies.count(), 3)
+
+    def test_migration_labels_copies_of_existing_books(self):
+        migration = importlib.import_module('library.migrations.0010_expand_book_copies')
+        BookCopy.objects.filter(barcode='B1-002').delete()
+        migration.expand_copies(django_apps, None)
+        self.assertEqual(sorted(self.book.copies.values_list('barcode', flat=True)), ['B1-001', 'B1-002'])
+
+    def test_scan_resolves_copy_book_and_loan_in_one_query(self):
+        circulation.issue_book(self.book, self.member, copy=BookCopy.objects.get(barcode='B1-002'))
+        with self.assertNumQueries(1):
+            copy = copies.scan('B1-002')
+            self.assertEqual((copy.book.title, copy.open_loan.user.username), ('Dune', 'member'))
+        self.assertIsNone(copies.scan('B1-001').open_loan)
+        self.assertIsNone(copies.scan('NOPE'))
+
+    def test_scan_issues_then_returns(self):
+        issued = self.scan(barcode='B1-001', member='member').json()
+        self.assertEqual(issued['action'], 'issued')
+        self.assertEqual(Transaction.objects.get(pk=issued['transaction']).copy.barcode, 'B1-001')
+        looked_up = self.client.get('/api/circulation/scan/', {'barcode': 'B1-001'}).json()
+        self.assertEqual(looked_up['loan']['member'], 'member')
+        returned = self.scan(barcode='B1-001').json()
+        self.assertEqual((returned['action'], returned['transaction']), ('returned', issued['transaction']))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+
+    def test_copy_cannot_be_out_twice(self):
+        copy = BookCopy.objects.get(barcode='B1-001')
+        circulation.issue_book(self.book, self.member, copy=copy)
+        with self.assertRaises(circulation.BookUnavailable):
+            circulation.issue_book(self.book, self.staff, copy=copy)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+
+    def test_unknown_barcode_and_members(self):
+        self.assertEqual(self.scan(barcode='NOPE', member='member').status_code, 404)
+        self.client.force_login(self.member)
+        self.assertEqual(self.scan(barcode='B1-001').status_code, 403)
+
+
+class CleanupAdminTransactionsTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.member = User.objects.create_user('member', password='pw')
+        self.books = Book.objects.bulk_create(
+            Book(code_no=f'B{i}', title=f'Book {i}', total_copies=3, available_copies=3) for i in range(4)
+        )
+        for book in self.books:
+            circulation.issue_book(book, self.staff)
+            circulation.issue_book(book, self.staff)
+            circulation.issue_book(book, self.member)
+        circulation.return_book(Transaction.objects.filter(user=self.staff).first())
+
+    def cleanup(self, *args):
+        out = io.StringIO()
+        call_command('cleanup_admin_transactions', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_changes_nothing(self):
+        self.assertIn('Found 8 transactions for admin users (7 open across 4 books)', self.cleanup('--dry-run'))
+        self.assertEqual(Transaction.objects.count(), 12)
+
+    def test_restores_copies_and_deletes_in_chunks(self):
+        waiting = holds.place_hold(self.books[1], self.member)
+        self.cleanup('--batch-size', '3')
+        self.assertFalse(Transaction.objects.filter(user=self.staff).exists())
+        self.assertEqual(Transaction.objects.filter(user=self.member).count(), 4)
+        available = dict(Book.objects.values_list('code_no', 'available_copies'))
+        # B1's first freed copy went to the waiting hold instead of the shelf.
+        self.assertEqual(available, {'B0': 2, 'B1': 1, 'B2': 2, 'B3': 2})
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.status, 'ready')
+        self.assertEqual(counters.snapshot()[counters.COPIES_ON_LOAN], 4)
+
+
+class InventoryReconcileTests(TestCase):
+    def setUp(self):
+        self.member = User.objects.create_user('member', password='pw')
+        self.dune = Book.objects.create(code_no='B1', title='Dune', total_copies=3, available_copies=3)
+        self.emma = Book.objects.create(code_no='B2', title='Emma', total_copies=1, available_copies=1)
+        circulation.issue_book(self.dune, self.member)
+        circulation.issue_book(self.emma, self.member)
+        holds.place_hold(self.emma, User.objects.create_user('next', password='pw'))
+
+    def test_consistent_books_are_not_reported(self):
+        circulation.return_book(Transaction.objects.get(book=self.emma))
+        self.assertEqual(inventory.drifted(), [])
+
+    def test_reports_and_fixes_drift_in_one_query_each(self):
+        Book.objects.filter(pk=self.dune.pk).update(available_copies=3)
+        with self.assertNumQueries(1):
+            self.assertEqual(inventory.drifted(), [(self.dune.pk, 'B1', 3, 2)])
+        drift, _ = inventory.reconcile(apply=True)
+        self.assertEqual(len(drift), 1)
+        self.dune.refresh_from_db()
+        self.assertEqual(self.dune.available_copies, 2)
+
+    def test_report_only_keeps_the_watermark_back(self):
+        Book.objects.filter(pk=self.dune.pk).update(available_copies=0)
+        inventory.reconcile()
+        self.assertFalse(Watermark.objects.filter(name=inventory.WATERMARK).exists())
+
+    def test_incremental_only_checks_touched_books(self):
+        inventory.reconcile(apply=True)
+        long_ago = Watermark.objects.get(name=inventory.WATERMARK).value - timedelta(days=1)
+        Book.objects.update(updated_at=long_ago)
+        # Drift written behind the app's back, without touching updated_at.
+        Book.objects.filter(pk__in=[self.dune.pk, self.emma.pk]).update(available_copies=0)
+        Book.objects.filter(pk=self.emma.pk).update(available_copies=1)
+        out = io.StringIO()
+        call_command('reconcile_inventory', '--incremental', stdout=out)
+        self.assertIn('No drift in books touched since', out.getvalue())
+
+        Book.objects.filter(pk=self.dune.pk).update(updated_at=timezone.now())
+        drift, _ = inventory.reconcile(incremental=True, apply=True)
+        self.assertEqual([code for _, code, *_ in drift], ['B1'])
+        # Untouched drift is left for a full run.
+        self.assertEqual([code for _, code, *_ in inventory.drifted()], ['B2'])
+
+    def test_admin_edits_to_a_loan_flag_its_book(self):
+        inventory.reconcile(apply=True)
+        Book.objects.update(updated_at=Watermark.objects.get(name=inventory.WATERMARK).value - timedelta(days=1))
+        loan = Transaction.objects.get(book=self.dune)
+        staff = User.objects.create_superuser('staff', password='pw')
+        self.client.force_login(staff)
+        response = self.client.post(f'/admin/library/transaction/{loan.pk}/change/', {
+            'user': self.member.pk, 'book': self.dune.pk, 'copy': '', 'issue_date': loan.issue_date,
+            'due_date': loan.due_date, 'return_date': date.today(), 'status': 'returned', 'fine': '0.00',
+            'accrued_fine': '0.00',
+        })
+        self.assertEqual(response.status_code, 302)
+        drift, _ = inventory.reconcile(incremental=True, apply=True)
+        self.assertEqual([code for _, code, *_ in drift], ['B1'])
+
+        self.client.post('/admin/library/transaction/', {
+            'action': 'delete_selected', '_selected_action': [Transaction.objects.get(book=self.emma).pk], 'post': 'yes',
+        })
+        drift, _ = inventory.reconcile(incremental=True, apply=True)
+        self.assertEqual([code for _, code, *_ in drift], ['B2'])
+
+
+class ImportCatalogTests(TestCase):
+    def run_import(self, rows, suffix='.csv', **options):
+        out = io.StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix=suffix) as f:
+            f.write(rows)
+            f.flush()
+            call_command('import_catalog', f.name, stdout=out, **options)
+        return out.getvalue()
+
+    def test_upsert_keeps_loans_and_indexes_books(self):
+        member = User.objects.create_user('member', password='pw')
+        book = Book.objects.create(code_no='B1', title='Dune', total_copies=2, available_copies=2)
+        circulation.issue_book(book, member)
+        self.run_import(
+            'code_no,title,author,category,isbn,total_copies\n'
+            'B1,Dune Messiah,Frank Herbert,Fiction,,3\n'
+            'B2,Emma,Jane Austen,Classics,,2\n',
+            batch_size=1,
+        )
+        book.refresh_from_db()
+        self.assertEqual((book.title, book.total_copies, book.available_copies), ('Dune Messiah', 3, 2))
+        self.assertEqual(book.copies.count(), 3)
+        emma = Book.objects.get(code_no='B2')
+        self.assertEqual((emma.category.name, emma.available_copies, emma.copies.count()), ('Classics', 2, 2))
+        self.assertEqual(search.search_book_ids('messiah'), [book.pk])
+        self.assertEqual(search.search_book_ids('classics'), [emma.pk])
+        self.assertEqual(Counter.objects.get(name=counters.TOTAL_COPIES).value, 5)
+
+    def test_bad_rows_are_skipped_and_reported_by_line(self):
+        out = self.run_import(
+            '{"code_no": "B1", "title": "Dune", "total_copies": 0}\n'
+            '[1, 2]\n'
+            '\n'
+            '{"code_no": "B2", "title": "Emma", "total_copies": "two"}\n'
+            '{"code_no": "B3", "title": "Ulysses", "total_copies": -1}\n'
+            '{"code_no": "B4"}\n'
+            '{"code_no": "B5", "title": "Persuasion"}\n'
+            '{"code_no": "B6", "title": \n',
+            suffix='.jsonl',
+        )
+        self.assertEqual(dict(Book.objects.values_list('code_no', 'total_copies')), {'B1': 0, 'B5': 1})
+        for line, error in [(2, 'not an object'), (4, 'whole number'), (5, 'negative'), (6, 'required'),
+                            (8, 'invalid JSON')]:
+            self.assertRegex(out, rf'line {line} .*{error}')
+        self.assertIn('Skipped 5 rows with errors.', out)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportMembersTests(TestCase):
+    ROWS = (
+        'username,password,first_name,last_name,email,phone,membership_type,membership_start\n'
+        'alice,secret-a,Alice,Archer,alice@example.com,555,6m,2026-01-01\n'
+        'bob,secret-b,Bob,,not-an-email,,1y,\n'
+        'alice,secret-c,,,,,1y,\n'
+        ',secret-d,,,,,1y,\n'
+        'carol,secret-e,,,,,3y,\n'
+        'dave,,,,,,2y,\n'
+        'erin,secret-f,Erin,,,,2y,2025-02-30\n'
+        'frank,secret-g,Frank,,,,,\n'
+    )
+
+    def run_import(self, rows=ROWS, **options):
+        out = io.StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write(rows)
+            f.flush()
+            call_command('import_members', f.name, stdout=out, **options)
+        return out.getvalue()
+
+    def test_imports_valid_rows_and_reports_the_rest(self):
+        out = self.run_import(workers=0, batch_size=3)
+        self.assertEqual(sorted(User.objects.values_list('username', flat=True)), ['alice', 'frank'])
+        alice = Member.objects.select_related('user').get(user__username='alice')
+        self.assertEqual((alice.membership_start, alice.membership_end), (date(2026, 1, 1), date(2026, 6, 30)))
+        self.assertTrue(alice.user.check_password('secret-a'))
+        frank = Member.objects.get(user__username='frank')
+        self.assertEqual(frank.membership_end, date.today() + timedelta(days=Member.MEMBERSHIP_DAYS['1y']))
+        for line, error in [(3, 'valid email'), (4, 'already taken'), (5, 'username is required'),
+                            (6, 'membership_type'), (7, 'password is required'), (8, 'membership_start')]:
+            self.assertRegex(out, rf'line {line} .*{error}')
+        self.assertIn('Skipped 6 rows with errors.', out)
+
+    def test_json_lines_that_are_not_objects_are_rejected(self):
+        out = io.StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as f:
+            f.write('{"username": "alice", "password": "pw"}\n[1, 2]\n"x"\n{"username": "bob", "password": "pw"}\n'
+                    '{"username": "carol",\n{"username": "dave", "password": "pw"}\n')
+            f.flush()
+            call_command('import_members', f.name, workers=0, batch_size=3, stdout=out)
+        self.assertEqual(sorted(User.objects.values_list('username', flat=True)), ['alice', 'bob', 'dave'])
+        self.assertRegex(out.getvalue(), r'line 2 .*not an object')
+        self.assertRegex(out.getvalue(), r'line 3 .*not an object')
+        self.assertRegex(out.getvalue(), r'line 5 .*invalid JSON')
+        self.assertIn('Skipped 3 rows with errors.', out.getvalue())
+
+    def test_hashes_in_a_process_pool(self):
+        self.run_import(workers=2, batch_size=2)
+        user = User.objects.get(username='frank')
+        self.assertTrue(user.password.startswith('md5$'))
+        self.assertTrue(user.check_password('secret-g'))
+
+    def test_dry_run_creates_nothing(self):
+        out = self.run_import(workers=0, dry_run=True)
+        self.assertIn('Validated 2 members', out)
+        self.assertFalse(User.objects.exists())
+
+    def test_username_taken_mid_import_only_fails_its_row(self):
+        validate = import_members.Command.validate
+
+        def validate_then_race(command, batch):
+            valid = validate(command, batch)
+            User.objects.create(username='alice')
+            return valid
+
+        with mock.patch.object(import_members.Command, 'validate', validate_then_race):
+            out = self.run_import(workers=0)
+        self.assertIn('line 2 (alice): UNIQUE constraint failed', out)
+        self.assertTrue(Member.objects.filter(user__username='frank').exists())
+        self.assertFalse(Member.objects.filter(user__username='alice').exists())
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.member = User.objects.create_user('member', password='pw')
+        self.fiction = Category.objects.create(name='Fiction')
+        self.dune = Book.objects.create(code_no='B1', title='Dune', category=self.fiction, total_copies=4,
+                                        available_copies=4)
+        self.emma = Book.objects.create(code_no='B2', title='Emma', total_copies=2, available_copies=2)
+        self.day = date.today() - timedelta(days=40)
+
+    def on(self, offset):
+        return self.day + timedelta(days=offset)
+
+    def category_row(self, offset, category):
+        return DailyCategoryStats.objects.get(day=self.on(offset), category=category)
+
+    def test_rolls_up_issues_returns_and_fines(self):
+        late = circulation.issue_book(self.dune, self.member, today=self.on(0))
+        circulation.issue_book(self.dune, self.member, today=self.on(0))
+        circulation.issue_book(self.emma, self.member, today=self.on(1))
+        circulation.return_book(late, today=late.due_date + timedelta(days=2))
+        circulation.pay_fine(late, today=late.due_date + timedelta(days=5))
+
+        self.assertEqual(rollups.rollup(until=self.on(30)), (self.on(0), self.on(30)))
+        dune_day = DailyBookStats.objects.get(day=self.on(0), book=self.dune)
+        self.assertEqual((dune_day.issues, dune_day.returns), (2, 0))
+        returned = self.category_row((late.return_date - self.day).days, self.fiction)
+        self.assertEqual((returned.returns, returned.fines_assessed, returned.on_loan), (1, late.fine, 1))
+        self.assertEqual(self.category_row(0, self.fiction).on_loan, 2)
+        self.assertEqual(self.category_row(1, None).issues, 1)
+        self.assertEqual(self.category_row(30, None).on_loan, 1)
+
+        report = rollups.report(self.on(0), self.on(30))
+        self.assertEqual(report['totals']['issues'], 3)
+        self.assertEqual(report['totals']['fines_paid'], late.fine)
+        self.assertEqual(report['top_titles'][0]['book__title'], 'Dune')
+        fiction = next(row for row in report['categories'] if row['category_id'] == self.fiction.pk)
+        self.assertEqual(fiction['copy_days'], 31 * 4)
+
+    def test_incremental_runs_start_after_the_watermark(self):
+        circulation.issue_book(self.dune, self.member, today=self.on(0))
+        rollups.rollup(until=self.on(9))
+        self.assertEqual(rollups.rolled_up_to(), self.on(9))
+        self.assertIsNone(rollups.rollup(until=self.on(9)))
+
+        circulation.issue_book(self.dune, self.member, today=self.on(12))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(rollups.rollup(until=self.on(14)), (self.on(10), self.on(14)))
+        self.assertFalse([q for q in ctx.captured_queries if 'FROM "library_transaction"' in q['sql']
+                          and self.on(0).isoformat() in q['sql']])
+        self.assertEqual(self.category_row(14, self.fiction).on_loan, 2)
+        self.assertEqual(DailyCategoryStats.objects.filter(category=self.fiction).count(), 15)
+
+        rollups.rollup(until=self.on(14), rebuild=True)
+        self.assertEqual(self.category_row(14, self.fiction).on_loan, 2)
+        self.assertEqual(DailyBookStats.objects.count(), 2)
+
+    def test_archived_loans_are_counted(self):
+        tx = circulation.issue_book(self.emma, self.member, today=self.on(0))
+        circulation.return_book(tx, today=self.on(3))
+        archive.archive(cutoff=self.on(10))
+        self.assertFalse(Transaction.objects.exists())
+        rollups.rollup(until=self.on(5))
+        emma = DailyBookStats.objects.filter(book=self.emma).order_by('day')
+        self.assertEqual([(row.issues, row.returns) for row in emma], [(1, 0), (0, 1)])
+
+    def test_dashboard_reads_only_the_rollups(self):
+        circulation.issue_book(self.dune, self.member, today=self.on(0))
+        call_command('rollup_circulation', until=self.on(30), stdout=io.StringIO())
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get('/analytics/').status_code, 403)
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/analytics/', {'start': self.on(0), 'end': self.on(30)})
+        self.assertContains(response, 'Dune')
+        self.assertFalse([q for q in ctx.captured_queries if 'library_transaction' in q['sql']])
+        response = self.client.get('/analytics/', {'start': self.on(-400), 'end': self.on(30)})
+        self.assertTrue(response.context['report']['monthly'])
+
+
+class MemberSummaryTests(TestCase):
+    def setUp(self):
+        self.member = User.objects.create_user('member', password='pw')
+        Member.objects.create(user=self.member)
+        self.books = [
+            Book.objects.create(code_no=f'B{i}', title=f'Book {i}', total_copies=1, available_copies=1)
+            for i in range(3)
+        ]
+        self.today = date.today()
+
+    def summary(self):
+        return MemberSummary.objects.get(user=self.member)
+
+    def assert_matches_source(self):
+        fresh = summaries.compute([self.member.pk], self.summary().overdue_as_of)[0]
+        for field in summaries.FIELDS:
+            self.assertEqual(getattr(self.summary(), field), getattr(fresh, field), field)
+
+    def test_built_on_first_read(self):
+        circulation.issue_book(self.books[0], self.member, today=self.today - timedelta(days=20))
+        MemberSummary.objects.all().delete()
+        summary = summaries.get(self.member)
+        self.assertEqual((summary.open_loans, summary.overdue_loans), (1, 1))
+        self.assertTrue(MemberSummary.objects.filter(user=self.member).exists())
+
+    def test_kept_in_step_with_circulation(self):
+        start = self.today - timedelta(days=30)
+        late = circulation.issue_book(self.books[0], self.member, today=start)
+        circulation.issue_books(self.books[1:], self.member, today=self.today)
+        self.assertEqual(self.summary().open_loans, 3)
+        circulation.accrue_fines(today=self.today)
+        self.assertEqual(self.summary().overdue_loans, 1)
+
+        circulation.return_book(late, today=self.today)
+        summary = self.summary()
+        self.assertEqual((summary.open_loans, summary.overdue_loans), (2, 0))
+        self.assertEqual(summary.outstanding_fines, late.fine)
+        self.assertGreater(late.fine, 0)
+        self.assert_matches_source()
+
+        circulation.pay_fine(late)
+        circulation.return_books(Transaction.objects.filter(status='issued'), today=self.today)
+        summary = self.summary()
+        self.assertEqual((summary.open_loans, summary.outstanding_fines), (0, Decimal('0.00')))
+        self.assertEqual(summary.last_activity, self.today)
+        self.assert_matches_source()
+
+    def test_user_home_pages_recent_loans(self):
+        day = self.today - timedelta(days=100)
+        Transaction.objects.bulk_create(
+            Transaction(user=self.member, book=self.books[0], issue_date=day + timedelta(days=i),
+                        due_date=day + timedelta(days=i + 14), return_date=day + timedelta(days=i + 1),
+                        status='returned')
+            for i in range(views.RECENT_LOANS + 5)
+        )
+        self.client.force_login(self.member)
+        response = self.client.get('/user-home/')
+        self.assertEqual(len(response.context['my_issued']), views.RECENT_LOANS)
+        older = re.search(r'href="(/history/\?after=[^"]+)"', response.content.decode()).group(1)
+        self.assertEqual(len(self.client.get(older).context['loans']), 5)
+
+    def test_admin_edits_and_book_deletes_refresh_the_summary(self):
+        first = circulation.issue_book(self.books[0], self.member)
+        circulation.issue_book(self.books[1], self.member)
+        circulation.issue_book(self.books[2], self.member, today=self.today - timedelta(days=30))
+        self.client.force_login(User.objects.create_superuser('staff', password='pw'))
+        self.client.post(f'/admin/library/transaction/{first.pk}/change/', {
+            'user': self.member.pk, 'book': first.book_id, 'copy': '', 'issue_date': first.issue_date,
+            'due_date': first.due_date, 'return_date': self.today, 'status': 'returned', 'fine': '12.00',
+            'accrued_fine': '0.00',
+        })
+        self.assertEqual((self.summary().open_loans, self.summary().outstanding_fines), (2, Decimal('12.00')))
+        self.client.post(f'/admin/library/transaction/{first.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(self.summary().outstanding_fines, Decimal('0.00'))
+        self.books[1].delete()
+        self.assertEqual(self.summary().open_loans, 1)
+        self.assert_matches_source()
+
+    def test_reconcile_command_repairs_drift(self):
+        circulation.issue_book(self.books[0], self.member)
+        MemberSummary.objects.filter(user=self.member).update(open_loans=7)
+        out = io.StringIO()
+        call_command('reconcile_member_summaries', stdout=out)
+        self.assertIn('open_loans: 7 -> 1', out.getvalue())
+        self.assertEqual(self.summary().open_loans, 1)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.member = User.objects.create_user('member', password='pw')
+        self.book = Book.objects.create(code_no='B1', title='Dune', total_copies=5, available_copies=5)
+        today = date.today()
+        self.loans = []
+        for days_ago, kept in ((900, 10), (800, 20), (700, 10), (30, 10)):
+            tx = circulation.issue_book(self.book, self.member, today=today - timedelta(days=days_ago))
+            self.loans.append(circulation.return_book(tx, today=today - timedelta(days=days_ago - kept)))
+        self.open_loan = circulation.issue_book(self.book, self.member)
+
+    def test_moves_only_old_settled_loans(self):
+        unpaid = self.loans[1]  # returned six days late
+        self.assertGreater(unpaid.fine, 0)
+        out = io.StringIO()
+        call_command('archive_transactions', '--batch-size', '1', stdout=out)
+        self.assertIn('Archived 2 settled loans', out.getvalue())
+        self.assertEqual(sorted(ArchivedTransaction.objects.values_list('id', flat=True)),
+                         sorted([self.loans[0].pk, self.loans[2].pk]))
+        self.assertEqual(Transaction.objects.count(), 3)
+
+        circulation.pay_fine(unpaid)
+        self.assertEqual(archive.archive(archive.default_cutoff()), 1)
+
+    def test_history_reads_both_tables_in_order(self):
+        archive.archive(archive.default_cutoff())
+        self.client.force_login(self.member)
+        expected = [self.open_loan.pk] + [tx.pk for tx in reversed(self.loans)]
+        seen, url = [], '/history/'
+        with mock.patch('library.views.HISTORY_PER_PAGE', 2):
+            while url:
+                response = self.client.get(url)
+                seen += [t.pk for t in response.context['loans']]
+                url = response.context['next_query'] and '/history/?' + response.context['next_query']
+        self.assertEqual(seen, expected)
+        self.assertContains(self.client.get('/history/'), 'Archived')
+
+    def test_exports_include_archived_loans(self):
+        def exported(**filters):
+            body = ''.join(exports.export('transactions', 'csv', chunk_size=1, **filters))
+            return list(csv.DictReader(io.StringIO(body)))
+
+        old_years = {'returned_to': date.today() - timedelta(days=365)}
+        before, before_old = exported(), exported(**old_years)
+        archive.archive(archive.default_cutoff())
+        self.assertEqual(ArchivedTransaction.objects.count(), 2)
+        self.assertEqual(exported(), before)
+        self.assertEqual(exported(**old_years), before_old)
+        self.assertEqual(len(before), 5)
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.alice = User.objects.create_user('alice', password='pw', first_name='Alice', last_name='Smith')
+        Member.objects.create(user=self.alice, phone='9876543210')
+        self.dune = Book.objects.create(code_no='SF001', title='Dune', isbn='9780441013593',
+                                        total_copies=1, available_copies=1)
+        Book.objects.bulk_create(
+            Book(code_no=f'D{i:03d}', title=f'Dune Messiah {i}', total_copies=1, available_copies=1) for i in range(30)
+        )
+        self.client.force_login(self.staff)
+
+    def labels(self, url, q, **params):
+        return [r['label'] for r in self.client.get(url, {'q': q, **params}).json()['results']]
+
+    def test_books_match_title_code_and_isbn_prefixes(self):
+        self.assertEqual(self.labels('/api/autocomplete/books/', 'sf0'), ['Dune (SF001)'])
+        self.assertEqual(self.labels('/api/autocomplete/books/', '978-0441'), ['Dune (SF001)'])
+        self.assertEqual(len(self.labels('/api/autocomplete/books/', 'dune')), autocomplete.DEFAULT_LIMIT)
+        self.assertEqual(len(self.labels('/api/autocomplete/books/', 'dune', limit=500)), autocomplete.MAX_LIMIT)
+        self.assertEqual(self.labels('/api/autocomplete/books/', ''), [])
+
+    def test_isbn_matches_ignore_hyphens_and_allow_check_digit_x(self):
+        Book.objects.create(code_no='OLD1', title='Old print', isbn='0-8044-2957-X')
+        for q in ('0804', '0-8044-29', '080442957x', '0-8044-2957-X'):
+            self.assertEqual(self.labels('/api/autocomplete/books/', q), ['Old print (OLD1)'], q)
+        self.assertEqual(self.labels('/api/autocomplete/books/', '97804410-13593'), ['Dune (SF001)'])
+
+    def test_case_is_folded_like_sqlite_lower(self):
+        Book.objects.create(code_no='FR1', title='École des femmes')
+        for q in ('Éc', 'ÉCOLE', 'Écol', 'fr1'):
+            self.assertEqual(self.labels('/api/autocomplete/books/', q), ['École des femmes (FR1)'], q)
+        for q in ('ALI', 'Ali', 'SMITH'):
+            self.assertEqual(self.labels('/api/autocomplete/members/', q), ['Alice Smith (alice)'], q)
+
+    def test_members_match_username_name_and_phone(self):
+        for q in ('ali', 'smi', '98765'):
+            self.assertEqual(self.labels('/api/autocomplete/members/', q), ['Alice Smith (alice)'])
+        self.assertEqual(self.labels('/api/autocomplete/members/', 'sta'), [])
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get('/api/autocomplete/members/', {'q': 'a'}).status_code, 403)
+
+    def test_lookups_are_index_range_scans(self):
+        with CaptureQueriesContext(connection) as ctx:
+            autocomplete.books('978')
+            autocomplete.members('a')
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plan = ' '.join(row[-1] for row in cursor.fetchall())
+                self.assertRegex(plan, r'SEARCH \w+ USING (COVERING )?INDEX \w+ \(\S+>\? AND', plan)
+
+    def test_issue_form_renders_no_options_and_validates_the_posted_id(self):
+        response = self.client.get('/issue/', {'book': self.dune.pk})
+        self.assertNotContains(response, '<option')
+        self.assertContains(response, 'value="Dune (SF001)"')
+        response = self.client.post('/issue/', {'book': self.dune.pk, 'user': self.alice.pk})
+        self.assertRedirects(response, '/admin-home/')
+        self.assertTrue(Transaction.objects.filter(book=self.dune, user=self.alice).exists())
+        response = self.client.post('/issue/', {'book': self.dune.pk, 'user': self.staff.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors['user'])
+
+
+# Budgets assume db-backed sessions and ModelBackend, whatever LIBRARY_AUTH_PROFILE says.
+@override_settings(**settings.AUTH_PROFILES['default'])
+class BatchCirculationApiTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.member = User.objects.create_user('member', password='pw')
+        self.dune = Book.objects.create(code_no='B1', title='Dune', total_copies=2, available_copies=2)
+        self.emma = Book.objects.create(code_no='B2', title='Emma', total_copies=1, available_copies=1)
+        counters.refresh()
+        summaries.refresh()
+        self.client.force_login(self.staff)
+
+    def post(self, url, payload):
+        return self.client.post(url, json.dumps(payload), content_type='application/json')
+
+    def test_issue_batch_is_a_fixed_number_of_queries(self):
+        books = Book.objects.bulk_create(
+            Book(code_no=f'S{i}', title=f'Stack {i}', total_copies=1, available_copies=1) for i in range(20)
+        )
+        # Session, user, member, books, ready holds, then savepoints around
+        # one UPDATE, one INSERT, one counter UPDATE and one summary UPDATE.
+        with self.assertNumQueries(13):
+            response = self.post('/api/circulation/issue/', {'member': 'member', 'books': [b.pk for b in books]})
+        self.assertTrue(all(r['ok'] for r in response.json()['results']))
+
+    def test_issue_batch_reports_each_item(self):
+        response = self.post('/api/circulation/issue/', {
+            'member': 'member', 'books': [self.dune.pk, 'B2', 'B2', 'NOPE', self.dune.pk],
+        })
+        results = response.json()['results']
+        self.assertEqual([r['ok'] for r in results], [True, True, False, False, True])
+        self.assertEqual(results[2]['error'], 'not available')
+        self.assertEqual(results[3]['error'], 'not found')
+        self.assertEqual(Transaction.objects.filter(user=self.member, status='issued').count(), 3)
+        self.assertEqual(list(Book.objects.order_by('id').values_list('available_copies', flat=True)), [0, 0])
+        self.assertEqual(counters.snapshot()[counters.COPIES_ON_LOAN], 3)
+
+    def test_return_batch(self):
+        late = circulation.issue_book(self.dune, self.member, today=date.today() - timedelta(days=20))
+        loans = [late.pk, circulation.issue_book(self.emma, self.member).pk]
+        response = self.post('/api/circulation/return/', {'member': self.member.pk,
+                                                           'transactions': loans + [loans[0], 999]})
+        results = response.json()['results']
+        self.assertEqual([r['ok'] for r in results], [True, True, False, False])
+        self.assertEqual(results[0]['fine'], '30.00')
+        self.assertEqual(list(Book.objects.order_by('id').values_list('available_copies', flat=True)), [2, 1])
+        snap = counters.snapshot()
+        self.assertEqual((snap[counters.COPIES_ON_LOAN], snap[counters.OUTSTANDING_FINES]), (0, Decimal('30.00')))
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.post('/api/circulation/issue/', {'member': 'staff', 'books': [1]}).status_code, 400)
+        self.assertEqual(self.post('/api/circulation/issue/', {'member': 'member', 'books': []}).status_code, 400)
+        self.assertEqual(self.client.get('/api/circulation/issue/').status_code, 405)
+
+    def test_rejects_refs_that_are_not_ids_or_names(self):
+        for member in [True, ['member'], {'id': 1}, 1.0]:
+            response = self.post('/api/circulation/issue/', {'member': member, 'books': [self.dune.pk]})
+            self.assertEqual(response.status_code, 400, member)
+        for book in [True, [self.dune.pk], {'id': self.dune.pk}, None]:
+            response = self.post('/api/circulation/issue/', {'member': 'member', 'books': [book]})
+            self.assertEqual(response.status_code, 400, book)
+        loan = circulation.issue_book(self.dune, self.member)
+        response = self.post('/api/circulation/return/', {'member': 'member', 'transactions': [True]})
+        self.assertEqual(response.status_code, 400)
+        loan.refresh_from_db()
+        self.assertEqual(loan.status, 'issued')
+
+
+class FineAccrualTests(TestCase):
+    def setUp(self):
+        self.member = User.objects.create_user('member', password='pw')
+        self.book = Book.objects.create(code_no='B1', title='Dune', total_copies=5, available_copies=5)
+
+    def test_accrues_open_overdue_loans_idempotently(self):
+        today = date.today()
+        late = circulation.issue_book(self.book, self.member, today=today - timedelta(days=20))
+        later = circulation.issue_book(self.book, self.member, today=today - timedelta(days=17))
+        on_time = circulation.issue_book(self.book, self.member)
+
+        self.assertEqual(circulation.accrue_fines(today), (2, 2))
+        self.assertEqual(circulation.accrue_fines(today), (0, 0))
+        late.refresh_from_db()
+        later.refresh_from_db()
+        on_time.refresh_from_db()
+        self.assertEqual((late.accrued_fine, late.fine_accrued_on), (Decimal('30.00'), today))
+        self.assertEqual(later.accrued_fine, Decimal('15.00'))
+        self.assertEqual(on_time.accrued_fine, Decimal('0.00'))
+        self.assertEqual(counters.snapshot()[counters.ACCRUED_FINES], Decimal('45.00'))
+
+        # The next day only moves the amounts forward.
+        circulation.accrue_fines(today + timedelta(days=1))
+        late.refresh_from_db()
+        self.assertEqual(late.accrued_fine, Decimal('35.00'))
+
+    def test_return_moves_accrued_fine_out_of_the_running_total(self):
+        late = circulation.issue_book(self.book, self.member, today=date.today() - timedelta(days=20))
+        circulation.accrue_fines()
+        late.refresh_from_db()
+        circulation.return_book(late)
+        snap = counters.snapshot()
+        self.assertEqual(snap[counters.ACCRUED_FINES], Decimal('0.00'))
+        self.assertEqual(snap[counters.OUTSTANDING_FINES], Decimal('30.00'))
+        self.assertEqual(snap[counters.OVERDUE_LOANS], 0)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.member = User.objects.create_user('member', password='pw')
+        self.book = Book.objects.create(code_no='B1', title='Dune, Part "One"', total_copies=2, available_copies=2)
+        self.today = date.today()
+        self.old = circulation.issue_book(self.book, self.member, today=self.today - timedelta(days=40))
+        circulation.return_book(self.old, today=self.today - timedelta(days=30))
+        self.new = circulation.issue_book(self.book, self.member)
+
+    def test_csv_round_trip(self):
+        body = ''.join(exports.export('transactions', 'csv', chunk_size=1))
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([int(row['id']) for row in rows], [self.old.pk, self.new.pk])
+        self.assertEqual(rows[0]['book_title'], 'Dune, Part "One"')
+        self.assertEqual(rows[0]['return_date'], (self.today - timedelta(days=30)).isoformat())
+        self.assertEqual(rows[1]['status'], 'issued')
+
+    def test_jsonl_round_trip_with_date_filters(self):
+        body = ''.join(exports.export('transactions', 'jsonl', issued_from=self.today - timedelta(days=1)))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.new.pk])
+        self.assertEqual(rows[0]['user_username'], 'member')
+        returned = ''.join(exports.export('transactions', 'jsonl', returned_to=self.today - timedelta(days=30)))
+        self.assertEqual([json.loads(line)['id'] for line in returned.splitlines()], [self.old.pk])
+
+    def test_view_streams_for_staff_only(self):
+        self.client.force_login(self.member)
+        self.assertRedirects(self.client.get('/export/books/'), '/user-home/', fetch_redirect_response=False)
+        self.client.force_login(self.staff)
+        response = self.client.get('/export/books/', {'format': 'jsonl'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['code_no'] for row in rows], ['B1'])
+        self.assertEqual(self.client.get('/export/transactions/', {'issued_from': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get('/export/members/').status_code, 404)
+
+    def test_command_writes_a_file(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+            out = io.StringIO()
+            call_command('export_data', 'transactions', output=f.name, stdout=out)
+            with open(f.name, newline='') as written:
+                self.assertEqual(len(list(csv.DictReader(written))), 2)
+        self.assertIn('Exported 2 transactions', out.getvalue())
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.member = User.objects.create_user('member', password='pw')
+        self.book = Book.objects.create(code_no='B1', title='Dune', total_copies=2, available_copies=2)
+
+    def test_counters_follow_writes(self):
+        Book.objects.create(code_no='B2', title='Emma', total_copies=3, available_copies=3)
+        late = circulation.issue_book(self.book, self.member, today=date.today() - timedelta(days=20))
+        circulation.issue_book(self.book, self.member)
+        counters.refresh([counters.OVERDUE_LOANS])
+        circulation.return_book(late)
+
+        snap = counters.snapshot()
+        self.assertEqual(snap[counters.TOTAL_BOOKS], 2)
+        self.assertEqual(snap[counters.TOTAL_COPIES], 5)
+        self.assertEqual(snap[counters.COPIES_ON_LOAN], 1)
+        self.assertEqual(snap[counters.OVERDUE_LOANS], 0)
+        self.assertEqual(snap[counters.OUTSTANDING_FINES], Decimal('30.00'))
+        self.assertEqual(snap, {**counters.compute(), 'overdue_as_of': date.today()})
+
+        circulation.pay_fine(late)
+        self.assertEqual(counters.snapshot()[counters.OUTSTANDING_FINES], Decimal('0.00'))
+
+    def test_book_edits_bump_total_copies_by_the_change(self):
+        counters.snapshot()
+        book = Book.objects.get(pk=self.book.pk)
+        book.total_copies = 5
+        with mock.patch.object(counters, 'refresh', side_effect=AssertionError('re-summed')):
+            book.save()
+            book.total_copies = 4
+            book.save()
+            book.save(update_fields=['title'])
+            self.assertEqual(counters.snapshot()[counters.TOTAL_COPIES], 4)
+            deferred = Book.objects.only('title').get(pk=self.book.pk)
+            deferred.total_copies = 6
+            deferred.save()
+        self.assertEqual(counters.snapshot()[counters.TOTAL_COPIES], 6)
+
+    def test_cascaded_loan_deletes_update_counters(self):
+        other = User.objects.create_user('other', password='pw')
+        late = circulation.issue_book(self.book, self.member, today=date.today() - timedelta(days=20))
+        circulation.issue_book(self.book, other)
+        Transaction.objects.filter(pk=late.pk).update(accrued_fine=Decimal('12.00'))
+        counters.refresh()
+        self.assertEqual(counters.snapshot()[counters.OVERDUE_LOANS], 1)
+
+        self.member.delete()
+        self.assertEqual(counters.snapshot(), {**counters.compute(), 'overdue_as_of': date.today()})
+        self.assertEqual(counters.snapshot()[counters.COPIES_ON_LOAN], 1)
+        self.book.delete()
+        snap = counters.snapshot()
+        self.assertEqual(snap, {**counters.compute(), 'overdue_as_of': date.today()})
+        self.assertEqual((snap[counters.COPIES_ON_LOAN], snap[counters.ACCRUED_FINES]), (0, Decimal('0.00')))
+
+    def test_admin_loan_edits_refresh_loan_counters(self):
+        staff = User.objects.create_superuser('staff', password='pw')
+        tx = circulation.issue_book(self.book, self.member)
+        counters.snapshot()
+        self.client.force_login(staff)
+        self.client.post(f'/admin/library/transaction/{tx.pk}/change/', {
+            'user': self.member.pk, 'book': self.book.pk, 'issue_date': tx.issue_date, 'due_date': tx.due_date,
+            'return_date': date.today(), 'fine': '5.00', 'status': 'returned', 'accrued_fine': '0.00',
+        })
+        snap = counters.snapshot()
+        self.assertEqual((snap[counters.COPIES_ON_LOAN], snap[counters.OUTSTANDING_FINES]), (0, Decimal('5.00')))
+        self.client.post(f'/admin/library/transaction/{tx.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(counters.snapshot()[counters.OUTSTANDING_FINES], Decimal('0.00'))
+
+    def test_snapshot_rebuilds_missing_counters(self):
+        Counter.objects.all().delete()
+        self.assertEqual(counters.snapshot()[counters.TOTAL_BOOKS], 1)
+
+    def test_admin_home_reads_counters_only(self):
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        counters.snapshot()
+        self.client.force_login(staff)
+        response = self.client.get('/admin-home/')
+        self.assertContains(response, '<strong>Copies:</strong> 2')
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN QUERY PLAN every SELECT a hot path issues.
+
+    Big tables must never be fully scanned, and loan lists must come out of
+    an index already in order rather than through a temporary sort.
+    """
+
+    FULL_SCAN = re.compile(r'^SCAN (library_transaction|library_book|auth_user|django_session)$')
+
+    @classmethod
+    def setUpTestData(cls):
+        bench.generate(300, seed=1)
+        cls.member = User.objects.get(username='member3')
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+
+    def setUp(self):
+        caches[catalog.CACHE_ALIAS].clear()
+
+    def assert_no_full_scans(self, action):
+        with CaptureQueriesContext(connection) as ctx:
+            action()
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[3] for row in cursor.fetchall()]
+            scans = [step for step in plan if self.FULL_SCAN.match(step)]
+            self.assertFalse(scans, f'Full table scan in:\n{sql}\n{plan}')
+            if 'FROM "library_transaction"' in sql:
+                self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, f'Sorted loans without an index:\n{sql}')
+
+    def get(self, user, url):
+        self.client.force_login(user)
+        return lambda: self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_user_home(self):
+        self.assert_no_full_scans(self.get(self.member, '/user-home/'))
+
+    def test_admin_home(self):
+        self.assert_no_full_scans(self.get(self.staff, '/admin-home/'))
+
+    def test_book_availability(self):
+        for url in ['/books/', '/books/?q=hist', '/books/?category=1&available=on']:
+            with self.subTest(url=url):
+                self.assert_no_full_scans(self.get(self.member, url))
+
+    def test_return_and_pay_fine_pages(self):
+        open_loan = Transaction.objects.filter(status='issued').first()
+        fined = Transaction.objects.filter(fine__gt=0, fine_paid=False).first()
+        self.assert_no_full_scans(self.get(self.staff, f'/return/{open_loan.id}/'))
+        self.assert_no_full_scans(self.get(self.staff, f'/pay-fine/{fined.id}/'))
+
+    def test_overdue_lookups(self):
+        self.assert_no_full_scans(lambda: circulation.accrue_fines())
+        self.assert_no_full_scans(lambda: counters.compute([counters.COPIES_ON_LOAN, counters.OVERDUE_LOANS,
+                                                            counters.OUTSTANDING_FINES]))
+
+
+@override_settings(ROOT_URLCONF='library_management.asgi_urls')
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        caches[catalog.CACHE_ALIAS].clear()
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.member = User.objects.create_user('member', password='pw')
+        self.fiction = Category.objects.create(name='Fiction')
+        self.dune = Book.objects.create(code_no='B1', title='Dune', category=self.fiction)
+        Book.objects.create(code_no='B2', title='Emma', available_copies=0)
+        circulation.issue_book(self.dune, self.member)
+
+    async def test_book_availability(self):
+        await self.async_client.aforce_login(self.member)
+        response = await self.async_client.get('/books/', {'category': self.fiction.pk})
+        self.assertContains(response, 'Dune')
+        self.assertNotContains(response, 'Emma')
+        response = await self.async_client.get('/books/', {'q': 'emm'})
+        self.assertContains(response, 'Emma')
+
+    async def test_book_availability_stream(self):
+        await self.async_client.aforce_login(self.member)
+        response = await self.async_client.get('/books/', {'stream': '1'})
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertIn('Dune', body)
+        self.assertIn('</html>', body)
+
+    async def test_user_home(self):
+        emma = await Book.objects.aget(code_no='B2')
+        await sync_to_async(holds.place_hold)(emma, self.staff)
+        await sync_to_async(holds.place_hold)(emma, self.member)
+        await self.async_client.aforce_login(self.member)
+        response = await self.async_client.get('/user-home/')
+        self.assertContains(response, 'Dune')
+        self.assertContains(response, 'Waiting (#2 in queue)')
+
+    async def test_admin_home(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get('/admin-home/')
+        self.assertContains(response, '<strong>Currently issued:</strong> 1')
+        response = await self.async_client.get('/user-home/')
+        self.assertRedirects(response, '/admin-home/', fetch_redirect_response=False)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        caches[catalog.CACHE_ALIAS].clear()
+        catalog.STATS.reset()
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.member = User.objects.create_user('member', password='pw')
+        self.fiction = Category.objects.create(name='Fiction')
+        self.dune = Book.objects.create(code_no='B1', title='Dune', category=self.fiction, total_copies=1)
+        self.client.force_login(self.member)
+
+    def test_pages_are_cached_per_filter(self):
+        self.client.get('/books/')
+        self.client.get('/books/')
+        self.client.get('/books/', {'category': self.fiction.pk})
+        # Search terms don't select a cached page.
+        self.client.get('/books/', {'available': 'on', 'q': ''})
+        stats = catalog.STATS.snapshot()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 3))
+
+    def test_circulation_moves_the_version_on(self):
+        self.assertContains(self.client.get('/books/'), '1 / 1')
+        with self.captureOnCommitCallbacks(execute=True):
+            tx = circulation.issue_book(self.dune, self.member)
+        self.assertContains(self.client.get('/books/'), '0 / 1')
+        with self.captureOnCommitCallbacks(execute=True):
+            circulation.return_book(tx)
+        self.assertContains(self.client.get('/books/'), '1 / 1')
+        self.assertEqual(catalog.STATS.snapshot()['misses'], 3)
+
+    def test_book_and_category_edits_move_the_version_on(self):
+        self.client.get('/books/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fiction.name = 'Science Fiction'
+            self.fiction.save()
+        self.assertContains(self.client.get('/books/'), 'Science Fiction')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dune.delete()
+        self.assertContains(self.client.get('/books/'), 'No books found.')
+
+    def test_no_bump_until_commit(self):
+        before = catalog.version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Book.objects.create(code_no='B2', title='Emma')
+        self.assertEqual(catalog.version(), before)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(catalog.version(), before)
+
+    def test_bumps_from_another_process_reach_the_web_server(self):
+        self.assertContains(self.client.get('/books/'), 'Dune')
+        Book.objects.filter(pk=self.dune.pk).update(title='Dune Messiah')
+        # A management command bumps through its own cache object on the same store.
+        other = FileBasedCache(settings.CACHES[catalog.CACHE_ALIAS]['LOCATION'], {})
+        with mock.patch.object(catalog, '_cache', return_value=other):
+            catalog.bump()
+        self.assertContains(self.client.get('/books/'), 'Dune Messiah')
+
+    def test_csrf_token_is_per_request(self):
+        Book.objects.filter(pk=self.dune.pk).update(available_copies=0)
+        first = self.client.get('/books/').content.decode()
+        self.client.force_login(self.staff)
+        second = self.client.get('/books/').content.decode()
+        self.assertEqual(catalog.STATS.snapshot()['hits'], 1)
+        self.assertNotIn(catalog.CSRF_PLACEHOLDER, second)
+        token = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+        self.assertNotEqual(token.search(first).group(1), token.search(second).group(1))
+
+    def test_stats_are_staff_only(self):
+        self.client.get('/books/')
+        self.assertEqual(self.client.get('/catalog-cache/').status_code, 403)
+        self.client.force_login(self.staff)
+        stats = self.client.get('/catalog-cache/').json()
+        self.assertEqual((stats['hits'], stats['misses']), (0, 1))
+        self.assertEqual(stats['version'], catalog.version())
+
+
+class AuthProfileTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.member = User.objects.create_user('member', password='pw')
+        Member.objects.create(user=self.member, phone='555')
+        self.warm('/books/')
+
+    def warm(self, path):
+        self.client.get(path)
+
+    def login(self, profile):
+        self.enterContext(override_settings(**settings.AUTH_PROFILES[profile]))
+        # SessionMiddleware picks its engine when the client's handler loads.
+        self.client, self.async_client = self.client_class(), self.async_client_class()
+        self.client.force_login(self.member)
+        self.async_client.cookies = self.client.cookies
+        self.warm('/books/')
+
+    def test_default_profile_reads_session_and_user(self):
+        self.login('default')
+        with self.assertNumQueries(2):
+            self.client.get('/books/')
+
+    def test_cached_profile_skips_session_and_user(self):
+        self.login('cached')
+        with self.assertNumQueries(0):
+            response = self.client.get('/books/')
+        self.assertEqual(response.wsgi_request.user, self.member)
+        self.assertEqual(response.wsgi_request.user.member.phone, '555')
+
+    def test_cookie_profile_skips_session_and_user(self):
+        self.login('cookie')
+        with self.assertNumQueries(0):
+            response = self.client.get('/books/')
+        self.assertEqual(response.wsgi_request.user, self.member)
+
+    def test_saving_user_or_member_drops_the_cached_user(self):
+        self.login('cached')
+        member = Member.objects.get(user=self.member)
+        member.phone = '777'
+        member.save()
+        with self.assertNumQueries(1):
+            response = self.client.get('/books/')
+        self.assertEqual(response.wsgi_request.user.member.phone, '777')
+
+        self.member.is_active = False
+        self.member.save()
+        response = self.client.get('/user-home/')
+        self.assertRedirects(response, '/accounts/login/?next=/user-home/', fetch_redirect_response=False)
+
+    def test_password_change_ends_other_sessions(self):
+        self.login('cached')
+        self.member.set_password('new')
+        self.member.save()
+        self.assertFalse(self.client.get('/books/').wsgi_request.user.is_authenticated)
+
+    async def test_async_views_use_the_cached_user(self):
+        # Entered before login()'s override so the cleanups unwind in order.
+        self.enterContext(override_settings(ROOT_URLCONF='library_management.asgi_urls'))
+        await sync_to_async(self.login)('cached')
+        response = await self.async_client.get('/books/')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_bench_reports_queries_per_request(self):
+        before = bench.run_auth_queries('default', requests_per_page=2, clients=1)
+        after = bench.run_auth_queries('cached', requests_per_page=2, clients=1)
+        self.assertEqual(before['browse']['auth_queries_per_request'], 2)
+        self.assertEqual(after['browse']['queries_per_request'], 0)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        REGISTRY.reset()
+        caches[catalog.CACHE_ALIAS].clear()
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.member = User.objects.create_user('member', password='pw')
+
+    def test_requests_are_recorded_per_url_name(self):
+        self.client.force_login(self.member)
+        self.client.get('/books/')
+        self.client.get('/books/')
+        self.client.force_login(self.staff)
+        body = self.client.get('/metrics/').content.decode()
+        self.assertIn('library_request_duration_seconds_count{view="book_availability"} 2', body)
+        self.assertIn('library_request_queries_bucket{view="book_availability",le="+Inf"} 2', body)
+        self.assertIn('# TYPE library_request_sql_seconds histogram', body)
+
+    def test_metrics_are_staff_only(self):
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+
+    def queries_recorded(self, view):
+        return REGISTRY.views[view][2].sum
+
+    @override_settings(ROOT_URLCONF='library_management.asgi_urls')
+    async def test_async_views_record_their_queries(self):
+        await self.async_client.aforce_login(self.member)
+        await self.async_client.get('/books/')
+        self.assertGreater(self.queries_recorded('book_availability'), 0)
+        await self.async_client.get('/user-home/')
+        self.assertGreater(self.queries_recorded('user_home'), 0)
+
+    def test_streamed_listing_counts_queries_until_exhausted(self):
+        Book.objects.create(code_no='B1', title='Dune')
+        self.client.force_login(self.member)
+        response = self.client.get('/books/', {'stream': '1'})
+        self.assertNotIn('book_availability', REGISTRY.views)
+        b''.join(response.streaming_content)
+        response.close()
+        self.assertGreater(self.queries_recorded('book_availability'), 0)
+
+    @override_settings(ROOT_URLCONF='library_management.asgi_urls')
+    async def test_async_stream_counts_queries_until_exhausted(self):
+        await Book.objects.acreate(code_no='B1', title='Dune')
+        await self.async_client.aforce_login(self.member)
+        response = await self.async_client.get('/books/', {'stream': '1'})
+        b''.join([chunk async for chunk in response.streaming_content])
+        self.assertGreater(self.queries_recorded('book_availability'), 0)
+
+    @override_settings(LIBRARY_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_sql(self):
+        self.client.force_login(self.member)
+        with self.assertLogs('library.slow_requests', 'WARNING') as logs:
+            self.client.get('/books/')
+        self.assertIn('library_book', logs.output[0])
+
+
+@override_settings(LIBRARY_WRITE_RETRIES=3, LIBRARY_WRITE_RETRY_DELAY=0)
+class WriteRetryTests(SimpleTestCase):
+    def flaky(self, failures, message='database is locked'):
+        calls = []
+
+        @retry_on_lock
+        def write():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return len(calls)
+        return write, calls
+
+    def test_retries_lock_errors_until_success(self):
+        write, _ = self.flaky(2)
+        self.assertEqual(write(), 3)
+
+    def test_gives_up_after_the_configured_retries(self):
+        write, calls = self.flaky(10)
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 4)
+
+    def test_other_errors_are_not_retried(self):
+        write, calls = self.flaky(1, 'no such table: library_book')
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+
+    def test_production_profile_pragmas(self):
+        with tempfile.TemporaryDirectory() as scratch:
+            wrapper = DatabaseWrapper({**connections.settings['default'], 'NAME': f'{scratch}/db.sqlite3',
+                                       **settings.SQLITE_PROFILES['production']}, alias='profile')
+            try:
+                with wrapper.cursor() as cursor:
+                    pragmas = {}
+                    for name in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store'):
+                        cursor.execute(f'PRAGMA {name}')
+                        pragmas[name] = cursor.fetchone()[0]
+            finally:
+                wrapper.close()
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000, 'temp_store': 2})
+
+
+class BenchDataTests(TestCase):
+    def test_generated_data_is_consistent(self):
+        bench.generate(200, seed=7)
+        self.assertEqual(Book.objects.count(), 200)
+        self.assertEqual(Transaction.objects.count(), 200)
+        drifted = Book.objects.annotate(
+            open_loans=Count('transaction', filter=Q(transaction__status='issued'))
+        ).exclude(available_copies=F('total_copies') - F('open_loans'))
+        self.assertFalse(drifted.exists())
+        self.assertEqual(counters.snapshot()[counters.TOTAL_BOOKS], 200)
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(bench.percentile(values, 50), 50)
+        self.assertEqual(bench.percentile(values, 99), 99)
+        self.assertIsNone(bench.percentile([], 95))
+
+
+class CirculationStressTest(TransactionTestCase):
+    """Many desks racing for a few copies must never oversell."""
+
+    THREADS = 8
+    ATTEMPTS_PER_THREAD = 25
+    COPIES = 40
+
+    def test_concurrent_issues_never_oversell(self):
+        book = Book.objects.create(code_no='HOT', title='Hot title', total_copies=self.COPIES,
+                                   available_copies=self.COPIES)
+        members = [User.objects.create_user(f'desk{i}', password='pw') for i in range(self.THREADS)]
+        issued = []
+        refused = []
+        start = threading.Barrier(self.THREADS)
+
+        def desk(member):
+            start.wait()
+            try:
+                for _ in range(self.ATTEMPTS_PER_THREAD):
+                    while True:
+                        try:
+                            issued.append(circulation.issue_book(book, member).pk)
+                        except circulation.BookUnavailable:
+                            refused.append(member.pk)
+                        except OperationalError:
+                            # SQLite reports writer contention instead of waiting; retry.
+                            time.sleep(0.001)
+                            continue
+                        break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=desk, args=(m,)) for m in members]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        book.refresh_from_db()
+        attempts = self.THREADS * self.ATTEMPTS_PER_THREAD
+        self.assertEqual(len(issued), self.COPIES)
+        self.assertEqual(len(refused), attempts - self.COPIES)
+        self.assertEqual(book.available_copies, 0)
+        self.assertEqual(Transaction.objects.filter(book=book, status='issued').count(), self.COPIES)
+
+
+# Budgets assume db-backed sessions and ModelBackend, whatever LIBRARY_AUTH_PROFILE says.
+@override_settings(**settings.AUTH_PROFILES['default'])
+class QueryBudgetTests(TestCase):
+    """Every page must cost the same number of queries at 10 and 1,000 rows."""
+
+    SIZES = (10, 1000)
+
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.member = User.objects.create_user('member', password='pw')
+        Member.objects.create(user=self.member)
+        self.category = Category.objects.create(name='Fiction')
+        self.rows = 0
+
+    def grow_to(self, n):
+        """Add books, members and loans until there are ``n`` of each."""
+        start, self.rows = self.rows, n
+        today = date.today()
+        books = Book.objects.bulk_create(
+            Book(code_no=f'C{i}', title=f'Title {i}', category=self.category, total_copies=2, available_copies=1)
+            for i in range(start, n)
+        )
+        users = User.objects.bulk_create(User(username=f'user{i}') for i in range(start, n))
+        Member.objects.bulk_create(Member(user=u) for u in users)
+        Transaction.objects.bulk_create(
+            Transaction(
+                user=self.member if i % 2 else users[i - start],
+                book=book,
+                issue_date=today - timedelta(days=30),
+                due_date=today - timedelta(days=16),
+                return_date=today if i % 3 == 0 else None,
+                status='returned' if i % 3 == 0 else 'issued',
+                fine=Decimal('80.00') if i % 3 == 0 else Decimal('0.00'),
+            )
+            for i, book in enumerate(books, start)
+        )
+        counters.refresh()
+        summaries.refresh()
+        # bulk_create skips the signals that move the catalog version on.
+        catalog.bump()
+
+    def assert_budget(self, user, url, budget):
+        self.client.force_login(user)
+        for n in self.SIZES:
+            self.grow_to(n)
+            path = url() if callable(url) else url
+            with self.subTest(rows=n), self.assertNumQueries(budget):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+
+    def test_book_availability(self):
+        self.assert_budget(self.member, '/books/', 4)
+
+    def test_book_search(self):
+        self.assert_budget(self.member, '/books/?q=title', 4)
+
+    def test_cached_book_availability(self):
+        # A catalog page served from cache costs only the session and user.
+        self.client.force_login(self.member)
+        for n in self.SIZES:
+            self.grow_to(n)
+            self.client.get('/books/')
+            with self.subTest(rows=n), self.assertNumQueries(2):
+                self.assertContains(self.client.get('/books/'), 'Title 0')
+
+    def test_user_home(self):
+        # Session, user, summary, a page each of live and archived loans, holds.
+        self.assert_budget(self.member, '/user-home/', 6)
+
+    def test_admin_home(self):
+        self.assert_budget(self.staff, '/admin-home/', 4)
+
+    def test_issue_book(self):
+        # Session and user only: the pickers load their options on demand.
+        self.assert_budget(self.staff, '/issue/', 2)
+
+    def test_return_book(self):
+        def url():
+            tx = Transaction.objects.filter(status='issued').latest('id')
+            return f'/return/{tx.id}/'
+        self.assert_budget(self.staff, url, 3)
+
+    def test_pay_fine(self):
+        def url():
+            tx = Transaction.objects.filter(fine__gt=0).latest('id')
+            return f'/pay-fine/{tx.id}/'
+        self.assert_budget(self.staff, url, 3)
+
+    def test_manage_categories(self):
+        self.assert_budget(self.staff, '/manage-categories/', 4)
+
+    def test_transaction_changelist(self):
+        self.staff.is_superuser = True
+        self.staff.save()
+        self.assert_budget(self.staff, '/admin/library/transaction/', 5)
+
+    def test_book_changelist(self):
+        self.staff.is_superuser = True
+        self.staff.save()
+        self.assert_budget(self.staff, '/admin/library/book/', 6)
+
+    def test_member_changelist(self):
+        self.staff.is_superuser = True
+        self.staff.save()
+        self.assert_budget(self.staff, '/admin/library/member/', 5)
@@ -1,15 +1,38 @@
 from django.urls import path
-from . import views
+from . import api, async_views, views
 
-urlpatterns = [
+
+def read_patterns(read_views):
+    return [
+        path('admin-home/', read_views.admin_home, name='admin_home'),
+        path('user-home/', read_views.user_home, name='user_home'),
+        path('books/', read_views.book_availability, name='book_availability'),
+    ]
+
+
+common_patterns = [
     path('', views.home, name='home'),
-    path('admin-home/', views.admin_home, name='admin_home'),
-    path('user-home/', views.user_home, name='user_home'),
-    path('books/', views.book_availability, name='book_availability'),
     path('issue/', views.issue_book, name='issue_book'),
     path('return/<int:tx_id>/', views.return_book, name='return_book'),
+    path('hold/<int:book_id>/', views.place_hold, name='place_hold'),
+    path('hold/<int:hold_id>/cancel/', views.cancel_hold, name='cancel_hold'),
+    path('history/', views.history, name='history'),
     path('pay-fine/<int:tx_id>/', views.pay_fine, name='pay_fine'),
     path('add-book/', views.add_book, name='add_book'),
     path('add-user/', views.add_user, name='add_user'),
     path('manage-categories/', views.manage_categories, name='manage_categories'),
+    path('export/<str:dataset>/', views.export_data, name='export_data'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('catalog-cache/', views.catalog_cache_stats, name='catalog_cache_stats'),
+    path('analytics/', views.analytics, name='analytics'),
+    path('api/circulation/issue/', api.issue_batch, name='api_issue_batch'),
+    path('api/circulation/return/', api.return_batch, name='api_return_batch'),
+    path('api/circulation/scan/', api.scan, name='api_scan'),
+    path('api/autocomplete/books/', api.autocomplete_books, name='autocomplete_books'),
+    path('api/autocomplete/members/', api.autocomplete_members, name='autocomplete_members'),
 ]
+
+urlpatterns = read_patterns(views) + common_patterns
+
+# The same routes with the read-only pages served by native async views.
+async_urlpatterns = read_patterns(async_views) + common_patterns
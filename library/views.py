@@ -1,16 +1,31 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, QueryDict, StreamingHttpResponse,
+)
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction as db_transaction
 from datetime import date, timedelta
-from decimal import Decimal
 from django.contrib.auth.models import User
 
-from .models import Book, Transaction, Member, Category
-from .forms import BookSearchForm, IssueForm, ReturnForm, AddBookForm, AddUserForm
-
-LOAN_DAYS = 14
-FINE_PER_DAY = Decimal('5.00')
+from .models import ArchivedTransaction, Book, Transaction, Member, Category, Hold
+from . import catalog, circulation, counters, exports, holds, rollups, summaries
+from .metrics import REGISTRY
+from .forms import BookSearchForm, IssueForm, ReturnForm, AddBookForm, AddUserForm, ExportForm, AnalyticsForm
+from .pagination import keyset_page, merged_keyset_page, remaining
+from .search import search_books
+
+BOOKS_PER_PAGE = 50
+BOOK_LISTING_ORDER = ('title', 'id')
+# Query parameters that select a page of the cached catalog listing.
+LISTING_PARAMS = ('category', 'available', 'after')
+HISTORY_ORDER = ('-issue_date', '-id')
+HISTORY_PER_PAGE = 25
+RECENT_LOANS = 10
+ANALYTICS_DAYS = 30
+STREAM_CHUNK = 200
+STREAM_MARKER = '<!-- book rows -->'
 
 
 @login_required
@@ -25,12 +40,14 @@ def admin_home(request):
     if not request.user.is_staff:
         return redirect('user_home')
     
-    books_count = Book.objects.count()
-    issued_count = Transaction.objects.filter(status='issued', user__is_staff=False).count()
-    recent_tx = Transaction.objects.filter(user__is_staff=False).order_by('-issue_date')[:8]
+    recent_tx = (
+        Transaction.objects.filter(user__is_staff=False)
+        .select_related('book', 'user')
+        .only('issue_date', 'due_date', 'status', 'book__title', 'user__username')
+        .order_by('-issue_date')[:8]
+    )
     return render(request, 'library/admin_home.html', {
-        'books_count': books_count,
-        'issued_count': issued_count,
+        'counters': counters.snapshot(),
         'recent_tx': recent_tx,
     })
 
@@ -40,18 +57,120 @@ def user_home(request):
     if request.user.is_staff:
         return redirect('admin_home')
     
-    my_issued = Transaction.objects.filter(user=request.user).order_by('-issue_date')
-    return render(request, 'library/user_home.html', {'my_issued': my_issued})
+    recent = merged_keyset_page(loan_history(request.user), HISTORY_ORDER, None, RECENT_LOANS)
+    return render(request, 'library/user_home.html', {
+        'summary': summaries.get(request.user),
+        'my_issued': recent,
+        'my_holds': holds.active_holds(request.user),
+    })
+
+
+def loan_history(member):
+    """A member's loans in the live and archive tables, for merged_keyset_page()."""
+    return [
+        model.objects.filter(user=member).select_related('book')
+        .only('issue_date', 'due_date', 'return_date', 'fine', 'fine_paid', 'book__title', *extra)
+        for model, extra in ((Transaction, ['status', 'accrued_fine']), (ArchivedTransaction, []))
+    ]
+
+
+@login_required
+def history(request):
+    """A member's full loan history, from the live and archive tables alike."""
+    member = request.user
+    if request.user.is_staff:
+        member = get_object_or_404(User, username=request.GET.get('member', ''), is_staff=False)
+
+    page = merged_keyset_page(loan_history(member), HISTORY_ORDER, request.GET.get('after'), HISTORY_PER_PAGE)
+    next_query = None
+    if page.has_next:
+        params = request.GET.copy()
+        params['after'] = page.next_cursor
+        next_query = params.urlencode()
+    return render(request, 'library/history.html', {
+        'member': member,
+        'loans': page,
+        'next_query': next_query,
+    })
 
 
 @login_required
 def book_availability(request):
-    form = BookSearchForm(request.GET or None)
-    books = Book.objects.all().order_by('title')
-    if form.is_valid() and form.cleaned_data.get('q'):
-        q = form.cleaned_data['q']
-        books = books.filter(title__icontains=q)
-    return render(request, 'library/book_availability.html', {'books': books, 'form': form})
+    if request.GET.get('q') or request.GET.get('stream'):
+        form = BookSearchForm(request.GET)
+        filters = form.cleaned_data if form.is_valid() else {}
+        if filters.get('q'):
+            books = search_books(filters['q'], category=filters.get('category'),
+                                 available_only=filters.get('available', False))
+            return render(request, 'library/book_availability.html', {'books': books, 'form': form})
+        if request.GET.get('stream'):
+            return _stream_book_listing(request, form, _listing_books(filters))
+
+    # Plain browsing: the same pages for everyone until the catalog changes.
+    listing = catalog.cached_fragment(request, 'book_listing', listing_query(request.GET), render_listing)
+    return render(request, 'library/book_availability.html', {'listing': listing})
+
+
+def listing_query(query):
+    """Just the parameters that select a listing page, as a QueryDict."""
+    params = QueryDict(mutable=True)
+    for name in LISTING_PARAMS:
+        if query.get(name):
+            params[name] = query[name]
+    return params
+
+
+def _listing_books(filters):
+    books = Book.objects.select_related('category')
+    if filters.get('category'):
+        books = books.filter(category=filters['category'])
+    if filters.get('available'):
+        books = books.filter(available_copies__gt=0)
+    return books
+
+
+def render_listing(query, csrf_token):
+    form = BookSearchForm(query or None)
+    filters = form.cleaned_data if form.is_valid() else {}
+    page = keyset_page(_listing_books(filters), BOOK_LISTING_ORDER, query.get('after'), BOOKS_PER_PAGE)
+    next_query = None
+    if page.has_next:
+        params = query.copy()
+        params['after'] = page.next_cursor
+        next_query = params.urlencode()
+    return render_to_string('library/book_listing.html', {
+        'books': page,
+        'form': form,
+        'next_query': next_query,
+        'csrf_token': csrf_token,
+    })
+
+
+def _stream_book_listing(request, form, books):
+    # Render the page shell once, then send rows in chunks straight off a
+    # server-side cursor so the first rows reach the client immediately.
+    shell = render_to_string('library/book_availability.html', {
+        'form': form,
+        'streaming': True,
+        'stream_marker': STREAM_MARKER,
+    }, request=request)
+    head, tail = shell.split(STREAM_MARKER, 1)
+
+    def rows():
+        yield head
+        chunk = []
+        sent = False
+        for book in remaining(books, BOOK_LISTING_ORDER, request.GET.get('after')).iterator(chunk_size=STREAM_CHUNK):
+            chunk.append(book)
+            if len(chunk) == STREAM_CHUNK:
+                yield render_to_string('library/book_rows.html', {'books': chunk}, request=request)
+                chunk = []
+                sent = True
+        if chunk or not sent:
+            yield render_to_string('library/book_rows.html', {'books': chunk}, request=request)
+        yield tail
+
+    return StreamingHttpResponse(rows(), content_type='text/html; charset=utf-8')
 
 
 @login_required
@@ -69,27 +188,13 @@ def issue_book(request):
                     messages.error(request, "Cannot issue books to admin users.")
                     return redirect('admin_home')
 
-                if book.available_copies <= 0:
+                try:
+                    tx = circulation.issue_book(book, target_user)
+                except circulation.BookUnavailable:
                     messages.error(request, "Book is not available for issuing.")
                     return redirect('book_availability')
 
-                with db_transaction.atomic():
-                    if book.available_copies <= 0:
-                        messages.error(request, "Book became unavailable. Try again.")
-                        return redirect('book_availability')
-                    book.available_copies = book.available_copies - 1
-                    book.save()
-
-                    issue_date = date.today()
-                    due_date = issue_date + timedelta(days=LOAN_DAYS)
-                    tx = Transaction.objects.create(
-                        user=target_user,
-                        book=book,
-                        issue_date=issue_date,
-                        due_date=due_date
-                    )
-
-                messages.success(request, f"Issued '{book.title}' to {target_user.username}. Due on {due_date}.")
+                messages.success(request, f"Issued '{book.title}' to {target_user.username}. Due on {tx.due_date}.")
                 return redirect('admin_home')
         else:
             initial = {}
@@ -110,29 +215,14 @@ def issue_book(request):
             form = IssueForm(request.POST, current_user=request.user)
             if form.is_valid():
                 book = form.cleaned_data['book']
-                target_user = request.user
 
-                if book.available_copies <= 0:
+                try:
+                    tx = circulation.issue_book(book, request.user)
+                except circulation.BookUnavailable:
                     messages.error(request, "Book is not available for issuing.")
                     return redirect('book_availability')
 
-                with db_transaction.atomic():
-                    if book.available_copies <= 0:
-                        messages.error(request, "Book became unavailable. Try again.")
-                        return redirect('book_availability')
-                    book.available_copies = book.available_copies - 1
-                    book.save()
-
-                    issue_date = date.today()
-                    due_date = issue_date + timedelta(days=LOAN_DAYS)
-                    tx = Transaction.objects.create(
-                        user=target_user,
-                        book=book,
-                        issue_date=issue_date,
-                        due_date=due_date
-                    )
-
-                messages.success(request, f"Issued '{book.title}' to you. Due on {due_date}.")
+                messages.success(request, f"Issued '{book.title}' to you. Due on {tx.due_date}.")
                 return redirect('user_home')
         else:
             initial = {}
@@ -149,7 +239,7 @@ def issue_book(request):
 
 @login_required
 def return_book(request, tx_id):
-    tx = get_object_or_404(Transaction, id=tx_id)
+    tx = get_object_or_404(Transaction.objects.select_related('book', 'user'), id=tx_id)
 
     if not request.user.is_staff and tx.user != request.user:
         messages.error(request, "You are not authorized to return this transaction.")
@@ -166,17 +256,13 @@ def return_book(request, tx_id):
         return redirect('user_home')
 
     if request.method == 'POST':
-        tx.return_date = date.today()
-        tx.fine = tx.calculate_fine(per_day=FINE_PER_DAY)
-        tx.status = 'returned'
-        tx.save()
-
-        with db_transaction.atomic():
-            book = tx.book
-            book.available_copies = book.available_copies + 1
-            if book.available_copies > book.total_copies:
-                book.available_copies = book.total_copies
-            book.save()
+        try:
+            circulation.return_book(tx)
+        except circulation.AlreadyReturned:
+            messages.info(request, "This transaction is already returned.")
+            if request.user.is_staff:
+                return redirect('admin_home')
+            return redirect('user_home')
 
         if tx.fine > 0:
             messages.warning(request, f"Book returned. Fine due: ₹{tx.fine}. Use Pay Fine to mark payment.")
@@ -189,9 +275,39 @@ def return_book(request, tx_id):
     return render(request, 'library/confirm_return.html', {'tx': tx})
 
 
+@login_required
+def place_hold(request, book_id):
+    book = get_object_or_404(Book, id=book_id)
+    if request.user.is_staff:
+        messages.error(request, "Admin users cannot place holds.")
+        return redirect('book_availability')
+    if request.method == 'POST':
+        try:
+            hold = holds.place_hold(book, request.user)
+        except holds.CopyOnShelf:
+            messages.info(request, f"'{book.title}' is available now; issue it instead.")
+            return redirect('book_availability')
+        except holds.AlreadyHeld:
+            messages.info(request, f"You already have a hold on '{book.title}'.")
+        else:
+            messages.success(request, f"Hold placed on '{book.title}'. You are number {holds.queue_position(hold)} in the queue.")
+    return redirect('user_home')
+
+
+@login_required
+def cancel_hold(request, hold_id):
+    hold = get_object_or_404(Hold.objects.select_related('book'), id=hold_id, user=request.user)
+    if request.method == 'POST':
+        if holds.cancel(hold):
+            messages.success(request, f"Hold on '{hold.book.title}' cancelled.")
+        else:
+            messages.info(request, "This hold is no longer active.")
+    return redirect('user_home')
+
+
 @login_required
 def pay_fine(request, tx_id):
-    tx = get_object_or_404(Transaction, id=tx_id)
+    tx = get_object_or_404(Transaction.objects.select_related('book', 'user'), id=tx_id)
 
     if not request.user.is_staff and tx.user != request.user:
         messages.error(request, "You are not authorized to pay this fine.")
@@ -209,9 +325,12 @@ def pay_fine(request, tx_id):
 
     if request.method == 'POST':
         # Simulated payment: mark paid
-        tx.fine_paid = True
-        tx.save()
-        messages.success(request, f"Fine of ₹{tx.fine} marked as paid.")
+        try:
+            circulation.pay_fine(tx)
+        except circulation.NoFineDue:
+            messages.info(request, "No fine due for this transaction.")
+        else:
+            messages.success(request, f"Fine of ₹{tx.fine} marked as paid.")
         if request.user.is_staff:
             return redirect('admin_home')
         return redirect('user_home')
@@ -228,7 +347,8 @@ def add_book(request):
     if request.method == 'POST':
         form = AddBookForm(request.POST)
         if form.is_valid():
-            book = form.save()
+            with db_transaction.atomic():
+                book = form.save()
             messages.success(request, f"Book '{book.title}' added successfully!")
             return redirect('admin_home')
     else:
@@ -252,14 +372,8 @@ def add_user(request):
             
             membership_type = form.cleaned_data['membership_type']
             membership_start = date.today()
-            
-            if membership_type == '6m':
-                membership_end = membership_start + timedelta(days=180)
-            elif membership_type == '1y':
-                membership_end = membership_start + timedelta(days=365)
-            elif membership_type == '2y':
-                membership_end = membership_start + timedelta(days=730)
-            
+            membership_end = Member.membership_end_for(membership_type, membership_start)
+
             Member.objects.create(
                 user=user,
                 phone=form.cleaned_data.get('phone', ''),
@@ -296,3 +410,61 @@ def manage_categories(request):
     
     categories = Category.objects.all().order_by('name')
     return render(request, 'library/manage_categories.html', {'categories': categories})
+
+
+@login_required
+def export_data(request, dataset):
+    if not request.user.is_staff:
+        messages.error(request, "You are not authorized to export data.")
+        return redirect('user_home')
+    if dataset not in exports.DATASETS:
+        raise Http404("Unknown export")
+
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    fmt = form.cleaned_data['format'] or 'csv'
+    filters = {}
+    if dataset == 'transactions':
+        filters = {k: v for k, v in form.cleaned_data.items() if k != 'format' and v}
+
+    response = StreamingHttpResponse(exports.export(dataset, fmt, **filters),
+                                     content_type=exports.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
+
+
+@login_required
+def metrics(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Staff only.")
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@login_required
+def catalog_cache_stats(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Staff only.")
+    return JsonResponse({**catalog.STATS.snapshot(), 'version': catalog.version()})
+
+
+@login_required
+def analytics(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Staff only.")
+    form = AnalyticsForm(request.GET or None)
+    chosen = form.cleaned_data if form.is_valid() else {}
+    rolled_up_to = rollups.rolled_up_to()
+    end = chosen.get('end') or rolled_up_to or date.today() - timedelta(days=1)
+    start = chosen.get('start') or end - timedelta(days=ANALYTICS_DAYS - 1)
+    report = rollups.report(start, end)
+    busiest = max((row['issues'] for row in report['series']), default=0)
+    for row in report['series']:
+        row['width'] = round(100 * row['issues'] / busiest) if busiest else 0
+    return render(request, 'library/analytics.html', {
+        'form': form,
+        'start': start,
+        'end': end,
+        'rolled_up_to': rolled_up_to,
+        'report': report,
+    })
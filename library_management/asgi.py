@@ -11,6 +11,7 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_mgmt.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_management.settings')
+os.environ.setdefault('LIBRARY_URLCONF', 'library_management.asgi_urls')
 
 application = get_asgi_application()
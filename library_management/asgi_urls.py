@@ -0,0 +1,15 @@
+"""URL configuration used when serving over ASGI.
+
+Identical to ``library_management.urls`` except that the catalog and home
+pages are routed to the async views in ``library.async_views``.
+"""
+from django.contrib import admin
+from django.urls import path, include
+
+from library.urls import async_urlpatterns
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include(async_urlpatterns)),
+    path('accounts/', include('django.contrib.auth.urls')),
+]
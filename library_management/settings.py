@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'library.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,7 +52,8 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'library_management.urls'
+# asgi.py switches this to 'library_management.asgi_urls' (async read views).
+ROOT_URLCONF = os.environ.get('LIBRARY_URLCONF', 'library_management.urls')
 
 TEMPLATES = [
     {
@@ -80,6 +83,98 @@ DATABASES = {
     }
 }
 
+# Connection settings layered over DATABASES['default'], picked with the
+# LIBRARY_DB_PROFILE environment variable. 'production' runs SQLite in WAL
+# mode so readers never block the writer, takes the write lock at BEGIN
+# (IMMEDIATE) so waiting writers queue on busy_timeout instead of failing
+# at their first write, and keeps connections open between requests.
+SQLITE_PROFILES = {
+    'default': {},
+    'production': {
+        'OPTIONS': {
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA cache_size=-32000;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            # busy_timeout, in seconds.
+            'timeout': 20,
+        },
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+LIBRARY_DB_PROFILE = os.environ.get('LIBRARY_DB_PROFILE', 'default')
+DATABASES['default'].update(SQLITE_PROFILES[LIBRARY_DB_PROFILE])
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# 'catalog' holds rendered catalog pages keyed by a catalog version, so
+# entries never need deleting; MAX_ENTRIES bounds it instead. It must be
+# shared by every process that writes books: web workers, but also
+# import_catalog, reconcile_inventory, expire_holds and the other commands,
+# whose version bumps a per-process cache would never pass on. Hence a
+# directory on local disk by default (LIBRARY_CATALOG_CACHE_DIR); memcached
+# or Redis work as well once the workers span machines.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('LIBRARY_CATALOG_CACHE_DIR', str(BASE_DIR / '.cache' / 'catalog')),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+# Runs the suite against a temporary 'catalog' directory instead.
+TEST_RUNNER = 'library.test_runner.TestRunner'
+
+
+# Sessions and authentication
+#
+# Where each request's session and user come from, picked with the
+# LIBRARY_AUTH_PROFILE environment variable. 'default' reads django_session
+# and auth_user on every request. 'cached' serves sessions from the
+# default cache (written through to the database) and the logged-in user,
+# with their Member row, from a cache entry kept LIBRARY_USER_CACHE_TTL
+# seconds and dropped when either is saved. 'cookie' keeps the session in
+# a signed cookie instead, so it needs no storage at all, but a session
+# can't then be revoked server-side before it expires.
+#
+# Unlike 'catalog', the default cache is per process here: with several
+# workers, point it at a shared backend, or a logout or user change in
+# one worker is only seen by the others once their entries expire.
+AUTH_PROFILES = {
+    'default': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+    },
+    'cached': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+        # ModelBackend stays listed so sessions made before the switch still resolve.
+        'AUTHENTICATION_BACKENDS': ['library.auth.CachedUserBackend', 'django.contrib.auth.backends.ModelBackend'],
+    },
+    'cookie': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.signed_cookies',
+        'AUTHENTICATION_BACKENDS': ['library.auth.CachedUserBackend', 'django.contrib.auth.backends.ModelBackend'],
+    },
+}
+LIBRARY_AUTH_PROFILE = os.environ.get('LIBRARY_AUTH_PROFILE', 'default')
+SESSION_ENGINE = AUTH_PROFILES[LIBRARY_AUTH_PROFILE]['SESSION_ENGINE']
+AUTHENTICATION_BACKENDS = AUTH_PROFILES[LIBRARY_AUTH_PROFILE]['AUTHENTICATION_BACKENDS']
+LIBRARY_USER_CACHE_TTL = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,3 +222,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Log requests slower than this many milliseconds (with their slowest SQL)
+# to the 'library.slow_requests' logger. None disables the slow log.
+LIBRARY_SLOW_REQUEST_MS = None
+
+# Extra attempts for a write transaction that hits "database is locked",
+# with exponential backoff starting at LIBRARY_WRITE_RETRY_DELAY seconds.
+LIBRARY_WRITE_RETRIES = 5
+LIBRARY_WRITE_RETRY_DELAY = 0.05